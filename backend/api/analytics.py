@@ -0,0 +1,303 @@
+"""
+Vectorized cohort analytics
+
+Loads the few ``LogEntries`` columns the cohort metrics need into NumPy
+arrays once, with students and specialties dictionary-encoded to integer
+codes, and computes per-student hours by specialty, cohort percentiles,
+z-scores and outlier flags with vectorized group-bys (``np.bincount``).
+
+Frames are loaded and cached per shard; a cohort spanning shards is the
+concatenation of each shard's frame, loaded in parallel with ``fan_out``.
+"""
+import threading
+import time
+
+import numpy as np
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from api.db_routers import current_shard
+from api.models import LogEntries, Profiles
+from api.sharding import all_shards, fan_out, shard_for_institution
+
+
+# Frames are shared by the cohort endpoints for this long
+FRAME_TTL_SECONDS = 60
+
+PERCENTILES = (10, 25, 50, 75, 90)
+DEFAULT_Z_THRESHOLD = 2.5
+
+# Specialty name for entries without one (NULL or blank)
+UNSPECIFIED = 'Unspecified'
+
+_frames = {}
+_frames_lock = threading.Lock()
+
+
+class CohortFrame:
+    """
+    Columnar snapshot of a cohort's log entries
+
+    Attributes:
+        students: Array of student UUIDs, indexed by student code
+        names: List of student display names, indexed by student code
+        specialties: List of specialty names, indexed by specialty code
+        student_codes: int32 array, student code per entry
+        specialty_codes: int32 array, specialty code per entry
+        hours: float64 array, hours per entry
+    """
+
+    def __init__(self, students, names, specialties, student_codes, specialty_codes, hours):
+        self.students = students
+        self.names = names
+        self.specialties = specialties
+        self.student_codes = student_codes
+        self.specialty_codes = specialty_codes
+        self.hours = hours
+
+    @classmethod
+    def load(cls, institution_id=None, status=None):
+        """
+        Build a frame for every student in scope, including ones with no entries
+
+        Args:
+            institution_id: Optional institution UUID to restrict the cohort
+            status: Optional log status to restrict counted entries
+        """
+        roster = Profiles.objects.filter(role='student')
+        entries = LogEntries.objects.all()
+        if institution_id:
+            roster = roster.filter(institution_id=institution_id)
+            entries = entries.filter(student__institution_id=institution_id)
+        if status:
+            entries = entries.filter(status=status)
+
+        student_index = {}
+        names = []
+        for student_id, full_name, email in roster.values_list('id', 'full_name', 'email').iterator():
+            student_index[student_id] = len(names)
+            names.append(full_name or email)
+
+        specialty_index = {}
+        rows = entries.annotate(hours_float=Cast('hours', FloatField())).values_list(
+            'student_id', 'specialty', 'hours_float'
+        )
+
+        student_codes = []
+        specialty_codes = []
+        hours = []
+        for student_id, specialty, entry_hours in rows.iterator(chunk_size=10000):
+            code = student_index.get(student_id)
+            if code is None:
+                # Entry written while the roster was being read
+                continue
+            specialty = specialty or UNSPECIFIED
+            spec_code = specialty_index.get(specialty)
+            if spec_code is None:
+                spec_code = specialty_index[specialty] = len(specialty_index)
+            student_codes.append(code)
+            specialty_codes.append(spec_code)
+            hours.append(entry_hours or 0.0)
+
+        return cls(
+            students=np.array(list(student_index), dtype=object),
+            names=names,
+            specialties=list(specialty_index),
+            student_codes=np.array(student_codes, dtype=np.int32),
+            specialty_codes=np.array(specialty_codes, dtype=np.int32),
+            hours=np.array(hours, dtype=np.float64),
+        )
+
+    @classmethod
+    def concat(cls, frames):
+        """One frame over the students of several, with specialties merged by name"""
+        specialty_index = {}
+        students, names, student_codes, specialty_codes, hours = [], [], [], [], []
+        offset = 0
+        for frame in frames:
+            remap = np.array(
+                [specialty_index.setdefault(name, len(specialty_index)) for name in frame.specialties],
+                dtype=np.int32,
+            )
+            students.extend(frame.students)
+            names.extend(frame.names)
+            student_codes.append(frame.student_codes + offset)
+            specialty_codes.append(remap[frame.specialty_codes] if remap.size else frame.specialty_codes)
+            hours.append(frame.hours)
+            offset += frame.n_students
+
+        return cls(
+            students=np.array(students, dtype=object),
+            names=names,
+            specialties=list(specialty_index),
+            student_codes=np.concatenate(student_codes).astype(np.int32) if frames else np.array([], dtype=np.int32),
+            specialty_codes=np.concatenate(specialty_codes).astype(np.int32) if frames else np.array([], dtype=np.int32),
+            hours=np.concatenate(hours) if frames else np.array([], dtype=np.float64),
+        )
+
+    @property
+    def n_students(self):
+        return len(self.students)
+
+    @property
+    def n_specialties(self):
+        return len(self.specialties)
+
+    def _group(self, weights=None):
+        """Student x specialty group-by via a single flat bincount"""
+        cells = self.n_students * self.n_specialties
+        if cells == 0:
+            return np.zeros((self.n_students, self.n_specialties))
+        flat = self.student_codes.astype(np.int64) * self.n_specialties + self.specialty_codes
+        return np.bincount(flat, weights=weights, minlength=cells).reshape(
+            self.n_students, self.n_specialties
+        )
+
+    def hours_matrix(self):
+        """float64 array [student, specialty] of summed hours"""
+        return self._group(self.hours)
+
+    def entries_matrix(self):
+        """int64 array [student, specialty] of entry counts"""
+        return self._group().astype(np.int64)
+
+
+def get_frame(institution_id=None, status=None):
+    """
+    Return a recently loaded CohortFrame for this scope, loading it if needed
+
+    An institution's cohort is read from its shard; the global cohort
+    from every shard.
+    """
+    shards = [shard_for_institution(institution_id)] if institution_id else all_shards()
+    frames = fan_out(lambda: shard_frame(institution_id, status), shards=shards)
+    if len(frames) == 1:
+        return next(iter(frames.values()))
+    return CohortFrame.concat([frames[shard] for shard in shards])
+
+
+def shard_frame(institution_id=None, status=None):
+    """Recently loaded CohortFrame of the current shard's students in scope"""
+    key = (current_shard() or 'default', str(institution_id) if institution_id else None, status)
+    now = time.monotonic()
+    cached = _frames.get(key)
+    if cached and now - cached[0] < FRAME_TTL_SECONDS:
+        return cached[1]
+
+    frame = CohortFrame.load(institution_id=institution_id, status=status)
+    with _frames_lock:
+        _frames[key] = (now, frame)
+    return frame
+
+
+def z_scores(values):
+    """Standard scores, all zero when the cohort has no spread"""
+    if values.size == 0:
+        return np.zeros_like(values, dtype=np.float64)
+    std = values.std()
+    if std == 0:
+        return np.zeros_like(values, dtype=np.float64)
+    return (values - values.mean()) / std
+
+
+def percentile_ranks(values):
+    """Percentage of the cohort at or below each value"""
+    if values.size == 0:
+        return np.zeros_like(values, dtype=np.float64)
+    ordered = np.sort(values)
+    return 100.0 * np.searchsorted(ordered, values, side='right') / values.size
+
+
+def _percentile_dict(values, axis=None):
+    if values.size == 0:
+        return {f'p{q}': 0.0 for q in PERCENTILES}
+    result = np.percentile(values, PERCENTILES, axis=axis)
+    return {f'p{q}': np.round(result[i], 2).tolist() for i, q in enumerate(PERCENTILES)}
+
+
+def cohort_summary(frame):
+    """Cohort-wide distribution of total hours plus per-specialty percentiles"""
+    matrix = frame.hours_matrix()
+    totals = matrix.sum(axis=1)
+
+    by_specialty = []
+    if frame.n_specialties:
+        spec_percentiles = _percentile_dict(matrix, axis=0)
+        spec_totals = matrix.sum(axis=0)
+        spec_active = (matrix > 0).sum(axis=0)
+        for code, name in enumerate(frame.specialties):
+            by_specialty.append({
+                'specialty': name,
+                'total_hours': round(float(spec_totals[code]), 2),
+                'students_with_hours': int(spec_active[code]),
+                'percentiles': {k: v[code] for k, v in spec_percentiles.items()},
+            })
+
+    return {
+        'student_count': frame.n_students,
+        'entry_count': int(frame.hours.size),
+        'total_hours': round(float(totals.sum()), 2),
+        'mean_hours': round(float(totals.mean()), 2) if totals.size else 0.0,
+        'std_hours': round(float(totals.std()), 2) if totals.size else 0.0,
+        'percentiles': _percentile_dict(totals),
+        'specialties': by_specialty,
+    }
+
+
+def student_metrics(frame, z_threshold=DEFAULT_Z_THRESHOLD, ascending=False, limit=None, offset=0):
+    """
+    Per-student rows: hours by specialty, totals, z-score, percentile and outlier flag
+
+    Metrics are computed for the whole cohort, then ordered by total hours
+    and sliced so only the requested page is turned into Python dicts.
+    """
+    matrix = frame.hours_matrix()
+    counts = frame.entries_matrix().sum(axis=1)
+    totals = matrix.sum(axis=1)
+    z = z_scores(totals)
+    ranks = percentile_ranks(totals)
+
+    order = np.argsort(totals, kind='stable')
+    if not ascending:
+        order = order[::-1]
+    order = order[offset:offset + limit if limit else None]
+
+    rows = []
+    for code in order:
+        flag = None
+        if z[code] >= z_threshold:
+            flag = 'high'
+        elif z[code] <= -z_threshold:
+            flag = 'low'
+        rows.append({
+            'student_id': str(frame.students[code]),
+            'student_name': frame.names[code],
+            'entries': int(counts[code]),
+            'total_hours': round(float(totals[code]), 2),
+            'hours_by_specialty': {
+                frame.specialties[s]: round(float(matrix[code, s]), 2)
+                for s in np.flatnonzero(matrix[code])
+            },
+            'z_score': round(float(z[code]), 3),
+            'percentile': round(float(ranks[code]), 1),
+            'outlier': flag,
+        })
+    return rows
+
+
+def outliers(frame, z_threshold=DEFAULT_Z_THRESHOLD):
+    """Students whose total hours sit more than z_threshold deviations from the mean"""
+    totals = frame.hours_matrix().sum(axis=1)
+    z = z_scores(totals)
+    flagged = np.flatnonzero(np.abs(z) >= z_threshold)
+    flagged = flagged[np.argsort(-np.abs(z[flagged]))]
+    return [
+        {
+            'student_id': str(frame.students[code]),
+            'student_name': frame.names[code],
+            'total_hours': round(float(totals[code]), 2),
+            'z_score': round(float(z[code]), 3),
+            'direction': 'high' if z[code] > 0 else 'low',
+        }
+        for code in flagged
+    ]
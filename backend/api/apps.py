@@ -4,3 +4,31 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+
+        from api.async_db import install_query_wrappers
+        from api.conditional import bump_on_change
+        from api.coverage import catalog_changed
+        from api.models import ClinicalActivities, Institutions, LogEntries, Profiles
+        from api.sync import record_tombstone, refresh_change, stamp_change
+
+        # Change tracking for delta sync (stamped here where the Postgres triggers don't exist)
+        pre_save.connect(stamp_change, sender=LogEntries, dispatch_uid='log_entry_change_seq')
+        post_save.connect(refresh_change, sender=LogEntries, dispatch_uid='log_entry_refresh_change')
+        pre_delete.connect(record_tombstone, sender=LogEntries, dispatch_uid='log_entry_tombstone')
+
+        # Versions of the tables without a change column, for conditional GETs
+        for model, scope in ((Profiles, 'profiles'), (Institutions, 'institutions')):
+            receiver = bump_on_change(scope)
+            post_save.connect(receiver, sender=model, weak=False, dispatch_uid=f'{scope}_version_save')
+            post_delete.connect(receiver, sender=model, weak=False, dispatch_uid=f'{scope}_version_delete')
+
+        # Compiled activity matchers are rebuilt when the catalog changes
+        post_save.connect(catalog_changed, sender=ClinicalActivities, dispatch_uid='activity_catalog_save')
+        post_delete.connect(catalog_changed, sender=ClinicalActivities, dispatch_uid='activity_catalog_delete')
+
+        # Query stats and spans for requests served through ASGI
+        connection_created.connect(install_query_wrappers, dispatch_uid='context_query_wrappers')
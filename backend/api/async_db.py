@@ -0,0 +1,97 @@
+"""
+Concurrent ORM queries for async views
+
+Django's async ORM methods (``acount()``, ``afirst()`` ...) all run on the
+one thread-sensitive executor, so awaiting several of them with
+``asyncio.gather`` still executes them one after another. The helpers
+here run each query on a bounded pool of worker threads instead. Every
+worker keeps its own persistent connection (``CONN_MAX_AGE``), so the pool
+doubles as a connection pool of ``ASYNC_DB_WORKERS`` connections per
+database alias.
+
+The caller's context (shard / replica routing) is copied into each query.
+
+``wrap_queries()`` is the async counterpart of ``connection.execute_wrapper()``
+for the middleware: an execute wrapper only sees the calling thread's
+connection, while an async request queries from executor threads.
+"""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import close_old_connections
+
+
+_executor = None
+
+_query_wrappers = contextvars.ContextVar('query_wrappers', default=())
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'ASYNC_DB_WORKERS', 8),
+            thread_name_prefix='async-db',
+        )
+    return _executor
+
+
+def _run(func):
+    # Drop this worker's connections if they are past CONN_MAX_AGE or broken
+    close_old_connections()
+    return func()
+
+
+async def run_query(func):
+    """Run a synchronous ORM callable on the query pool"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), context.run, _run, func)
+
+
+async def gather_queries(queries):
+    """
+    Run independent ORM callables concurrently
+
+    Args:
+        queries: Dict of name -> zero-argument callable (e.g. ``qs.count``)
+
+    Returns:
+        Dict of name -> result, in the same order
+    """
+    names = list(queries)
+    results = await asyncio.gather(*(run_query(queries[name]) for name in names))
+    return dict(zip(names, results))
+
+
+@contextmanager
+def wrap_queries(*wrappers):
+    """
+    Run execute wrappers around every query issued in this context
+
+    Follows the context into sync_to_async() and run_query() threads. The
+    wrappers must be thread-safe.
+    """
+    token = _query_wrappers.set(_query_wrappers.get() + wrappers)
+    try:
+        yield
+    finally:
+        _query_wrappers.reset(token)
+
+
+def _context_wrappers(execute, sql, params, many, context):
+    # Outermost first, like nested connection.execute_wrapper() blocks
+    for wrapper in reversed(_query_wrappers.get()):
+        execute = functools.partial(wrapper, execute)
+    return execute(sql, params, many, context)
+
+
+def install_query_wrappers(sender, connection, **kwargs):
+    """connection_created receiver letting wrap_queries() see the connection"""
+    if _context_wrappers not in connection.execute_wrappers:
+        # First, since execute_wrapper() blocks pop the last entry on exit
+        connection.execute_wrappers.insert(0, _context_wrappers)
@@ -0,0 +1,19 @@
+"""
+JWT authentication that counts rejected tokens
+"""
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from api.metrics import AUTH_FAILURES
+
+
+class MeteredJWTAuthentication(JWTAuthentication):
+    """simplejwt's JWTAuthentication, recording failures in clinlogix_auth_failures_total"""
+
+    def authenticate(self, request):
+        try:
+            return super().authenticate(request)
+        except (InvalidToken, AuthenticationFailed) as e:
+            codes = e.get_codes()
+            AUTH_FAILURES.labels(codes if isinstance(codes, str) else e.default_code).inc()
+            raise
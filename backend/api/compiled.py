@@ -0,0 +1,142 @@
+"""
+Compiled read-only serializers for hot list endpoints
+
+A ModelSerializer spends most of a list response in per-row, per-field
+machinery (get_attribute, to_representation, a fresh OrderedDict), and a
+``source='student.full_name'`` field loads the related object once per
+row. ``compile_serializer()`` walks a serializer's fields once and
+generates a plain function turning ``.values()`` rows into the dicts the
+serializer would have produced:
+
+    compiled = compile_serializer(LogEntrySerializer)
+    rows = queryset.values(*compiled.columns)   # one query, related columns joined
+    data = compiled.many(rows)
+
+Only the columns the fields read are selected, and related sources
+(``student.full_name``) become ``student__full_name`` joins. Writes keep
+using the serializer itself for validation.
+
+Field types with an exact cheap equivalent (UUID, char, integer, boolean,
+ISO dates and datetimes, primary key relations) are converted inline;
+anything else calls the field's own to_representation(). Fields that need
+the whole instance (``source='*'``, SerializerMethodField) can't be
+compiled and raise ImproperlyConfigured.
+"""
+import datetime
+import functools
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from rest_framework import ISO_8601, relations, serializers
+
+
+def _datetime_converter(field):
+    """
+    DateTimeField.to_representation, taking the current timezone as an
+    argument so it is looked up once per response rather than per row
+    """
+    if getattr(field, 'format', ISO_8601) != ISO_8601:
+        return lambda value, tz: field.to_representation(value)
+    explicit = getattr(field, 'timezone', None)
+    enforce_timezone = field.enforce_timezone
+
+    def convert(value, tz):
+        target = explicit or tz
+        if target is not None and value.tzinfo is not None:
+            value = value.astimezone(target).isoformat()
+        else:
+            value = enforce_timezone(value).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    convert.needs_timezone = True
+    return convert
+
+
+def _converter(field):
+    """Callable turning a non-null column value into the field's output, or None to pass it through"""
+    if isinstance(field, serializers.UUIDField):
+        return str if field.uuid_format == 'hex_verbose' else field.to_representation
+    if isinstance(field, relations.PrimaryKeyRelatedField):
+        return field.pk_field.to_representation if field.pk_field else None
+    if isinstance(field, serializers.DateTimeField):
+        return _datetime_converter(field)
+    if isinstance(field, serializers.DateField):
+        if getattr(field, 'format', ISO_8601) == ISO_8601:
+            return datetime.date.isoformat
+        return field.to_representation
+    if type(field) in (serializers.CharField, serializers.EmailField):
+        return str
+    if type(field) is serializers.IntegerField:
+        return int
+    if type(field) is serializers.BooleanField:
+        return bool
+    return field.to_representation
+
+
+def _current_timezone():
+    return timezone.get_current_timezone() if settings.USE_TZ else None
+
+
+class CompiledSerializer:
+    """
+    Generated row -> dict converter for a serializer's readable fields
+
+    Attributes:
+        fields: Output field names, in serializer order
+        columns: ``.values()`` arguments the rows must carry
+    """
+
+    def __init__(self, serializer_class, fields=None):
+        serializer = serializer_class()
+        readable = [field for field in serializer.fields.values() if not field.write_only]
+        if fields is not None:
+            readable = [field for field in readable if field.field_name in fields]
+
+        namespace = {}
+        columns = []
+        items = []
+        for index, field in enumerate(readable):
+            if not field.source_attrs or isinstance(field, serializers.SerializerMethodField):
+                raise ImproperlyConfigured(
+                    f"{serializer_class.__name__}.{field.field_name} needs the whole instance and can't be compiled"
+                )
+            column = '__'.join(field.source_attrs)
+            if column not in columns:
+                columns.append(column)
+            convert = _converter(field)
+            if convert is None:
+                items.append(f"{field.field_name!r}: row[{column!r}]")
+                continue
+            namespace[f'c{index}'] = convert
+            args = 'v, tz' if getattr(convert, 'needs_timezone', False) else 'v'
+            items.append(f"{field.field_name!r}: None if (v := row[{column!r}]) is None else c{index}({args})")
+
+        source = "def convert(row, tz):\n    return {\n" + ''.join(f"        {item},\n" for item in items) + "    }\n"
+        exec(compile(source, f'<compiled {serializer_class.__name__}>', 'exec'), namespace)
+
+        self.serializer_class = serializer_class
+        self.fields = tuple(field.field_name for field in readable)
+        self.columns = tuple(columns)
+        self._convert = namespace['convert']
+
+    def convert(self, row):
+        return self._convert(row, _current_timezone())
+
+    def many(self, rows):
+        convert, tz = self._convert, _current_timezone()
+        return [convert(row, tz) for row in rows]
+
+
+@functools.lru_cache(maxsize=None)
+def _compile(serializer_class, fields):
+    return CompiledSerializer(serializer_class, fields)
+
+
+def compile_serializer(serializer_class, fields=None):
+    """
+    Compiled converter for ``serializer_class``, built once per field set
+
+    Args:
+        fields: Optional iterable of field names to limit the output to
+    """
+    return _compile(serializer_class, frozenset(fields) if fields is not None else None)
@@ -0,0 +1,137 @@
+"""
+Conditional GET: weak ETags and Last-Modified from cheap version checks
+
+A view method decorated with ``@conditional(version_func)`` first asks
+``version_func(view, request, *args, **kwargs)`` for the version of the
+data it would return, as ``(parts, last_modified)``. ``parts`` is any
+tuple that changes whenever the data does (e.g. max ``change_seq`` and
+count of the entries in scope), so deciding a 304 costs one aggregate
+query instead of the full query plus serialization:
+
+    @conditional(log_entries_version)
+    def list(self, request, *args, **kwargs):
+        ...
+
+The ETag also covers the path with its query string, the user and the
+Accept header, so it is only ever compared against the same
+representation. Responses are ``Cache-Control: private, no-cache`` unless
+the decorator is given other directives: clients keep them but revalidate
+every time.
+
+Tables with no change column (profiles, institutions) are versioned by
+``scope_version()`` tokens kept in the cache and replaced on every save
+and delete through the ORM (signals in ApiConfig.ready(), and explicit
+``bump()`` calls after bulk ``update()``s). A token lost to eviction is
+simply replaced, which only costs one full response. The tokens are only
+trusted with a cache shared between workers (Redis): with a per-process
+cache a bump in one worker would leave the others answering 304 with
+stale data, so ``scope_version()`` returns None and views versioned by it
+skip conditional handling.
+"""
+import functools
+import hashlib
+import time
+import uuid
+from calendar import timegm
+from datetime import datetime, timezone
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+
+CACHE_PREFIX = 'version:'
+SCOPE_TTL = 60 * 60 * 24 * 30
+
+DEFAULT_CACHE_CONTROL = {'private': True, 'no_cache': True}
+
+
+def _new_token():
+    return (uuid.uuid4().hex[:12], time.time())
+
+
+def shared_cache():
+    """Whether the default cache is shared between worker processes"""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def scope_version(scope):
+    """(token, changed_at datetime) of a cache-versioned scope, or None without a shared cache"""
+    if not shared_cache():
+        return None
+    token, changed_at = cache.get_or_set(CACHE_PREFIX + scope, _new_token, SCOPE_TTL)
+    return token, datetime.fromtimestamp(changed_at, tz=timezone.utc)
+
+
+def bump(*scopes):
+    """Mark the scopes as changed"""
+    cache.set_many({CACHE_PREFIX + scope: _new_token() for scope in scopes}, SCOPE_TTL)
+
+
+def bump_on_change(scope):
+    """Signal receiver bumping ``scope``, for post_save/post_delete"""
+    def receiver(sender, **kwargs):
+        bump(scope)
+    return receiver
+
+
+def latest(*moments):
+    """Latest of the given datetimes, ignoring None"""
+    moments = [moment for moment in moments if moment is not None]
+    return max(moments) if moments else None
+
+
+def make_etag(request, parts):
+    user = getattr(request, 'user', None)
+    seed = '\0'.join(map(str, (
+        request.get_full_path(),
+        getattr(user, 'pk', None),
+        request.META.get('HTTP_ACCEPT', ''),
+        *parts,
+    )))
+    return f'W/"{hashlib.sha1(seed.encode()).hexdigest()}"'
+
+
+def _set_headers(response, etag, last_modified, cache_control):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, **cache_control)
+    patch_vary_headers(response, ('Accept', 'Authorization'))
+    return response
+
+
+def conditional(version_func, **cache_control):
+    """
+    Answer GETs with 304 Not Modified when ``version_func`` says nothing changed
+
+    ``version_func`` may return None to skip conditional handling (e.g.
+    for an object that doesn't exist, so the view can 404 as usual).
+    Keyword arguments are Cache-Control directives for patch_cache_control.
+    """
+    cache_control = cache_control or DEFAULT_CACHE_CONTROL
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            version = version_func(self, request, *args, **kwargs) if request.method in ('GET', 'HEAD') else None
+            if version is None:
+                return method(self, request, *args, **kwargs)
+
+            parts, last_modified = version
+            etag = make_etag(request, parts)
+            timestamp = timegm(last_modified.utctimetuple()) if last_modified is not None else None
+            not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if not_modified is not None:
+                return _set_headers(not_modified, etag, timestamp, cache_control)
+
+            response = method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                _set_headers(response, etag, timestamp, cache_control)
+            return response
+        # For callers embedding the data in another response (home_section)
+        wrapper.unconditional = method
+        return wrapper
+    return decorator
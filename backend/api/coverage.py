@@ -0,0 +1,323 @@
+"""
+Competency coverage engine
+
+Matches the free text students type into ``LogEntries.activities`` against
+their institution's ``ClinicalActivities`` catalog. Each institution's
+activity names and synonyms are compiled into an Aho-Corasick automaton,
+so tagging an entry is a single pass over its text regardless of how big
+the catalog is. Matches are stored in ``log_entry_activities`` and read
+back as per-student coverage matrices.
+
+Compiled matchers are cached per process. Saving or deleting a catalog
+row through the ORM (signals in ApiConfig.ready()) drops them and bumps a
+catalog version in the cache, which every worker checks before reusing
+its matchers; with a per-process cache other workers pick the change up
+within MATCHER_TTL_SECONDS. Call ``invalidate_matcher()`` after bulk
+``update()``s.
+"""
+import logging
+import re
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from api.models import ClinicalActivities, LogEntries, LogEntryActivities
+
+
+# How long a compiled matcher is reused before the catalog is re-read
+MATCHER_TTL_SECONDS = 300
+
+CATALOG_VERSION_KEY = 'coverage-catalog-version'
+
+NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+PARENTHETICAL_RE = re.compile(r"\(([^)]*)\)")
+
+_matchers = {}
+_matchers_lock = threading.Lock()
+
+logger = logging.getLogger('api.coverage')
+
+
+def normalize(text):
+    """Lowercase text and collapse everything but letters/digits to single spaces"""
+    if not text:
+        return ''
+    return NON_WORD_RE.sub(' ', text.lower()).strip()
+
+
+def activity_aliases(name):
+    """
+    All the spellings an activity can be recognised by
+
+    Catalog names may carry their own synonyms, e.g.
+    ``"Venepuncture (Phlebotomy)"`` or ``"Lumbar puncture / LP"``, and
+    extra ones can be configured in ``settings.CLINICAL_ACTIVITY_SYNONYMS``
+    keyed by the lowercase activity name.
+    """
+    parts = PARENTHETICAL_RE.findall(name)
+    parts.append(PARENTHETICAL_RE.sub(' ', name))
+
+    aliases = set()
+    for part in parts:
+        for alias in part.split('/'):
+            alias = normalize(alias)
+            if alias:
+                aliases.add(alias)
+
+    synonyms = getattr(settings, 'CLINICAL_ACTIVITY_SYNONYMS', {})
+    for synonym in synonyms.get(name.strip().lower(), []):
+        alias = normalize(synonym)
+        if alias:
+            aliases.add(alias)
+    return aliases
+
+
+class ActivityMatcher:
+    """
+    Aho-Corasick automaton over normalized activity aliases
+
+    ``find(text)`` returns ``Counter({activity_id: occurrences})`` using
+    leftmost-longest, whole-word, non-overlapping matches, so
+    "lumbar puncture" is not also counted as "puncture".
+    """
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        self.size = 0
+
+        for alias, value in patterns:
+            node = 0
+            for char in alias:
+                nxt = self.goto[node].get(char)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[node][char] = nxt
+                node = nxt
+            self.output[node].append((len(alias), value))
+            self.size += 1
+
+        # Breadth-first pass to wire failure links and merge outputs
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, nxt in self.goto[node].items():
+                queue.append(nxt)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+
+    def matches(self, text):
+        """Yield (start, end, value) for every whole-word alias occurrence"""
+        goto, fail, output = self.goto, self.fail, self.output
+        node = 0
+        length = len(text)
+        for i, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for size, value in output[node]:
+                start = i - size + 1
+                end = i + 1
+                if (start == 0 or text[start - 1] == ' ') and (end == length or text[end] == ' '):
+                    yield start, end, value
+
+    def find(self, text):
+        found = sorted(self.matches(normalize(text)), key=lambda m: (m[0], m[0] - m[1]))
+        counts = Counter()
+        cursor = 0
+        for start, end, value in found:
+            if start >= cursor:
+                counts[value] += 1
+                cursor = end
+        return counts
+
+
+def build_matcher(institution_id):
+    """Compile the catalog visible to an institution (its own plus shared activities)"""
+    catalog = ClinicalActivities.objects.filter(institution_id=institution_id)
+    if institution_id is not None:
+        catalog = catalog | ClinicalActivities.objects.filter(institution__isnull=True)
+
+    patterns = []
+    for activity_id, name in catalog.values_list('id', 'name'):
+        for alias in activity_aliases(name):
+            patterns.append((alias, activity_id))
+    return ActivityMatcher(patterns)
+
+
+def get_matcher(institution_id):
+    """Return the cached matcher for an institution, rebuilding it when stale or the catalog changed"""
+    now = time.monotonic()
+    version = cache.get(CATALOG_VERSION_KEY)
+    cached = _matchers.get(institution_id)
+    if cached and now - cached[0] < MATCHER_TTL_SECONDS and cached[1] == version:
+        return cached[2]
+
+    matcher = build_matcher(institution_id)
+    with _matchers_lock:
+        _matchers[institution_id] = (now, version, matcher)
+    return matcher
+
+
+def invalidate_matcher(institution_id=None):
+    """
+    Drop cached matchers (all of them when no institution is given)
+
+    Also bumps the catalog version, so workers sharing the cache drop
+    theirs too.
+    """
+    with _matchers_lock:
+        if institution_id is None:
+            _matchers.clear()
+        else:
+            _matchers.pop(institution_id, None)
+    cache.set(CATALOG_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def catalog_changed(sender, instance, **kwargs):
+    """post_save/post_delete receiver for ClinicalActivities"""
+    # Shared activities (no institution) are in every catalog, so they drop all matchers
+    invalidate_matcher(instance.institution_id)
+
+
+def tag_entry(entry, matcher=None):
+    """
+    Match an entry's activities text and replace its stored tags
+
+    Args:
+        entry: LogEntries instance (student is loaded if needed)
+        matcher: Optional pre-built ActivityMatcher for the student's institution
+
+    Returns:
+        Counter of activity_id -> occurrences that was stored
+    """
+    if matcher is None:
+        matcher = get_matcher(entry.student.institution_id)
+    counts = matcher.find(entry.activities)
+
+    now = timezone.now()
+    with transaction.atomic():
+        LogEntryActivities.objects.filter(log_entry_id=entry.id).delete()
+        LogEntryActivities.objects.bulk_create([
+            LogEntryActivities(
+                id=uuid.uuid4(),
+                log_entry_id=entry.id,
+                activity_id=activity_id,
+                student_id=entry.student_id,
+                occurrences=occurrences,
+                tagged_at=now,
+            )
+            for activity_id, occurrences in counts.items()
+        ])
+    return counts
+
+
+def tag_entry_safely(entry):
+    """Tag an entry on write without ever failing the write itself"""
+    try:
+        return tag_entry(entry)
+    except Exception as e:
+        logger.warning(f"Failed to tag log entry activities: {e}")
+        return None
+
+
+def _tag_chunk(entry_ids):
+    """Worker for backfill(): tag one chunk of entries on this thread's connection"""
+    try:
+        entries = LogEntries.objects.filter(id__in=entry_ids).select_related('student')
+        tagged = 0
+        for entry in entries:
+            tag_entry(entry)
+            tagged += 1
+        return tagged
+    finally:
+        connection.close()
+
+
+def backfill(chunk_size=500, workers=4, institution_id=None):
+    """
+    Tag historical log entries in parallel chunks
+
+    Matchers are warmed on the calling thread first so the worker threads
+    share compiled automatons instead of each re-reading the catalog.
+
+    Returns:
+        Number of entries tagged
+    """
+    entries = LogEntries.objects.order_by('id')
+    if institution_id:
+        entries = entries.filter(student__institution_id=institution_id)
+
+    institutions = entries.values_list('student__institution_id', flat=True).distinct()
+    for inst_id in institutions:
+        get_matcher(inst_id)
+
+    ids = list(entries.values_list('id', flat=True))
+    chunks = [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return sum(pool.map(_tag_chunk, chunks))
+
+
+def coverage_matrix(student, status=None):
+    """
+    Per-student activity x count matrix over the student's catalog
+
+    Args:
+        student: Profiles instance
+        status: Optional log status to restrict counted entries (e.g. 'approved')
+
+    Returns:
+        Dict with per-activity rows (zero counts included) and a summary
+    """
+    catalog = ClinicalActivities.objects.filter(institution_id=student.institution_id)
+    if student.institution_id is not None:
+        catalog = catalog | ClinicalActivities.objects.filter(institution__isnull=True)
+    catalog = catalog.order_by('category', 'name').values_list('id', 'name', 'category')
+
+    tags = LogEntryActivities.objects.filter(student=student)
+    if status:
+        tags = tags.filter(log_entry__status=status)
+    counts = {
+        row['activity_id']: row
+        for row in tags.values('activity_id').annotate(
+            entries=Count('log_entry_id'),
+            occurrences=Sum('occurrences'),
+        )
+    }
+
+    rows = []
+    for activity_id, name, category in catalog:
+        found = counts.get(activity_id, {})
+        rows.append({
+            'activity_id': str(activity_id),
+            'name': name,
+            'category': category,
+            'entries': found.get('entries', 0),
+            'occurrences': found.get('occurrences') or 0,
+        })
+
+    covered = sum(1 for row in rows if row['entries'])
+    return {
+        'student_id': str(student.id),
+        'activities': rows,
+        'covered_count': covered,
+        'catalog_size': len(rows),
+        'coverage_percent': round(100.0 * covered / len(rows), 1) if rows else 0.0,
+    }
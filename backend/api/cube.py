@@ -0,0 +1,331 @@
+"""
+In-memory OLAP cube over log entries
+
+Pre-aggregates entry counts and hours by institution x specialty x month
+x status x cohort so dashboard slices (filter, group by, top-N) are answered
+from memory instead of re-scanning ``log_entries`` on every filter change.
+
+Freshness:
+    - New entries are folded in incrementally on read by polling for rows
+      submitted after the cube's watermark (an indexed range scan).
+    - Status/specialty/date/hours changes and deletes made through the API
+      are applied as deltas via ``record_entry_change``.
+    - A full rebuild every ``OLAP_CUBE_REBUILD_SECONDS`` (default 300)
+      reconciles changes made by other workers or outside the API.
+
+With sharding on there is one cube per shard, built from that shard's
+rows only; ``get_cube()`` refreshes them all in parallel (``fan_out``)
+and slices them together.
+"""
+import datetime
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncMonth
+
+from api.db_routers import current_shard
+from api.models import LogEntries, Profiles
+from api.sharding import fan_out
+
+
+logger = logging.getLogger('api.cube')
+
+DIMENSIONS = ('institution', 'specialty', 'month', 'status', 'cohort')
+MEASURES = ('entries', 'hours')
+
+# Minimum gap between watermark polls for new entries
+POLL_INTERVAL_SECONDS = 1.0
+
+
+def entry_fact(entry):
+    """
+    Snapshot the cube-relevant fields of a log entry
+
+    Take one before and one after changing an entry and pass both to
+    ``record_entry_change``.
+    """
+    if entry is None:
+        return None
+    month = datetime.date(entry.date.year, entry.date.month, 1) if entry.date else None
+    return (
+        entry.id, entry.submitted_at, entry.student_id,
+        entry.specialty, month, entry.status, float(entry.hours or 0),
+    )
+
+
+def _month_key(value):
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    return value
+
+
+class ActivityCube:
+    """
+    Dict-of-cells cube keyed by (institution, specialty, month, status, cohort)
+
+    Each cell holds ``[entries, hours]``. The number of cells is bounded by
+    the product of distinct dimension values, not by the number of entries,
+    so slicing is a pass over a few thousand tuples at most. Entries
+    without a specialty are keyed under None.
+    """
+
+    def __init__(self):
+        self.cells = {}
+        self.students = {}
+        self.watermark = None
+        self.watermark_ids = set()
+        self.built_at = None
+        self.polled_at = 0.0
+        self.lock = threading.RLock()
+        self.refresh_lock = threading.Lock()
+
+    # -- building -----------------------------------------------------------
+
+    def _load_students(self, student_ids=None):
+        profiles = Profiles.objects.all()
+        if student_ids is not None:
+            profiles = profiles.filter(id__in=student_ids)
+        for student_id, institution_id, created_at in profiles.values_list(
+            'id', 'institution_id', 'created_at'
+        ).iterator():
+            cohort = str(created_at.year) if created_at else None
+            self.students[student_id] = (
+                str(institution_id) if institution_id else None,
+                cohort,
+            )
+
+    def _key(self, student_id, specialty, month, status):
+        institution, cohort = self.students.get(student_id, (None, None))
+        # Blank specialties share the NULL cell
+        return (institution, specialty or None, month, status, cohort)
+
+    def _add(self, key, entries, hours):
+        cell = self.cells.get(key)
+        if cell is None:
+            cell = self.cells[key] = [0, 0.0]
+        cell[0] += entries
+        cell[1] += hours
+        if cell[0] <= 0:
+            del self.cells[key]
+
+    def rebuild(self):
+        """Recompute every cell with one GROUP BY over log_entries"""
+        watermark = LogEntries.objects.aggregate(latest=Max('submitted_at'))['latest']
+        rows = LogEntries.objects.all()
+        if watermark is not None:
+            rows = rows.filter(submitted_at__lte=watermark)
+        rows = rows.annotate(month=TruncMonth('date')).values(
+            'student_id', 'specialty', 'month', 'status'
+        ).annotate(entries=Count('id'), hours=Sum('hours'))
+
+        with self.lock:
+            self.cells = {}
+            self.students = {}
+            self._load_students()
+            for row in rows.iterator():
+                key = self._key(row['student_id'], row['specialty'], _month_key(row['month']), row['status'])
+                self._add(key, row['entries'], float(row['hours'] or 0))
+            self.watermark = watermark
+            self.watermark_ids = set(
+                LogEntries.objects.filter(submitted_at=watermark).values_list('id', flat=True)
+            ) if watermark else set()
+            self.built_at = time.monotonic()
+            self.polled_at = self.built_at
+
+    def poll(self):
+        """Fold in entries submitted since the watermark"""
+        new_rows = LogEntries.objects.order_by('submitted_at')
+        if self.watermark is not None:
+            new_rows = new_rows.filter(submitted_at__gte=self.watermark)
+        new_rows = list(new_rows.values_list(
+            'id', 'student_id', 'specialty', 'date', 'status', 'hours', 'submitted_at'
+        ))
+
+        with self.lock:
+            unknown = {row[1] for row in new_rows if row[1] not in self.students}
+            if unknown:
+                self._load_students(unknown)
+            for entry_id, student_id, specialty, date, status, hours, submitted_at in new_rows:
+                if entry_id in self.watermark_ids:
+                    continue
+                month = datetime.date(date.year, date.month, 1) if date else None
+                self._add(self._key(student_id, specialty, month, status), 1, float(hours or 0))
+                if submitted_at != self.watermark:
+                    self.watermark = submitted_at
+                    self.watermark_ids = set()
+                self.watermark_ids.add(entry_id)
+            self.polled_at = time.monotonic()
+
+    def refresh(self):
+        """Rebuild when stale, otherwise poll for new entries (rate limited)"""
+        rebuild_after = getattr(settings, 'OLAP_CUBE_REBUILD_SECONDS', 300)
+        now = time.monotonic()
+        if self.built_at is None or now - self.built_at >= rebuild_after:
+            self.rebuild()
+        elif now - self.polled_at >= POLL_INTERVAL_SECONDS:
+            self.poll()
+
+    def _includes(self, entry_id, submitted_at):
+        """Whether the cube already counts this entry (it is at or below the watermark)"""
+        if self.watermark is None or submitted_at is None:
+            return False
+        if submitted_at == self.watermark:
+            return entry_id in self.watermark_ids
+        return submitted_at < self.watermark
+
+    def apply_change(self, before, after):
+        """
+        Move an existing entry's contribution from its old cell to its new one
+
+        Entries above the watermark are left alone: the next poll reads
+        their current state anyway.
+        """
+        with self.lock:
+            if self.built_at is None or before is None:
+                return
+            if not self._includes(before[0], before[1]):
+                return
+            for fact, sign in ((before, -1), (after, 1)):
+                if fact is None:
+                    continue
+                _, _, student_id, specialty, month, status, hours = fact
+                if student_id not in self.students:
+                    self._load_students([student_id])
+                self._add(self._key(student_id, specialty, month, status), sign, sign * hours)
+
+    # -- slicing ------------------------------------------------------------
+
+    def query(self, filters=None, group_by=(), order_by=None, limit=None):
+        """
+        Slice the cube
+
+        Args:
+            filters: Dict of dimension -> value or list of values, plus
+                ``month_from``/``month_to`` (inclusive dates)
+            group_by: Dimensions to group by (empty = grand total)
+            order_by: Measure or dimension name, prefixed with '-' for descending
+            limit: Keep only the first N groups (top-N when ordering by a measure)
+
+        Returns:
+            List of dicts with the grouped dimensions plus entries and hours
+        """
+        return _group_rows(self.groups(filters, group_by), group_by, order_by, limit)
+
+    def groups(self, filters=None, group_by=()):
+        """Dict of group tuple -> [entries, hours] for ``query()``"""
+        filters = dict(filters or {})
+        month_from = filters.pop('month_from', None)
+        month_to = filters.pop('month_to', None)
+        for dim in list(filters) + list(group_by):
+            if dim not in DIMENSIONS:
+                raise ValueError(f"Unknown cube dimension: {dim}")
+
+        matchers = []
+        for dim, value in filters.items():
+            allowed = set(value) if isinstance(value, (list, tuple, set)) else {value}
+            matchers.append((DIMENSIONS.index(dim), allowed))
+        positions = [DIMENSIONS.index(dim) for dim in group_by]
+        month_pos = DIMENSIONS.index('month')
+
+        groups = {}
+        with self.lock:
+            for key, (entries, hours) in self.cells.items():
+                if any(key[pos] not in allowed for pos, allowed in matchers):
+                    continue
+                month = key[month_pos]
+                if month_from and (month is None or month < month_from):
+                    continue
+                if month_to and (month is None or month > month_to):
+                    continue
+                group = tuple(key[pos] for pos in positions)
+                total = groups.get(group)
+                if total is None:
+                    groups[group] = [entries, hours]
+                else:
+                    total[0] += entries
+                    total[1] += hours
+        return groups
+
+
+def _group_rows(groups, group_by, order_by=None, limit=None):
+    """Turn ``groups()`` output into ordered, limited result rows"""
+    results = []
+    for group, (entries, hours) in groups.items():
+        row = dict(zip(group_by, group))
+        row['entries'] = entries
+        row['hours'] = round(hours, 2)
+        results.append(row)
+
+    if order_by:
+        field = order_by.lstrip('-')
+        if field not in MEASURES and field not in group_by:
+            raise ValueError(f"Cannot order by: {field}")
+        # None sorts first regardless of direction
+        results.sort(
+            key=lambda row: (row[field] is not None, row[field] or 0),
+            reverse=order_by.startswith('-'),
+        )
+    if limit:
+        results = results[:limit]
+    return results
+
+
+class ShardedCube:
+    """The cubes of every shard, sliced as one"""
+
+    def __init__(self, cubes):
+        self.cubes = cubes
+
+    def query(self, filters=None, group_by=(), order_by=None, limit=None):
+        """Same as ActivityCube.query(), over every shard's cells"""
+        merged = {}
+        for cube in self.cubes:
+            for group, (entries, hours) in cube.groups(filters, group_by).items():
+                total = merged.setdefault(group, [0, 0.0])
+                total[0] += entries
+                total[1] += hours
+        return _group_rows(merged, group_by, order_by, limit)
+
+
+_cubes = {}
+_cubes_lock = threading.Lock()
+
+
+def shard_cube():
+    """The process-wide cube of the current shard (not refreshed)"""
+    alias = current_shard() or 'default'
+    with _cubes_lock:
+        cube = _cubes.get(alias)
+        if cube is None:
+            cube = _cubes[alias] = ActivityCube()
+    return cube
+
+
+def get_cube():
+    """Return every shard's cube, refreshed for this read"""
+    def refresh():
+        cube = shard_cube()
+        with cube.refresh_lock:
+            cube.refresh()
+        return cube
+    return ShardedCube(list(fan_out(refresh).values()))
+
+
+def record_entry_change(before, after):
+    """
+    Apply an update or delete made through the API to the cube
+
+    Args:
+        before: entry_fact() taken before the change
+        after: entry_fact() taken after the change (None for deletes)
+
+    New entries don't need recording; the watermark poll picks them up.
+    """
+    try:
+        shard_cube().apply_change(before, after)
+    except Exception as e:
+        logger.warning(f"Failed to update activity cube: {e}")
+
@@ -0,0 +1,138 @@
+"""
+Database routers
+
+ShardRouter sends tenant tables to the current institution's shard (see
+api/sharding.py); it is a no-op unless shards are configured.
+
+ReplicaRouter sends reads made while serving safe-method (GET/HEAD/OPTIONS)
+requests to a read replica, and everything else to the primary. The
+per-request decision is made by ReplicaRoutingMiddleware, which also pins
+a user to the primary for a short window after they write so they always
+read their own writes.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+_read_from_replica = ContextVar('read_from_replica', default=False)
+_current_shard = ContextVar('current_shard', default=None)
+
+PIN_CACHE_PREFIX = 'db-pin:'
+
+# Tenant tables, by model_name; everything else lives on 'default'
+SHARDED_MODELS = frozenset({
+    'profiles',
+    'patients',
+    'logentries',
+    'logentryactivities',
+    'logentrytombstones',
+    'studentpatientassignments',
+    'studentpreceptorassignments',
+})
+
+
+def read_from_replica():
+    """Whether reads in the current context may go to a replica"""
+    return _read_from_replica.get()
+
+
+def use_replica(enabled):
+    """Set replica routing for the current context; returns a token for reset_replica()"""
+    return _read_from_replica.set(enabled)
+
+
+def reset_replica(token):
+    _read_from_replica.reset(token)
+
+
+def pin_to_primary(user_key):
+    """Route this user's reads to the primary for REPLICA_PIN_SECONDS"""
+    if user_key is not None:
+        cache.set(f'{PIN_CACHE_PREFIX}{user_key}', True, getattr(settings, 'REPLICA_PIN_SECONDS', 5))
+
+
+def is_pinned(user_key):
+    return user_key is not None and cache.get(f'{PIN_CACHE_PREFIX}{user_key}') is not None
+
+
+def sharding_enabled():
+    return bool(getattr(settings, 'DATABASE_SHARDS', []))
+
+
+def current_shard():
+    """Alias tenant queries in the current context go to (None = 'default')"""
+    return _current_shard.get()
+
+
+@contextmanager
+def on_shard(alias):
+    """Route tenant queries inside the block to ``alias``"""
+    token = _current_shard.set(alias)
+    try:
+        yield alias
+    finally:
+        _current_shard.reset(token)
+
+
+class ShardRouter:
+    """
+    Route tenant models to the shard selected with ``on_shard()``
+
+    Returns None (no opinion) for directory models, when sharding is off
+    and when the current shard is 'default', so ReplicaRouter still
+    applies there.
+    """
+
+    def _route(self, model, hints):
+        if model._meta.model_name not in SHARDED_MODELS or not sharding_enabled():
+            return None
+        # Related lookups follow the object they start from
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        shard = current_shard()
+        if shard is None or shard == 'default':
+            return None
+        return shard
+
+    def db_for_read(self, model, **hints):
+        return self._route(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._route(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Tenant rows reference directory rows (e.g. institutions) that
+        # are copied to every shard
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+
+class ReplicaRouter:
+    """
+    Route reads to ``settings.DATABASE_REPLICAS`` when the request allows it
+
+    With no replicas configured every query goes to ``default``.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if replicas and read_from_replica():
+            return random.choice(replicas)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -0,0 +1,293 @@
+"""
+Idempotency keys for POST requests
+
+A client that may retry a POST (flaky mobile connections) sends the same
+``Idempotency-Key`` header, e.g. a UUID, with every attempt:
+
+    POST /api/student/logs/
+    Idempotency-Key: 6f1c...
+
+The first attempt runs normally and its response is kept for
+``IDEMPOTENCY_TTL_SECONDS``. Retries with the same key get that response
+back, marked ``Idempotent-Replayed: true``, without reaching the view. A
+retry that arrives while the first attempt is still running waits up to
+``IDEMPOTENCY_WAIT_SECONDS`` for it, then gets 409. Reusing a key with a
+different body is a client bug and gets 422.
+
+Keys are scoped to the (signature-verified) user, method and path, so a
+token refresh between attempts still replays. POSTs under
+``EXEMPT_PATHS`` are never tracked: token responses are credentials that
+must not be kept, and batches are read-only. 5xx responses and statuses
+a retry may legitimately change (401, 409, 429, ...) are not kept.
+
+A key must be claimed atomically across every worker, so records live in
+the default cache only when it is shared (Redis, where ``add()`` is
+atomic). Otherwise, e.g. with the per-process LocMemCache, they live in
+the ``idempotency_keys`` table on the primary, claimed by inserting the
+key's row.
+"""
+import hashlib
+import random
+import time
+import zlib
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from api.conditional import shared_cache
+from api.models import IdempotencyKeys
+
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+CACHE_PREFIX = 'idem:'
+LOCK_PREFIX = 'idem-lock:'
+
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+
+# POSTs that are never tracked (prefixes of request.path)
+EXEMPT_PATHS = ('/api/token/', '/api/batch/')
+
+# Share of database claims that also purge expired rows
+PURGE_PROBABILITY = 0.001
+
+# Responses a retry of the same request may change, so they are not replayed
+TRANSIENT_STATUSES = frozenset({401, 403, 408, 409, 423, 425, 429})
+
+# Per-attempt headers that must not be replayed
+UNREPLAYED_HEADERS = frozenset({
+    'content-length', 'set-cookie', 'server-timing', 'x-trace-id', 'x-profile-file',
+})
+
+
+def _ttl():
+    return getattr(settings, 'IDEMPOTENCY_TTL_SECONDS', 86400)
+
+
+def _lock_seconds():
+    return getattr(settings, 'IDEMPOTENCY_LOCK_SECONDS', 60)
+
+
+class CacheStore:
+    """Records in the shared cache; a lock key claims the request"""
+
+    def get(self, key):
+        return cache.get(CACHE_PREFIX + key)
+
+    def claim(self, key, fingerprint):
+        return cache.add(LOCK_PREFIX + key, True, _lock_seconds())
+
+    def save(self, key, record):
+        cache.set(CACHE_PREFIX + key, record, _ttl())
+
+    def release(self, key):
+        cache.delete(LOCK_PREFIX + key)
+
+
+class DatabaseStore:
+    """Records in ``idempotency_keys``; the row's primary key claims the request"""
+
+    def __init__(self):
+        self.keys = IdempotencyKeys.objects.using('default')
+
+    def get(self, key):
+        row = self.keys.filter(
+            key=key, status__isnull=False, expires_at__gt=timezone.now()
+        ).values_list('fingerprint', 'status', 'headers', 'body').first()
+        if row is None:
+            return None
+        fingerprint, status_code, headers, body = row
+        return fingerprint, status_code, tuple(tuple(header) for header in headers), bytes(body)
+
+    def claim(self, key, fingerprint):
+        now = timezone.now()
+        fields = {
+            'fingerprint': fingerprint,
+            'status': None,
+            'headers': None,
+            'body': None,
+            'locked_until': now + timedelta(seconds=_lock_seconds()),
+            'expires_at': now + timedelta(seconds=_ttl()),
+        }
+        if random.random() < PURGE_PROBABILITY:
+            self.keys.filter(expires_at__lte=now).delete()
+        try:
+            with transaction.atomic(using='default'):
+                self.keys.create(key=key, **fields)
+            return True
+        except IntegrityError:
+            pass
+        # Take the key over from an abandoned attempt or an expired response
+        return self.keys.filter(
+            Q(status__isnull=True, locked_until__lte=now) | Q(expires_at__lte=now), key=key,
+        ).update(**fields) == 1
+
+    def save(self, key, record):
+        _, status_code, headers, body = record
+        self.keys.filter(key=key, status__isnull=True).update(
+            status=status_code,
+            headers=[list(header) for header in headers],
+            body=body,
+            expires_at=timezone.now() + timedelta(seconds=_ttl()),
+        )
+
+    def release(self, key):
+        # Only an unfinished claim; a stored response stays for replay
+        self.keys.filter(key=key, status__isnull=True).delete()
+
+
+def get_store():
+    """CacheStore with a shared cache, otherwise DatabaseStore"""
+    return CacheStore() if shared_cache() else DatabaseStore()
+
+
+def tracked(request):
+    """Whether a request carries an Idempotency-Key this module handles"""
+    return (
+        request.method == 'POST'
+        and bool(request.META.get(IDEMPOTENCY_HEADER, '').strip())
+        and not request.path.startswith(EXEMPT_PATHS)
+    )
+
+
+def _scope(request):
+    """
+    Verified user id the key belongs to, 'anon' without a token, or None
+    for an invalid token (left to the view to reject)
+    """
+    authenticator = JWTAuthentication()
+    header = authenticator.get_header(request)
+    if header is None:
+        return 'anon'
+    raw = authenticator.get_raw_token(header)
+    if raw is None:
+        return None
+    try:
+        token = authenticator.get_validated_token(raw)
+    except (InvalidToken, TokenError):
+        return None
+    return str(token.get(jwt_settings.USER_ID_CLAIM))
+
+
+def _key(scope, request, key):
+    return hashlib.sha256(f'{scope}\0{request.method}\0{request.path}\0{key}'.encode()).hexdigest()
+
+
+def _record(fingerprint, response):
+    """Compact record: body compressed, only replayable headers kept"""
+    headers = tuple(
+        (name, value) for name, value in response.items()
+        if name.lower() not in UNREPLAYED_HEADERS
+    )
+    return (fingerprint, response.status_code, headers, zlib.compress(response.content))
+
+
+def _replay(record):
+    _, status_code, headers, body = record
+    response = HttpResponse(zlib.decompress(body), status=status_code)
+    for name, value in headers:
+        response[name] = value
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def _error(status_code, message):
+    return JsonResponse({'success': False, 'message': message}, status=status_code)
+
+
+def _storable(response):
+    return (
+        not response.streaming
+        and response.status_code < 500
+        and response.status_code not in TRANSIENT_STATUSES
+    )
+
+
+def _begin(request):
+    """
+    Replay, reject or claim a request's key
+
+    Returns:
+        (response, None) when the request is answered without running the
+        view, otherwise (None, claim); claim is None for requests that are
+        not tracked
+    """
+    key = request.META.get(IDEMPOTENCY_HEADER, '').strip()
+    if len(key) > MAX_KEY_LENGTH:
+        return _error(400, f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters.'), None
+    scope = _scope(request)
+    if scope is None:
+        return None, None
+
+    store = get_store()
+    record_key = _key(scope, request, key)
+    fingerprint = hashlib.sha256(request.body).hexdigest()
+    deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT_SECONDS', 10)
+
+    while True:
+        record = store.get(record_key)
+        if record is not None:
+            if record[0] != fingerprint:
+                return _error(422, 'Idempotency-Key was already used with a different request body.'), None
+            return _replay(record), None
+
+        if store.claim(record_key, fingerprint):
+            return None, (store, record_key, fingerprint)
+        # Another attempt with this key is running; wait for its response
+        if time.monotonic() >= deadline:
+            return _error(409, 'A request with this Idempotency-Key is still in progress.'), None
+        time.sleep(POLL_INTERVAL)
+
+
+def _save(claim, response):
+    store, record_key, fingerprint = claim
+    if _storable(response):
+        store.save(record_key, _record(fingerprint, response))
+
+
+def _release(claim):
+    store, record_key, _ = claim
+    store.release(record_key)
+
+
+def handle(request, get_response):
+    """Run a POST carrying an Idempotency-Key at most once per key"""
+    response, claim = _begin(request)
+    if response is not None:
+        return response
+    if claim is None:
+        return get_response(request)
+
+    try:
+        response = get_response(request)
+        _save(claim, response)
+    finally:
+        _release(claim)
+    return response
+
+
+async def ahandle(request, get_response):
+    """handle() for an async middleware chain"""
+    response, claim = await sync_to_async(_begin)(request)
+    if response is not None:
+        return response
+    if claim is None:
+        return await get_response(request)
+
+    try:
+        response = await get_response(request)
+        await sync_to_async(_save)(claim, response)
+    finally:
+        await sync_to_async(_release)(claim)
+    return response
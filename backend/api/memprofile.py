@@ -0,0 +1,104 @@
+"""
+Allocation profiling per view
+
+With ``MEMORY_PROFILING = True``, AllocationProfilingMiddleware traces
+Python allocations with tracemalloc and records, per view, the peak
+memory reached while the request ran and the net memory it left behind,
+plus the source lines that allocated the most. Peak and net bytes are
+exported as histograms at ``/metrics`` (api/metrics.py), next to the
+request latencies; admins read the per-view totals and allocating lines
+at ``dashboard/memory/``.
+
+tracemalloc slows Python down noticeably and its counters are
+process-wide, so turn this on for a single-threaded worker (or a staging
+box) while hunting a memory-heavy endpoint, not in general production.
+"""
+import threading
+import tracemalloc
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+_lock = threading.Lock()
+_views = defaultdict(lambda: {
+    'requests': 0,
+    'peak_bytes_max': 0,
+    'peak_bytes_total': 0,
+    'net_bytes_total': 0,
+    'sites': Counter(),
+})
+
+
+def profiling_enabled():
+    return getattr(settings, 'MEMORY_PROFILING', False)
+
+
+def start():
+    """Start tracing (once per process); returns the baseline for measure()"""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(getattr(settings, 'MEMORY_PROFILING_FRAMES', 1))
+    snapshot = _snapshot()
+    tracemalloc.reset_peak()
+    current, _ = tracemalloc.get_traced_memory()
+    return current, snapshot
+
+
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+
+
+def measure(baseline):
+    """Peak and net bytes since start(), and net bytes by allocating line"""
+    before, before_snapshot = baseline
+    current, peak = tracemalloc.get_traced_memory()
+    sites = Counter()
+    for diff in _snapshot().compare_to(before_snapshot, 'lineno'):
+        if diff.size_diff > 0:
+            frame = diff.traceback[0]
+            sites[f"{frame.filename}:{frame.lineno}"] += diff.size_diff
+    return max(peak - before, 0), current - before, sites
+
+
+def record(view, peak, net, sites):
+    top = getattr(settings, 'MEMORY_PROFILING_TOP_SITES', 10)
+    with _lock:
+        stats = _views[view]
+        stats['requests'] += 1
+        stats['peak_bytes_max'] = max(stats['peak_bytes_max'], peak)
+        stats['peak_bytes_total'] += peak
+        stats['net_bytes_total'] += net
+        stats['sites'].update(dict(sites.most_common(top)))
+
+
+def allocation_stats(top=None):
+    """Per-view allocation summary, heaviest peak first"""
+    top = top or getattr(settings, 'MEMORY_PROFILING_TOP_SITES', 10)
+    with _lock:
+        rows = [
+            {
+                'view': view,
+                'requests': stats['requests'],
+                'peak_bytes_max': stats['peak_bytes_max'],
+                'peak_bytes_avg': stats['peak_bytes_total'] // stats['requests'],
+                'net_bytes_avg': stats['net_bytes_total'] // stats['requests'],
+                'top_sites': [
+                    {'site': site, 'bytes': size}
+                    for site, size in stats['sites'].most_common(top)
+                ],
+            }
+            for view, stats in _views.items()
+        ]
+    return sorted(rows, key=lambda row: row['peak_bytes_max'], reverse=True)
+
+
+def clear_allocation_stats():
+    with _lock:
+        _views.clear()
@@ -0,0 +1,141 @@
+"""
+Prometheus metrics
+
+Metrics are prometheus_client objects updated in-process and scraped from
+``/metrics``. Under gunicorn each worker is its own process, so set
+``PROMETHEUS_MULTIPROC_DIR`` to an empty directory shared by the workers
+(wiped on deploy): every worker then writes its samples to mmap files
+there and the scrape merges them. Add to the gunicorn config:
+
+    from prometheus_client import multiprocess
+
+    def child_exit(server, worker):
+        multiprocess.mark_process_dead(worker.pid)
+
+Updating a metric is a locked add, about a microsecond; the per-request
+cost is one counter, two histograms and a dict lookup.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client import REGISTRY
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 64 KiB to 256 MiB
+MEMORY_BUCKETS = tuple(float(64 * 1024 * 4 ** n) for n in range(7))
+
+REQUESTS = Counter(
+    'clinlogix_http_requests_total',
+    'HTTP requests by view, method and status code',
+    ['view', 'method', 'status'],
+)
+REQUEST_LATENCY = Histogram(
+    'clinlogix_http_request_duration_seconds',
+    'Time spent handling a request, by view',
+    ['view', 'method'],
+    buckets=LATENCY_BUCKETS,
+)
+DB_TIME = Histogram(
+    'clinlogix_db_query_duration_seconds',
+    'Total time a request spent in database queries, by view',
+    ['view'],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_MEMORY_PEAK = Histogram(
+    'clinlogix_http_request_memory_peak_bytes',
+    'Peak Python allocations while handling a request, by view (MEMORY_PROFILING only)',
+    ['view'],
+    buckets=MEMORY_BUCKETS,
+)
+REQUEST_MEMORY_NET = Histogram(
+    'clinlogix_http_request_memory_net_bytes',
+    'Python allocations a request left behind (negative if it freed more), by view (MEMORY_PROFILING only)',
+    ['view'],
+    buckets=MEMORY_BUCKETS,
+)
+SERIALIZATION_TIME = Histogram(
+    'clinlogix_serialization_duration_seconds',
+    'Time spent rendering response data to JSON',
+    buckets=LATENCY_BUCKETS,
+)
+AUTH_FAILURES = Counter(
+    'clinlogix_auth_failures_total',
+    'Rejected JWT access tokens',
+    ['reason'],
+)
+LOG_ENTRIES = Counter(
+    'clinlogix_log_entries_total',
+    'Log entry lifecycle events',
+    ['event'],
+)
+TASKS_IN_PROGRESS = Gauge(
+    'clinlogix_tasks_in_progress',
+    'Emails, audit writes and PDF renders currently running',
+    ['task'],
+    multiprocess_mode='livesum',
+)
+TASK_LATENCY = Histogram(
+    'clinlogix_task_duration_seconds',
+    'Time spent sending emails, writing audit logs and rendering PDFs',
+    ['task'],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+@contextmanager
+def track_task(task):
+    """Count ``task`` as in progress and time it"""
+    gauge = TASKS_IN_PROGRESS.labels(task)
+    gauge.inc()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        TASK_LATENCY.labels(task).observe(time.perf_counter() - start)
+        gauge.dec()
+
+
+# (view, method, status) -> labelled children, skipping labels()'s validation on the hot path
+_request_children = {}
+
+
+def observe_request(view, method, status, duration, db_duration):
+    key = (view, method, status)
+    children = _request_children.get(key)
+    if children is None:
+        children = _request_children[key] = (
+            REQUESTS.labels(view, method, status),
+            REQUEST_LATENCY.labels(view, method),
+            DB_TIME.labels(view),
+        )
+    requests, latency, db_time = children
+    requests.inc()
+    latency.observe(duration)
+    db_time.observe(db_duration)
+
+
+def observe_memory(view, peak, net):
+    REQUEST_MEMORY_PEAK.labels(view).observe(peak)
+    REQUEST_MEMORY_NET.labels(view).observe(net)
+
+
+def exposition():
+    """Body and content type for a scrape, merged across workers in multiprocess mode"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
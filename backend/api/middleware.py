@@ -0,0 +1,417 @@
+"""
+Request middleware
+
+Every middleware here runs natively under both WSGI and ASGI (core/asgi.py):
+with an async chain Django calls ``__acall__``, so requests to the async
+views don't hop to a worker thread and back at each layer. Blocking work
+(database, token checks) is pushed to threads with ``sync_to_async``.
+"""
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+
+from api import idempotency, memprofile
+from api.async_db import wrap_queries
+from api.db_routers import is_pinned, on_shard, pin_to_primary, reset_replica, sharding_enabled, use_replica
+from api.metrics import observe_memory, observe_request
+from api.profiling import make_profiler, requested_mode, save_profile
+from api.querycount import QueryBudgetExceeded, QueryStats, resolve_budget, view_label
+from api.sharding import institution_for_user, is_moving, shard_for_institution, write_fence
+from api.slowqueries import SlowQueryRecorder, reset_current_view, set_current_view
+from api.tracing import QuerySpans, start_trace, tracing_enabled
+from api.utils import get_token_user_id, remote_address_in
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+query_logger = logging.getLogger('api.queries')
+
+
+class AsyncCapableMiddleware:
+    """
+    Base for middleware with a sync ``__call__`` and an async ``__acall__``
+
+    ``__call__`` must start with ``if self.async_mode: return
+    self.__acall__(request)``, as Django's MiddlewareMixin does.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+
+class MetricsMiddleware(AsyncCapableMiddleware):
+    """
+    Record each request's count, latency and DB time in Prometheus metrics
+
+    Runs outside QueryCountMiddleware so its query stats are complete.
+    Requests that match no view are labelled 'unmatched' to keep the label
+    set bounded.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self.observe(request, response, start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self.observe(request, response, start)
+        return response
+
+    @staticmethod
+    def observe(request, response, start):
+        stats = getattr(request, 'query_stats', None)
+        observe_request(
+            getattr(request, 'view_label', None) or 'unmatched',
+            request.method,
+            response.status_code,
+            time.perf_counter() - start,
+            stats.duration if stats else 0.0,
+        )
+
+
+class TracingMiddleware(AsyncCapableMiddleware):
+    """
+    Trace sampled requests: a root span per request, a child span per query
+
+    See api/tracing.py for sampling and export. The root span is renamed
+    to the view once it is known, and the trace id is returned in
+    ``X-Trace-Id``.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.query_spans = QuerySpans()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not tracing_enabled():
+            return self.get_response(request)
+
+        with self.start(request) as root:
+            if root is None:
+                return self.get_response(request)
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(self.query_spans))
+                response = self.get_response(request)
+            return self.finish(request, response, root)
+
+    async def __acall__(self, request):
+        if not tracing_enabled():
+            return await self.get_response(request)
+
+        with self.start(request) as root:
+            if root is None:
+                return await self.get_response(request)
+            with wrap_queries(self.query_spans):
+                response = await self.get_response(request)
+            return self.finish(request, response, root)
+
+    @staticmethod
+    def start(request):
+        return start_trace(
+            f"{request.method} {request.path}",
+            request.headers.get('traceparent'),
+            trust_sampled=remote_address_in(request, getattr(settings, 'TRACE_TRUSTED_PROXIES', [])),
+            **{'http.method': request.method, 'http.target': request.path},
+        )
+
+    @staticmethod
+    def finish(request, response, root):
+        view = getattr(request, 'view_label', None)
+        if view:
+            root.name = f"{request.method} {view}"
+            root.set('view', view)
+        root.set('http.status_code', response.status_code)
+        response['X-Trace-Id'] = root.trace.trace_id
+        return response
+
+
+class QueryCountMiddleware(AsyncCapableMiddleware):
+    """
+    Count each request's queries, report them and check the view's budget
+
+    Adds ``Server-Timing: db;dur=<ms>;desc="<n> queries", db-dup;desc="<n>
+    duplicate"`` to every response. See api/querycount.py for declaring
+    budgets. Also captures slow queries (api/slowqueries.py).
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.slow_queries = SlowQueryRecorder()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats = self.start(request)
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(stats))
+                stack.enter_context(connections[alias].execute_wrapper(self.slow_queries))
+            try:
+                response = self.get_response(request)
+            finally:
+                if request.view_label_token is not None:
+                    reset_current_view(request.view_label_token)
+        return self.finish(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = self.start(request)
+        with wrap_queries(stats, self.slow_queries):
+            try:
+                response = await self.get_response(request)
+            finally:
+                if request.view_label_token is not None:
+                    reset_current_view(request.view_label_token)
+        return self.finish(request, response, stats)
+
+    @staticmethod
+    def start(request):
+        stats = QueryStats()
+        request.query_stats = stats
+        request.query_budget = None
+        request.view_label = None
+        request.view_label_token = None
+        return stats
+
+    @staticmethod
+    def finish(request, response, stats):
+        timing = stats.server_timing()
+        if response.has_header('Server-Timing'):
+            timing = f"{response['Server-Timing']}, {timing}"
+        response['Server-Timing'] = timing
+
+        budget = request.query_budget
+        if budget is not None and stats.count > budget:
+            message = f"{request.method} {request.path} ran {stats.count} queries (budget {budget})"
+            repeated = '; '.join(f"{count}x {sql[:200]}" for sql, count in stats.duplicates()[:5])
+            if repeated:
+                message = f"{message}; repeated: {repeated}"
+            if getattr(settings, 'QUERY_BUDGET_ENFORCE', False):
+                raise QueryBudgetExceeded(message)
+            query_logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = resolve_budget(view_func, request.method)
+        request.view_label = view_label(view_func, request.method)
+        request.view_label_token = set_current_view(request.view_label)
+
+
+class ProfilingMiddleware(AsyncCapableMiddleware):
+    """
+    Run a request under cProfile or the stack sampler when asked to
+
+    See api/profiling.py for how a request opts in and where the output
+    goes. Both profilers follow a single thread, which an async request
+    does not stay on, so requests served through ASGI are not profiled.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        mode = requested_mode(request)
+        if mode is None:
+            return self.get_response(request)
+
+        profiler = make_profiler(mode)
+        try:
+            profiler.enable()
+        except ValueError:
+            # cProfile is interpreter-wide on Python 3.12+; another request
+            # on this worker is already being profiled
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        response['X-Profile-File'] = save_profile(profiler, mode, request)
+        return response
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+
+class AllocationProfilingMiddleware(AsyncCapableMiddleware):
+    """
+    Record each view's peak and net Python allocations when MEMORY_PROFILING is on
+
+    See api/memprofile.py. The numbers also go to the Prometheus memory
+    histograms and a ``mem`` entry in Server-Timing.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not memprofile.profiling_enabled():
+            return self.get_response(request)
+
+        baseline = memprofile.start()
+        response = self.get_response(request)
+        return self.finish(request, response, baseline)
+
+    async def __acall__(self, request):
+        if not memprofile.profiling_enabled():
+            return await self.get_response(request)
+
+        baseline = memprofile.start()
+        response = await self.get_response(request)
+        return self.finish(request, response, baseline)
+
+    @staticmethod
+    def finish(request, response, baseline):
+        peak, net, sites = memprofile.measure(baseline)
+        view = getattr(request, 'view_label', None)
+        memprofile.record(view or f"{request.method} {request.path}", peak, net, sites)
+        observe_memory(view or 'unmatched', peak, net)
+
+        timing = f'mem;desc="peak {peak / 1024:.0f} KiB, net {net / 1024:.0f} KiB"'
+        if response.has_header('Server-Timing'):
+            timing = f"{response['Server-Timing']}, {timing}"
+        response['Server-Timing'] = timing
+        return response
+
+
+class IdempotencyMiddleware(AsyncCapableMiddleware):
+    """
+    Replay the stored response for retried POSTs with an Idempotency-Key
+
+    See api/idempotency.py. Sits inside CorsMiddleware so replayed
+    responses still get CORS headers, and before the routing middleware
+    so a replay touches no database.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not idempotency.tracked(request):
+            return self.get_response(request)
+        return idempotency.handle(request, self.get_response)
+
+    async def __acall__(self, request):
+        if not idempotency.tracked(request):
+            return await self.get_response(request)
+        return await idempotency.ahandle(request, self.get_response)
+
+
+class ShardRoutingMiddleware(AsyncCapableMiddleware):
+    """
+    Route the request's tenant queries to its user's institution shard
+
+    While the institution is being moved between shards its unsafe
+    requests are refused with 503 so no write lands on the old shard
+    after it has been copied: up front once this worker's shard map says
+    it is moving, and otherwise when the move already holds the
+    institution's write fence, which unsafe requests hold shared while
+    they run.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not sharding_enabled():
+            return self.get_response(request)
+
+        institution_id, alias, moving = self.placement(request)
+        if request.method in SAFE_METHODS:
+            with on_shard(alias):
+                return self.get_response(request)
+
+        if moving:
+            return self.migrating_response()
+        with write_fence(institution_id, alias) as fenced:
+            if not fenced:
+                return self.migrating_response()
+            with on_shard(alias):
+                return self.get_response(request)
+
+    async def __acall__(self, request):
+        if not sharding_enabled():
+            return await self.get_response(request)
+
+        institution_id, alias, moving = await sync_to_async(self.placement)(request)
+        if request.method in SAFE_METHODS:
+            with on_shard(alias):
+                return await self.get_response(request)
+
+        if moving:
+            return self.migrating_response()
+        # Entered and exited on the request's thread-sensitive thread, whose
+        # connection the sync views below write through
+        fence = write_fence(institution_id, alias)
+        if not await sync_to_async(fence.__enter__)():
+            await sync_to_async(fence.__exit__)(None, None, None)
+            return self.migrating_response()
+        try:
+            with on_shard(alias):
+                return await self.get_response(request)
+        finally:
+            await sync_to_async(fence.__exit__)(None, None, None)
+
+    @staticmethod
+    def placement(request):
+        """(institution id, shard alias, whether it is moving) for the request's user"""
+        institution_id = institution_for_user(get_token_user_id(request))
+        return institution_id, shard_for_institution(institution_id), is_moving(institution_id)
+
+    @staticmethod
+    def migrating_response():
+        return JsonResponse({
+            'success': False,
+            'message': 'Institution data is being migrated, please retry shortly.',
+        }, status=503)
+
+
+class ReplicaRoutingMiddleware(AsyncCapableMiddleware):
+    """
+    Let safe-method requests read from replicas, with read-your-writes
+
+    A successful unsafe request pins the user to the primary for
+    REPLICA_PIN_SECONDS, so e.g. the student list fetched right after
+    saving an entry doesn't miss it because of replication lag.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        user_key = get_token_user_id(request)
+        safe = request.method in SAFE_METHODS
+        token = use_replica(safe and not is_pinned(user_key))
+        try:
+            response = self.get_response(request)
+        finally:
+            reset_replica(token)
+
+        if not safe and response.status_code < 400:
+            pin_to_primary(user_key)
+        return response
+
+    async def __acall__(self, request):
+        # The session fallback in get_token_user_id() may query
+        user_key = await sync_to_async(get_token_user_id)(request)
+        safe = request.method in SAFE_METHODS
+        token = use_replica(safe and not await sync_to_async(is_pinned)(user_key))
+        try:
+            response = await self.get_response(request)
+        finally:
+            reset_replica(token)
+
+        if not safe and response.status_code < 400:
+            await sync_to_async(pin_to_primary)(user_key)
+        return response
@@ -1,9 +1,13 @@
 """
 Reusable mixins for common functionality
 """
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework.response import Response
 from rest_framework import status
-from api.models import Profiles
+from rest_framework.decorators import action
+from api.prepared import request_profile
+from api.compiled import compile_serializer
+from api.exceptions import ValidationError
 
 
 class UserProfileMixin:
@@ -11,11 +15,8 @@ class UserProfileMixin:
     Mixin to get current user's profile
     """
     def get_user_profile(self):
-        """Get the profile of the authenticated user"""
-        try:
-            return Profiles.objects.get(email=self.request.user.email)
-        except Profiles.DoesNotExist:
-            return None
+        """Get the profile of the authenticated user (looked up once per request)"""
+        return request_profile(self.request)
 
 
 class FilterByUserMixin(UserProfileMixin):
@@ -94,6 +95,197 @@ class ResponseMixin:
         return Response(response_data, status=status_code)
 
 
+class QueryParamFilterMixin:
+    """
+    Mixin filtering the list endpoint by exact-match query params
+
+    ``filter_params`` maps each query param to the model lookup it filters
+    on, e.g. ``{'role': 'role', 'institution_id': 'institution_id'}``.
+    Params that are absent or empty are ignored.
+    """
+    filter_params = {}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action != 'list':
+            return queryset
+
+        for param, lookup in self.filter_params.items():
+            value = self.request.query_params.get(param)
+            if not value:
+                continue
+            try:
+                queryset = queryset.filter(**{lookup: value})
+            except DjangoValidationError:
+                raise ValidationError(f"Invalid value for {param}: {value}")
+        return queryset
+
+
+class SparseFieldsetMixin:
+    """
+    Mixin letting list/detail requests ask for only some serializer fields
+
+        ?fields=id,date,hours        explicit fields
+        ?view=summary                a named projection from ``projections``
+        ?view=summary&fields=reflection   both, combined
+
+    Unrequested fields are dropped from the serializer, and the model
+    columns only they read are deferred in the queryset, so they are
+    neither loaded nor serialized. Applies to the actions in
+    ``sparse_actions``; unknown fields or views are a 400.
+    """
+    projections = {}
+    sparse_actions = ('list', 'retrieve')
+
+    def sparse_fields(self):
+        """Requested field names, or None for all of them"""
+        if not hasattr(self, '_sparse_fields'):
+            self._sparse_fields = self._parse_sparse_fields()
+        return self._sparse_fields
+
+    def _parse_sparse_fields(self):
+        params = self.request.query_params
+        view, names = params.get('view'), params.get('fields')
+        if (not view and not names) or self.action not in self.sparse_actions:
+            return None
+
+        requested = set()
+        if view:
+            if view not in self.projections:
+                available = ', '.join(self.projections) or 'none'
+                raise ValidationError(f"Unknown view: {view}. Available: {available}")
+            requested.update(self.projections[view])
+        if names:
+            requested.update(name.strip() for name in names.split(',') if name.strip())
+            readable = {name for name, field in self.get_serializer_class()().fields.items() if not field.write_only}
+            unknown = sorted(requested - readable)
+            if unknown:
+                raise ValidationError(f"Unknown field(s): {', '.join(unknown)}")
+        return frozenset(requested)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.sparse_fields()
+        if fields is None:
+            return queryset
+
+        # Columns some requested field reads (its first source attribute),
+        # plus those ordering and cursor pagination read back off the rows
+        needed = {queryset.model._meta.pk.name}
+        for ordering in (getattr(self, 'ordering', None), getattr(self, 'ordering_fields', None)):
+            if isinstance(ordering, (list, tuple)):
+                needed.update(name.lstrip('-') for name in ordering)
+        if isinstance(queryset.query.select_related, dict):
+            needed.update(queryset.query.select_related)
+        elif queryset.query.select_related:
+            return queryset
+        for name, field in self.get_serializer_class()().fields.items():
+            if name in fields:
+                if not field.source_attrs:
+                    return queryset  # reads the whole instance
+                needed.add(field.source_attrs[0])
+        deferred = [
+            field.name for field in queryset.model._meta.concrete_fields
+            if field.name not in needed and field.attname not in needed
+        ]
+        return queryset.defer(*deferred)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        fields = self.sparse_fields()
+        if fields is not None:
+            target = getattr(serializer, 'child', serializer)
+            for name in list(target.fields):
+                if name not in fields:
+                    target.fields.pop(name)
+        return serializer
+
+
+class CompiledListMixin:
+    """
+    Mixin serving the list endpoint through the compiled serializer
+
+    The filtered queryset is read with ``.values()`` for just the columns
+    the serializer's fields need (related ones joined in the same query)
+    and converted by api/compiled.py, with the same output as the
+    serializer. Every other action uses the serializer as usual.
+    Requires SparseFieldsetMixin.
+    """
+
+    def compiled_serializer(self):
+        return compile_serializer(self.get_serializer_class(), fields=self.sparse_fields())
+
+    def list(self, request, *args, **kwargs):
+        compiled = self.compiled_serializer()
+        rows = self.filter_queryset(self.get_queryset()).values(*compiled.columns)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(compiled.many(page))
+        return Response(compiled.many(rows))
+
+
+def home_section(viewset_class, action_name):
+    """
+    Section for HomeMixin that runs an existing viewset action in-process
+
+    The action sees the home request (already authenticated and permitted)
+    and its data is returned without the ResponseMixin envelope.
+    """
+    def run(view, request):
+        section_view = viewset_class(
+            action=action_name, request=request, format_kwarg=None, args=(), kwargs={}
+        )
+        handler = getattr(viewset_class, action_name)
+        # The home response has no ETag of its own to compare against
+        handler = getattr(handler, 'unconditional', handler)
+        data = handler(section_view, request).data
+        if isinstance(data, dict) and 'success' in data and 'data' in data:
+            return data['data']
+        return data
+    return run
+
+
+def profile_section(view, request):
+    """Section for HomeMixin with the same payload as GET /api/me/"""
+    from api.serializers import ProfileSerializer, UserSerializer
+
+    profile = view.get_user_profile()
+    return {
+        'user': UserSerializer(request.user).data,
+        'profile': ProfileSerializer(profile).data if profile else None,
+    }
+
+
+class HomeMixin(UserProfileMixin):
+    """
+    Mixin for per-role composite "home" endpoints
+
+    ``home_sections`` maps each section name to a callable(view, request)
+    returning its data (see home_section). ``?include=stats,logs`` picks
+    sections; all are returned by default. Every section shares the one
+    request, so authentication and the profile lookup run once.
+    Requires ResponseMixin.
+    """
+    home_sections = {}
+
+    def list(self, request):
+        include = request.query_params.get('include')
+        if include:
+            names = [name.strip() for name in include.split(',') if name.strip()]
+        else:
+            names = list(self.home_sections)
+
+        unknown = [name for name in names if name not in self.home_sections]
+        if unknown:
+            raise ValidationError(
+                f"Unknown section(s): {', '.join(unknown)}. "
+                f"Available: {', '.join(self.home_sections)}"
+            )
+        return self.success_response({
+            name: self.home_sections[name](self, request) for name in names
+        })
+
+
 class PaginationMixin:
     """
     Mixin for consistent pagination settings
@@ -101,3 +293,57 @@ class PaginationMixin:
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
+
+
+class LogSearchMixin:
+    """
+    Mixin adding ranked full-text search over log entry narratives
+
+    Searches the same role-scoped queryset the viewset lists, so students
+    only match their own entries and instructors their assigned students'.
+    Requires ResponseMixin.
+    """
+    search_default_limit = 20
+    search_max_limit = 100
+
+    def get_search_queryset(self):
+        """Queryset the search runs against (defaults to get_queryset())"""
+        return self.get_queryset()
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Search log entries by activities, objectives, reflection and feedback
+
+        Query params:
+            - q: Search text (required)
+            - limit: Maximum number of results (default 20, max 100)
+        """
+        from api.search import search_log_entries
+        from api.serializers import LogEntrySerializer
+
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError("Query parameter 'q' is required")
+
+        try:
+            limit = int(request.query_params.get('limit', self.search_default_limit))
+        except ValueError:
+            raise ValidationError("limit must be an integer")
+        limit = max(1, min(limit, self.search_max_limit))
+
+        total, hits, truncated = search_log_entries(self.get_search_queryset(), query, limit)
+        entries = LogEntrySerializer([hit.entry for hit in hits], many=True).data
+
+        results = []
+        for hit, data in zip(hits, entries):
+            data['rank'] = hit.rank
+            data['highlights'] = hit.highlights
+            results.append(data)
+
+        return self.success_response({
+            'query': query,
+            'total_count': total,
+            'truncated': truncated,
+            'results': results,
+        })
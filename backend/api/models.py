@@ -168,6 +168,15 @@ class LogEntries(models.Model):
     # Number of patients seen
     patients_seen = models.IntegerField(blank=True, null=True)
 
+    # Position in the change sequence, bumped on every insert/update (api/sync.py)
+    change_seq = models.BigIntegerField(blank=True, null=True, editable=False)
+
+    # When the entry was last inserted/updated, set alongside change_seq
+    updated_at = models.DateTimeField(blank=True, null=True, editable=False)
+
+    # Client-chosen key making offline uploads idempotent, unique per student
+    idempotency_key = models.TextField(blank=True, null=True)
+
     class Meta:
         managed = False
         db_table = 'log_entries'
@@ -295,4 +304,101 @@ class StudentPreceptorAssignments(models.Model):
         db_table = 'student_preceptor_assignments'
 
         # A student-preceptor pair must be unique
-        unique_together = (('student', 'preceptor'),)
\ No newline at end of file
+        unique_together = (('student', 'preceptor'),)
+
+# =======================
+# LogEntryActivities Model
+# =======================
+class LogEntryActivities(models.Model):
+    # Tag unique ID
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    # Log entry the activity was found in
+    log_entry = models.ForeignKey(LogEntries, models.DO_NOTHING)
+
+    # Matched catalog activity
+    activity = models.ForeignKey(ClinicalActivities, models.DO_NOTHING)
+
+    # Student who wrote the entry (denormalized for fast coverage queries)
+    student = models.ForeignKey(Profiles, models.DO_NOTHING)
+
+    # How many times the activity was mentioned in the entry
+    occurrences = models.IntegerField(default=1)
+
+    # When the entry was last tagged
+    tagged_at = models.DateTimeField()
+
+    class Meta:
+        managed = False
+        db_table = 'log_entry_activities'
+
+        # An activity is tagged at most once per entry
+        unique_together = (('log_entry', 'activity'),)
+
+
+# =======================
+# InstitutionShards Model
+# =======================
+class InstitutionShards(models.Model):
+    # Institution whose tenant data lives on a shard
+    institution = models.OneToOneField(Institutions, models.DO_NOTHING, primary_key=True)
+
+    # Database alias holding the institution's data
+    shard = models.TextField()
+
+    # Writes are refused while the institution is being moved between shards
+    moving = models.BooleanField(default=False)
+
+    # When the mapping last changed
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        managed = False
+        db_table = 'institution_shards'
+
+
+# =======================
+# LogEntryTombstones Model
+# =======================
+class LogEntryTombstones(models.Model):
+    # Deleted log entry
+    entry_id = models.UUIDField(primary_key=True)
+
+    # Student the entry belonged to
+    student_id = models.UUIDField(db_index=True)
+
+    # Position in the log entry change sequence when it was deleted
+    change_seq = models.BigIntegerField()
+
+    # When the entry was deleted
+    deleted_at = models.DateTimeField()
+
+    class Meta:
+        managed = False
+        db_table = 'log_entry_tombstones'
+
+
+# =======================
+# IdempotencyKeys Model
+# =======================
+class IdempotencyKeys(models.Model):
+    # sha256 of the user, method, path and Idempotency-Key header
+    key = models.CharField(max_length=64, primary_key=True)
+
+    # sha256 of the request body the key was first used with
+    fingerprint = models.CharField(max_length=64)
+
+    # Stored response; status is null while the first attempt is running
+    status = models.SmallIntegerField(blank=True, null=True)
+    headers = models.JSONField(blank=True, null=True)
+    body = models.BinaryField(blank=True, null=True)
+
+    # When a running attempt is presumed dead and the key may be claimed again
+    locked_until = models.DateTimeField()
+
+    # When the row may be claimed again or purged
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        managed = False
+        db_table = 'idempotency_keys'
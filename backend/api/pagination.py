@@ -0,0 +1,26 @@
+"""
+Pagination classes
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class OptionalCursorPagination(CursorPagination):
+    """
+    Cursor pagination that only kicks in when the client asks for it
+
+    Requests with ``?page_size=`` or ``?cursor=`` get
+    ``{"next", "previous", "results"}`` pages. Plain requests keep
+    getting the whole (filtered) list as an array, as existing callers
+    expect. The sort order comes from the view's OrderingFilter
+    (``?ordering=``), falling back to ``ordering`` below.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = '-created_at'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
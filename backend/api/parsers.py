@@ -0,0 +1,34 @@
+"""
+Request parsers
+"""
+import orjson
+from django.conf import settings
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+
+from api.renderers import JSONRenderer
+
+
+UTF8_NAMES = ('utf-8', 'utf8')
+
+
+class JSONParser(parsers.JSONParser):
+    """
+    JSON parsed with orjson
+
+    orjson only reads UTF-8, so bodies in any other declared charset go
+    through DRF's json.load parser. Unlike json.load, orjson rejects
+    NaN and Infinity, as DRF's strict mode does.
+    """
+    renderer_class = JSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if encoding.lower() not in UTF8_NAMES:
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -2,7 +2,7 @@
 Custom permission classes for role-based access control
 """
 from rest_framework import permissions
-from api.models import Profiles
+from api.prepared import assigned_student_ids, request_profile
 
 
 class IsStudent(permissions.BasePermission):
@@ -15,11 +15,8 @@ class IsStudent(permissions.BasePermission):
         if not request.user.is_authenticated:
             return False
         
-        try:
-            profile = Profiles.objects.get(email=request.user.email)
-            return profile.role == 'student'
-        except Profiles.DoesNotExist:
-            return False
+        profile = request_profile(request)
+        return profile is not None and profile.role == 'student'
 
 
 class IsInstructor(permissions.BasePermission):
@@ -32,11 +29,8 @@ class IsInstructor(permissions.BasePermission):
         if not request.user.is_authenticated:
             return False
         
-        try:
-            profile = Profiles.objects.get(email=request.user.email)
-            return profile.role == 'instructor'
-        except Profiles.DoesNotExist:
-            return False
+        profile = request_profile(request)
+        return profile is not None and profile.role == 'instructor'
 
 
 class IsAdmin(permissions.BasePermission):
@@ -49,11 +43,8 @@ class IsAdmin(permissions.BasePermission):
         if not request.user.is_authenticated:
             return False
         
-        try:
-            profile = Profiles.objects.get(email=request.user.email)
-            return profile.role == 'admin'
-        except Profiles.DoesNotExist:
-            return False
+        profile = request_profile(request)
+        return profile is not None and profile.role == 'admin'
 
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
@@ -79,14 +70,8 @@ class IsAssignedInstructor(permissions.BasePermission):
         if not request.user.is_authenticated:
             return False
         
-        try:
-            profile = Profiles.objects.get(email=request.user.email)
-            # Check if this instructor is assigned to the student
-            from api.models import StudentPreceptorAssignments
-            return StudentPreceptorAssignments.objects.filter(
-                student=obj.student,
-                preceptor=profile,
-                status='active'
-            ).exists()
-        except Profiles.DoesNotExist:
+        profile = request_profile(request)
+        if profile is None:
             return False
+        # Check if this instructor is assigned to the student
+        return obj.student_id in assigned_student_ids(profile)
@@ -0,0 +1,148 @@
+"""
+Server-side prepared statements for the hottest queries
+
+Profile-by-email runs on practically every request (permissions and
+UserProfileMixin), and the assignment, pending review and student log
+queries back the most used list screens. On the pooled backend
+(core.db, with ``OPTIONS['prepared_statements']``) each statement is
+PREPAREd once per physical connection and then run with EXECUTE, so
+Postgres skips parsing and planning. Everywhere else the same queries run
+through the ORM, so callers never need to care which path was taken.
+"""
+from django.db import connections, router
+
+from api.constants import AssignmentStatus, LogStatus
+from api.models import LogEntries, Profiles, StudentPreceptorAssignments
+from api.tracing import traced
+
+
+def _columns(connection, model, alias=None):
+    prefix = f'{alias}.' if alias else ''
+    return ', '.join(prefix + connection.ops.quote_name(field.column) for field in model._meta.concrete_fields)
+
+
+# Keys of the log entry rows returned below, as ``.values()`` would name them
+ENTRY_ROW_COLUMNS = tuple(field.name for field in LogEntries._meta.concrete_fields) + ('student__full_name',)
+
+
+# name -> callable(connection) returning the statement text ($n placeholders)
+STATEMENTS = {
+    'profile_by_email': lambda connection: (
+        f"SELECT {_columns(connection, Profiles)} FROM profiles WHERE email = $1 LIMIT 1"
+    ),
+    'assigned_student_ids': lambda connection: (
+        "SELECT student_id FROM student_preceptor_assignments"
+        " WHERE preceptor_id = $1 AND status = $2"
+    ),
+    'pending_reviews': lambda connection: (
+        f"SELECT {_columns(connection, LogEntries, 'e')}, p.full_name FROM log_entries e"
+        " LEFT JOIN profiles p ON p.id = e.student_id"
+        " WHERE e.status = $2 AND e.student_id IN ("
+        "   SELECT student_id FROM student_preceptor_assignments"
+        "   WHERE preceptor_id = $1 AND status = $3"
+        " ) ORDER BY e.submitted_at DESC"
+    ),
+    'student_logs': lambda connection: (
+        f"SELECT {_columns(connection, LogEntries, 'e')}, p.full_name FROM log_entries e"
+        " LEFT JOIN profiles p ON p.id = e.student_id"
+        " WHERE e.student_id = $1 ORDER BY e.date DESC"
+    ),
+}
+
+
+def _enabled(db):
+    return getattr(connections[db], 'prepared_statements_enabled', False)
+
+
+def _execute_sql(db, name, param_count):
+    """PREPARE ``name`` on this connection if needed; return its EXECUTE statement"""
+    connection = connections[db]
+    connection.ensure_connection()
+    prepared = connection.connection.prepared
+    if name not in prepared:
+        with connection.cursor() as cursor:
+            cursor.execute(f"PREPARE {name} AS {STATEMENTS[name](connection)}")
+        prepared.add(name)
+    placeholders = ', '.join(['%s'] * param_count)
+    return f"EXECUTE {name}({placeholders})"
+
+
+@traced('profile.lookup')
+def profile_by_email(email):
+    """Profile for an email address, or None"""
+    if not email:
+        return None
+    db = router.db_for_read(Profiles)
+    if not _enabled(db):
+        return Profiles.objects.using(db).filter(email=email).first()
+    sql = _execute_sql(db, 'profile_by_email', 1)
+    return next(iter(Profiles.objects.raw(sql, [email], using=db)), None)
+
+
+def request_profile(request):
+    """
+    Profile of a request's user, looked up once per request
+
+    Shared by the permission classes and UserProfileMixin. Batched
+    sub-requests (api/views/batch.py) are handed the outer request's
+    profile up front.
+    """
+    if not hasattr(request, '_user_profile'):
+        request._user_profile = profile_by_email(request.user.email)
+    return request._user_profile
+
+
+@traced('assignments.lookup')
+def assigned_student_ids(preceptor):
+    """Ids of the students actively assigned to a preceptor"""
+    db = router.db_for_read(StudentPreceptorAssignments)
+    if not _enabled(db):
+        return list(StudentPreceptorAssignments.objects.using(db).filter(
+            preceptor=preceptor,
+            status=AssignmentStatus.ACTIVE
+        ).values_list('student_id', flat=True))
+    sql = _execute_sql(db, 'assigned_student_ids', 2)
+    with connections[db].cursor() as cursor:
+        cursor.execute(sql, [preceptor.id, AssignmentStatus.ACTIVE])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _entry_rows(db, sql, params):
+    with connections[db].cursor() as cursor:
+        cursor.execute(sql, params)
+        return [dict(zip(ENTRY_ROW_COLUMNS, row)) for row in cursor.fetchall()]
+
+
+def pending_reviews(preceptor):
+    """
+    Pending entries of a preceptor's assigned students, newest submission first
+
+    Returns:
+        ENTRY_ROW_COLUMNS dicts (see api/compiled.py)
+    """
+    db = router.db_for_read(LogEntries)
+    if not _enabled(db):
+        student_ids = StudentPreceptorAssignments.objects.using(db).filter(
+            preceptor=preceptor,
+            status=AssignmentStatus.ACTIVE
+        ).values_list('student_id', flat=True)
+        return list(LogEntries.objects.using(db).filter(
+            student_id__in=student_ids,
+            status=LogStatus.PENDING
+        ).order_by('-submitted_at').values(*ENTRY_ROW_COLUMNS))
+    sql = _execute_sql(db, 'pending_reviews', 3)
+    return _entry_rows(db, sql, [preceptor.id, LogStatus.PENDING, AssignmentStatus.ACTIVE])
+
+
+def student_logs(student):
+    """
+    A student's log entries, most recent date first
+
+    Returns:
+        ENTRY_ROW_COLUMNS dicts (see api/compiled.py)
+    """
+    db = router.db_for_read(LogEntries)
+    if not _enabled(db):
+        return list(LogEntries.objects.using(db).filter(student=student).order_by('-date').values(*ENTRY_ROW_COLUMNS))
+    sql = _execute_sql(db, 'student_logs', 1)
+    return _entry_rows(db, sql, [student.id])
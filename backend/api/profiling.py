@@ -0,0 +1,126 @@
+"""
+On-demand and sampled request profiling
+
+An admin can profile a single request by sending ``X-Profile: cprofile``
+(or ``?profile=cprofile``). Use ``sample`` instead for the low-overhead
+stack sampler. Separately, ``PROFILE_SAMPLE_RATE`` profiles that fraction
+of all requests with ``PROFILE_DEFAULT_MODE`` for continuous profiling.
+
+Output is written to ``PROFILE_DIR`` and named in the response's
+``X-Profile-File`` header:
+    cprofile: ``.prof`` pstats dump (``python -m pstats``, snakeviz,
+        gprof2dot, flameprof)
+    sample: ``.folded`` collapsed stacks (flamegraph.pl, speedscope)
+"""
+import cProfile
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+
+from api.authentication import MeteredJWTAuthentication
+from api.prepared import profile_by_email
+
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = 'profile'
+MODES = ('cprofile', 'sample')
+
+UNSAFE_FILENAME_RE = re.compile(r'[^A-Za-z0-9]+')
+
+
+class StackSampler:
+    """
+    Samples one thread's Python stack on a timer
+
+    The sampler thread only reads ``sys._current_frames()``, so the
+    profiled thread runs at full speed apart from the GIL handoffs.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._target = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def enable(self):
+        self._target = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def disable(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump_stats(self, path):
+        """Write collapsed stacks, one ``frame;frame;frame count`` line per stack"""
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _is_admin(request):
+    """Whether the request carries a valid admin access token (for an active user)"""
+    try:
+        result = MeteredJWTAuthentication().authenticate(request)
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return False
+    if result is None:
+        return False
+    profile = profile_by_email(result[0].email)
+    return profile is not None and profile.role == 'admin'
+
+
+def requested_mode(request):
+    """
+    Profiler to run this request under, or None
+
+    An explicit request is honoured for admins only; anything else falls
+    back to the global sampling rate.
+    """
+    mode = request.META.get(PROFILE_HEADER) or request.GET.get(PROFILE_PARAM)
+    if mode:
+        mode = mode.strip().lower()
+        if mode in MODES and _is_admin(request):
+            return mode
+    rate = getattr(settings, 'PROFILE_SAMPLE_RATE', 0.0)
+    if rate and random.random() < rate:
+        return getattr(settings, 'PROFILE_DEFAULT_MODE', 'sample')
+    return None
+
+
+def make_profiler(mode):
+    if mode == 'cprofile':
+        return cProfile.Profile()
+    return StackSampler(getattr(settings, 'PROFILE_SAMPLE_INTERVAL_MS', 5) / 1000)
+
+
+def save_profile(profiler, mode, request):
+    """Write the profile to PROFILE_DIR; returns the file name"""
+    directory = getattr(settings, 'PROFILE_DIR', None) or os.path.join(tempfile.gettempdir(), 'clinlogix-profiles')
+    os.makedirs(directory, exist_ok=True)
+    path_part = UNSAFE_FILENAME_RE.sub('-', request.path).strip('-') or 'root'
+    extension = 'prof' if mode == 'cprofile' else 'folded'
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}-{request.method}-{path_part}-{uuid.uuid4().hex[:8]}.{extension}"
+    profiler.dump_stats(os.path.join(directory, name))
+    return name
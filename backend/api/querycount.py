@@ -0,0 +1,127 @@
+"""
+Per-request query counting and query budgets
+
+QueryCountMiddleware wraps every database connection used by the request
+thread and records the query count, total DB time and a fingerprint of
+each statement, so N+1 loops show up as one fingerprint repeated many
+times. Queries run on other threads (``sharding.fan_out``) are not
+counted, except under ASGI, where the middleware follows the request into
+its sync_to_async and async query pool threads (``async_db.wrap_queries``).
+
+Budgets are declared on the view:
+
+    class StudentLogViewSet(...):
+        query_budget = 8                # every action of the viewset
+
+        @action(detail=False, methods=['get'])
+        @query_budget(4)                # just this action
+        def stats(self, request): ...
+
+Requests over budget are logged to the ``api.queries`` logger. With
+``QUERY_BUDGET_ENFORCE = True`` (e.g. ``@override_settings`` in tests)
+they raise QueryBudgetExceeded instead, failing the test client call.
+"""
+import re
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+
+WHITESPACE_RE = re.compile(r"\s+")
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+IN_LIST_RE = re.compile(r"\bIN \((?:\s*(?:%s|\?)\s*,?)+\)", re.IGNORECASE)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A request ran more queries than its view's budget allows"""
+
+
+def fingerprint(sql):
+    """SQL with literals and IN lists collapsed, so repeats of one query match"""
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = WHITESPACE_RE.sub(' ', sql).strip()
+    return IN_LIST_RE.sub('IN (...)', sql)
+
+
+def query_budget(limit):
+    """Decorator setting the query budget of a view function or viewset action"""
+    def decorator(func):
+        func.query_budget = limit
+        return func
+    return decorator
+
+
+def _handler(view_func, method):
+    """The view class and the method on it that handles ``method``"""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return None, None
+    actions = getattr(view_func, 'actions', None)
+    name = actions.get(method.lower()) if actions else method.lower()
+    return cls, getattr(cls, name, None) if name else None
+
+
+def view_label(view_func, method):
+    """Readable name of the view handling a request, e.g. 'AdminDashboardViewSet.stats'"""
+    cls, handler = _handler(view_func, method)
+    if cls is not None and handler is not None:
+        return f"{cls.__name__}.{handler.__name__}"
+    if cls is not None:
+        return cls.__name__
+    return getattr(view_func, '__qualname__', repr(view_func))
+
+
+def resolve_budget(view_func, method):
+    """
+    Budget for the view handling a request
+
+    Looks at the action/handler method, then the view function, then the
+    view class, then ``settings.DEFAULT_QUERY_BUDGET``.
+    """
+    cls, handler = _handler(view_func, method)
+    for candidate in (handler, view_func, cls):
+        budget = getattr(candidate, 'query_budget', None)
+        if budget is not None:
+            return budget
+    return getattr(settings, 'DEFAULT_QUERY_BUDGET', None)
+
+
+class QueryStats:
+    """Connection execute_wrapper accumulating one request's queries"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        # Async requests query from several threads at once
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.duration += elapsed
+                self.count += 1
+                self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self):
+        """Fingerprints seen more than once, most repeated first"""
+        return [(sql, count) for sql, count in self.fingerprints.most_common() if count > 1]
+
+    @property
+    def duplicate_count(self):
+        return sum(count - 1 for count in self.fingerprints.values() if count > 1)
+
+    def server_timing(self):
+        """Value for the Server-Timing response header"""
+        return (
+            f'db;dur={self.duration * 1000:.2f};desc="{self.count} queries", '
+            f'db-dup;desc="{self.duplicate_count} duplicate"'
+        )
@@ -0,0 +1,291 @@
+"""
+Full-text search over log entry narratives
+
+On Postgres the search runs against the generated ``search_vector`` column
+(see supabase/migrations/20261018_log_entries_search.sql) so the GIN index
+does the work. Other backends (SQLite test runs) fall back to an in-process
+inverted index built over the most recent FALLBACK_MAX_ROWS entries of the
+scoped queryset; when the scope holds more than that, the search is flagged
+as truncated.
+
+Highlights are HTML: the entry text is escaped and only the ``<mark>``
+tags around matched words are markup, so clients can render them as-is.
+"""
+import html
+import math
+import re
+from collections import defaultdict, namedtuple
+
+from django.db import connections
+
+
+# Narrative columns that are searchable, mapped to their tsvector weight
+SEARCH_FIELDS = {
+    'activities': 'A',
+    'learning_objectives': 'B',
+    'reflection': 'C',
+    'feedback': 'D',
+}
+
+# Same defaults Postgres' ts_rank uses for weights A-D
+WEIGHT_VALUES = {'A': 1.0, 'B': 0.4, 'C': 0.2, 'D': 0.1}
+
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_STOP = '</mark>'
+
+# ts_headline's markers (private use characters), swapped for the tags
+# once the snippet is escaped
+HEADLINE_START = '\ue000'
+HEADLINE_STOP = '\ue001'
+
+# Entries the in-process fallback indexes per search, newest first
+FALLBACK_MAX_ROWS = 5000
+
+# Rough equivalent of ts_headline's MaxWords for the fallback snippets
+SNIPPET_WORDS = 35
+
+SearchHit = namedtuple('SearchHit', ['entry', 'rank', 'highlights'])
+
+STOP_WORDS = frozenset([
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has',
+    'he', 'in', 'is', 'it', 'its', 'of', 'on', 'or', 'she', 'that', 'the',
+    'their', 'they', 'this', 'to', 'was', 'were', 'with',
+])
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def search_log_entries(queryset, query, limit=20):
+    """
+    Rank and highlight log entries matching a free-text query
+
+    Args:
+        queryset: Role-scoped QuerySet of LogEntries to search within
+        query: Raw search string (websearch syntax: words, "phrases", -exclude)
+        limit: Maximum number of hits to return
+
+    Returns:
+        Tuple of (total match count, list of SearchHit ordered by rank,
+        whether only the newest FALLBACK_MAX_ROWS entries were searched)
+    """
+    queryset = queryset.select_related('student')
+    if connections[queryset.db].vendor == 'postgresql':
+        return _search_postgres(queryset, query, limit) + (False,)
+    return _search_in_process(queryset, query, limit)
+
+
+def _search_postgres(queryset, query, limit):
+    """Rank with ts_rank over the indexed search_vector column"""
+    from django.contrib.postgres.search import (
+        SearchHeadline, SearchQuery, SearchRank, SearchVectorField
+    )
+    from django.db.models.expressions import RawSQL
+
+    ts_query = SearchQuery(query, config='english', search_type='websearch')
+    vector = RawSQL('"log_entries"."search_vector"', [], output_field=SearchVectorField())
+
+    matches = queryset.annotate(search_vector=vector).filter(search_vector=ts_query)
+    total = matches.count()
+
+    headlines = {
+        f'{field}_headline': SearchHeadline(
+            field, ts_query, config='english',
+            start_sel=HEADLINE_START, stop_sel=HEADLINE_STOP,
+            max_words=SNIPPET_WORDS, min_words=15, max_fragments=2,
+        )
+        for field in SEARCH_FIELDS
+    }
+    ranked = matches.annotate(
+        rank=SearchRank(vector, ts_query), **headlines
+    ).order_by('-rank', '-submitted_at')[:limit]
+
+    hits = []
+    for entry in ranked:
+        highlights = {}
+        for field in SEARCH_FIELDS:
+            snippet = getattr(entry, f'{field}_headline')
+            # ts_headline returns the leading text even without a match
+            if snippet and HEADLINE_START in snippet:
+                highlights[field] = escape_headline(snippet, getattr(entry, field))
+        hits.append(SearchHit(entry, float(entry.rank), highlights))
+    return total, hits
+
+
+def _search_in_process(queryset, query, limit):
+    """Rank with an inverted index built over the newest scoped rows"""
+    include, exclude = parse_query(query)
+    if not include:
+        return 0, [], False
+
+    index = InvertedIndex()
+    # One extra row tells whether the scope was cut off
+    recent = queryset.order_by('-submitted_at').values_list('id', *SEARCH_FIELDS)[:FALLBACK_MAX_ROWS + 1]
+    truncated = False
+    for count, row in enumerate(recent.iterator()):
+        if count == FALLBACK_MAX_ROWS:
+            truncated = True
+            break
+        index.add(row[0], dict(zip(SEARCH_FIELDS, row[1:])))
+
+    ranked = index.search(include, exclude)
+    top = dict(ranked[:limit])
+    entries = {entry.id: entry for entry in queryset.filter(id__in=list(top))}
+
+    hits = []
+    for entry_id, score in ranked[:limit]:
+        entry = entries.get(entry_id)
+        if entry is None:
+            continue
+        highlights = {}
+        for field in SEARCH_FIELDS:
+            snippet = highlight(getattr(entry, field), include)
+            if snippet:
+                highlights[field] = snippet
+        hits.append(SearchHit(entry, score, highlights))
+    return len(ranked), hits, truncated
+
+
+def stem(token):
+    """Very small suffix stripper so 'suture', 'sutures' and 'suturing' match"""
+    for suffix in ('ing', 'ed', 's'):
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            token = token[:-len(suffix)]
+            break
+    if token.endswith('e') and len(token) > 4:
+        token = token[:-1]
+    return token
+
+
+def tokenize(text):
+    """Lowercase, split and stem text, dropping stop words"""
+    if not text:
+        return []
+    return [stem(t) for t in TOKEN_RE.findall(text.lower()) if t not in STOP_WORDS]
+
+
+def parse_query(query):
+    """
+    Split a websearch-style query into required and excluded stems
+
+    Quoted phrases are treated as a set of required words and the
+    ``or`` operator is ignored, which is close enough for test runs.
+    """
+    include, exclude = [], []
+    for raw in query.replace('"', ' ').split():
+        target = exclude if raw.startswith('-') else include
+        for token in tokenize(raw.lstrip('-')):
+            if token != 'or' and token not in target:
+                target.append(token)
+    return include, exclude
+
+
+def escape_headline(snippet, text):
+    """
+    HTML-escape a ts_headline snippet, then turn its markers into tags
+
+    An entry that itself contains a marker character loses its
+    highlighting instead, so typed text never turns into tags.
+    """
+    if text and (HEADLINE_START in text or HEADLINE_STOP in text):
+        return html.escape(snippet.replace(HEADLINE_START, '').replace(HEADLINE_STOP, ''))
+    return (
+        html.escape(snippet)
+        .replace(HEADLINE_START, HIGHLIGHT_START)
+        .replace(HEADLINE_STOP, HIGHLIGHT_STOP)
+    )
+
+
+def highlight(text, stems):
+    """
+    Wrap words whose stem is in ``stems`` with highlight markers
+
+    The rest of the text is HTML-escaped. Returns a snippet of roughly
+    SNIPPET_WORDS words around the first match, or None when the text
+    does not contain any query term.
+    """
+    if not text:
+        return None
+    stems = set(stems)
+    words = list(WORD_RE.finditer(text))
+    matched = [i for i, m in enumerate(words) if stem(m.group().lower()) in stems]
+    if not matched:
+        return None
+
+    first = max(0, matched[0] - SNIPPET_WORDS // 3)
+    last = min(len(words), first + SNIPPET_WORDS)
+    start = words[first].start() if first else 0
+    end = words[last - 1].end() if last < len(words) else len(text)
+
+    parts = []
+    cursor = start
+    for i in matched:
+        if i < first or i >= last:
+            continue
+        m = words[i]
+        parts.append(html.escape(text[cursor:m.start()]))
+        parts.append(f'{HIGHLIGHT_START}{html.escape(m.group())}{HIGHLIGHT_STOP}')
+        cursor = m.end()
+    parts.append(html.escape(text[cursor:end]))
+
+    snippet = ''.join(parts).strip()
+    if start > 0:
+        snippet = '... ' + snippet
+    if end < len(text):
+        snippet = snippet + ' ...'
+    return snippet
+
+
+class InvertedIndex:
+    """
+    Minimal weighted inverted index used when Postgres is not available
+
+    Postings map each stem to ``{doc_id: weighted term frequency}`` using
+    the same per-field weights as the Postgres search vector, and scores
+    are tf-idf normalised by document length.
+    """
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.doc_lengths = {}
+
+    def add(self, doc_id, fields):
+        length = 0
+        for field, text in fields.items():
+            weight = WEIGHT_VALUES[SEARCH_FIELDS[field]]
+            tokens = tokenize(text)
+            length += len(tokens)
+            for token in tokens:
+                postings = self.postings[token]
+                postings[doc_id] = postings.get(doc_id, 0.0) + weight
+        self.doc_lengths[doc_id] = length
+
+    def search(self, include, exclude=()):
+        """
+        Return [(doc_id, score)] for docs containing every included stem
+
+        Results are sorted by descending score.
+        """
+        if not include or any(term not in self.postings for term in include):
+            return []
+
+        # Intersect starting from the rarest term to keep the candidate set small
+        terms = sorted(include, key=lambda t: len(self.postings[t]))
+        candidates = set(self.postings[terms[0]])
+        for term in terms[1:]:
+            candidates.intersection_update(self.postings[term])
+        for term in exclude:
+            candidates.difference_update(self.postings.get(term, ()))
+
+        total_docs = len(self.doc_lengths)
+        scores = []
+        for doc_id in candidates:
+            score = 0.0
+            for term in terms:
+                postings = self.postings[term]
+                idf = math.log(1 + total_docs / len(postings))
+                score += postings[doc_id] * idf
+            score /= 1 + math.log(1 + self.doc_lengths[doc_id])
+            scores.append((doc_id, round(score, 6)))
+        scores.sort(key=lambda item: item[1], reverse=True)
+        return scores
@@ -33,7 +33,13 @@ class LogEntrySerializer(serializers.ModelSerializer):
     class Meta:
         model = LogEntries
         fields = '__all__'
-        read_only_fields = ['id', 'submitted_at', 'status', 'feedback', 'student']
+        read_only_fields = ['id', 'submitted_at', 'status', 'feedback', 'student', 'change_seq', 'updated_at']
+
+# ?view=summary on log entry lists: everything but the long text columns
+LOG_ENTRY_SUMMARY_FIELDS = (
+    'id', 'student', 'student_name', 'date', 'location', 'specialty', 'hours',
+    'patients_seen', 'status', 'is_locked', 'submitted_at',
+)
 
 class PatientSerializer(serializers.ModelSerializer):
     class Meta:
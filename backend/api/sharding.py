@@ -0,0 +1,324 @@
+"""
+Institution sharding
+
+Optional: with no ``DATABASE_SHARD_URLS`` configured every query goes to
+'default' exactly as before.
+
+Tenant data (``db_routers.SHARDED_MODELS``: profiles, patients, log
+entries, activity tags and assignments) for an institution lives on the
+database alias named in the ``institution_shards`` directory table;
+institutions without a row stay on 'default'. Directory data (auth users,
+authorized_users, institutions, clinical_activities, audit logs, the shard
+map itself) always lives on 'default'. Shards are created from the same
+schema, and the institution and catalog rows that tenant foreign keys
+point at are copied onto a shard when an institution moves there.
+
+Every process caches the shard map for SHARD_MAP_CACHE_SECONDS (the
+default cache is per process), so ``move_institution()`` waits that long
+after each change to it before relying on every worker having seen it.
+Writes in flight when a move starts are fenced off with a Postgres
+advisory lock per institution: each unsafe request holds it shared (see
+``write_fence()``), and the move holds it exclusively on the source from
+before the copy until the source rows are gone.
+
+Requests are pinned to their user's shard by ShardRoutingMiddleware.
+Code running outside a request, or across institutions, picks a shard
+explicitly with ``on_institution()``/``on_shard()``, or runs a function on
+every shard in parallel with ``fan_out()``.
+"""
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.utils import timezone
+
+from api.db_routers import current_shard, on_shard, sharding_enabled
+from api.models import (
+    AuthorizedUsers, ClinicalActivities, Institutions, InstitutionShards,
+    LogEntries, LogEntryActivities, LogEntryTombstones, Patients, Profiles,
+    StudentPatientAssignments, StudentPreceptorAssignments,
+)
+
+
+SHARD_MAP_CACHE_KEY = 'institution-shards'
+USER_INSTITUTION_CACHE_PREFIX = 'shard-user:'
+
+# Tenant tables in foreign key order, with the lookup selecting one
+# institution's rows. Tombstones have no foreign key to profiles and are
+# selected by the institution's student ids; they come first so they are
+# deleted from the source last, after the deletes that add more of them.
+MOVE_PLAN = (
+    (LogEntryTombstones, 'student_id__in'),
+    (Profiles, 'institution_id'),
+    (Patients, 'institution_id'),
+    (LogEntries, 'student__institution_id'),
+    (LogEntryActivities, 'student__institution_id'),
+    (StudentPatientAssignments, 'student__institution_id'),
+    (StudentPreceptorAssignments, 'student__institution_id'),
+)
+
+
+def all_shards():
+    """Every alias that can hold tenant data"""
+    return ['default'] + list(getattr(settings, 'DATABASE_SHARDS', []))
+
+
+def shard_map():
+    """
+    institution id (str) -> (alias, moving, epoch), shared through the cache
+
+    ``epoch`` changes every time the institution's placement does (in
+    microseconds since the epoch, from ``updated_at``).
+    """
+    if not sharding_enabled():
+        return {}
+    mapping = cache.get(SHARD_MAP_CACHE_KEY)
+    if mapping is None:
+        mapping = {
+            str(institution_id): (shard, moving, int(updated_at.timestamp() * 1_000_000))
+            for institution_id, shard, moving, updated_at in InstitutionShards.objects.using('default').values_list(
+                'institution_id', 'shard', 'moving', 'updated_at'
+            )
+        }
+        cache.set(SHARD_MAP_CACHE_KEY, mapping, getattr(settings, 'SHARD_MAP_CACHE_SECONDS', 30))
+    return mapping
+
+
+def shard_for_institution(institution_id):
+    """Alias holding an institution's tenant data"""
+    if institution_id is None:
+        return 'default'
+    entry = shard_map().get(str(institution_id))
+    return entry[0] if entry else 'default'
+
+
+def placement(institution_id):
+    """
+    (alias, epoch) of an institution's tenant data
+
+    Institutions that never moved are on ('default', 0). Data copied by a
+    move gets new change sequence values, so anything versioned by them
+    (sync tokens) must also compare the epoch.
+    """
+    if institution_id is None:
+        return 'default', 0
+    entry = shard_map().get(str(institution_id))
+    return (entry[0], entry[2]) if entry else ('default', 0)
+
+
+def is_moving(institution_id):
+    """Whether the institution is mid-move (its writes must wait)"""
+    if institution_id is None:
+        return False
+    entry = shard_map().get(str(institution_id))
+    return bool(entry and entry[1])
+
+
+def on_institution(institution_id):
+    """Context manager routing tenant queries to an institution's shard"""
+    return on_shard(shard_for_institution(institution_id))
+
+
+def institution_for_user(user_id):
+    """
+    Institution id of a Django user, from the directory tables on 'default'
+
+    Cached per user; returns None for unknown users and users without an
+    institution.
+    """
+    if user_id is None:
+        return None
+    key = f'{USER_INSTITUTION_CACHE_PREFIX}{user_id}'
+    cached = cache.get(key)
+    if cached is not None:
+        return cached or None
+
+    email = User.objects.using('default').filter(pk=user_id).values_list('email', flat=True).first()
+    institution_id = None
+    if email:
+        institution_id = AuthorizedUsers.objects.using('default').filter(
+            email=email
+        ).values_list('institution_id', flat=True).first()
+    cache.set(key, str(institution_id) if institution_id else '', 300)
+    return str(institution_id) if institution_id else None
+
+
+def fan_out(func, shards=None):
+    """
+    Call ``func()`` once per shard, in parallel threads
+
+    Each call runs inside ``on_shard(alias)`` on its own connections, which
+    are closed when it finishes.
+
+    Returns:
+        Dict of alias -> result
+    """
+    shards = list(shards or all_shards())
+    if len(shards) == 1:
+        with on_shard(shards[0]):
+            return {shards[0]: func()}
+
+    def run(alias):
+        try:
+            with on_shard(alias):
+                return func()
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=len(shards)) as pool:
+        return dict(zip(shards, pool.map(run, shards)))
+
+
+def merge_counts(results):
+    """Sum per-shard dicts of numbers key by key"""
+    total = Counter()
+    for result in results:
+        total.update(result)
+    return dict(total)
+
+
+def _fence_key(institution_id):
+    """Advisory lock key (signed bigint) for an institution's write fence"""
+    return int.from_bytes(uuid.UUID(str(institution_id)).bytes[:8], 'big', signed=True)
+
+
+@contextmanager
+def write_fence(institution_id, alias):
+    """
+    Hold an institution's write fence on ``alias`` shared for the block
+
+    Yields False, without waiting, when a move holds the fence; the
+    writer must then back off. Only Postgres has the advisory locks this
+    uses; elsewhere (single-process development) it always yields True.
+    """
+    connection = connections[alias]
+    if institution_id is None or connection.vendor != 'postgresql':
+        yield True
+        return
+
+    key = _fence_key(institution_id)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock_shared(%s)', [key])
+        acquired = cursor.fetchone()[0]
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock_shared(%s)', [key])
+
+
+@contextmanager
+def _exclusive_fence(institution_id, alias):
+    """Hold the write fence exclusively, waiting for writes in flight to finish"""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        yield
+        return
+
+    key = _fence_key(institution_id)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_lock(%s)', [key])
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock(%s)', [key])
+
+
+def _set_shard(institution_id, alias, moving):
+    InstitutionShards.objects.using('default').update_or_create(
+        institution_id=institution_id,
+        defaults={'shard': alias, 'moving': moving, 'updated_at': timezone.now()},
+    )
+    cache.delete(SHARD_MAP_CACHE_KEY)
+
+
+def _plan_rows(model, lookup, alias, institution_id, student_ids):
+    """One MOVE_PLAN table's rows for the institution on ``alias``"""
+    value = student_ids if lookup.endswith('__in') else institution_id
+    return model.objects.using(alias).filter(**{lookup: value})
+
+
+def move_institution(institution_id, target, batch_size=1000, keep_source=False, settle_seconds=None):
+    """
+    Copy an institution's tenant rows to another shard and repoint it there
+
+    1. The institution is flagged as moving, and the move waits
+       ``settle_seconds`` (default: SHARD_MAP_CACHE_SECONDS + 1) for every
+       worker's cached map to pick that up, after which
+       ShardRoutingMiddleware refuses its writes with 503.
+    2. The write fence is taken on the source, waiting for writes that
+       started before the flag was seen; it is held until the end, so a
+       worker still routing to the source can't write there.
+    3. The rows are copied in one transaction on the target, and the map
+       is switched once it has committed.
+    4. After another ``settle_seconds``, when no worker reads from the
+       source any more, the source rows are deleted (unless
+       ``keep_source``) and the fence released.
+
+    Returns:
+        Dict of table name -> rows copied
+    """
+    if target not in all_shards():
+        raise ValueError(f"Unknown shard: {target}")
+    source = shard_for_institution(institution_id)
+    if source == target:
+        return {}
+    if settle_seconds is None:
+        settle_seconds = getattr(settings, 'SHARD_MAP_CACHE_SECONDS', 30) + 1
+
+    institution = Institutions.objects.using('default').get(pk=institution_id)
+    _set_shard(institution_id, source, moving=True)
+    try:
+        time.sleep(settle_seconds)
+        with _exclusive_fence(institution_id, source):
+            student_ids = list(
+                Profiles.objects.using(source).filter(institution_id=institution_id).values_list('id', flat=True)
+            )
+            copied = _copy_institution(institution, source, target, student_ids, batch_size)
+            _set_shard(institution_id, target, moving=False)
+
+            time.sleep(settle_seconds)
+            if not keep_source:
+                with transaction.atomic(using=source):
+                    for model, lookup in reversed(MOVE_PLAN):
+                        _plan_rows(model, lookup, source, institution_id, student_ids).delete()
+    except Exception:
+        if shard_for_institution(institution_id) == source:
+            _set_shard(institution_id, source, moving=False)
+        raise
+    return copied
+
+
+def _copy_institution(institution, source, target, student_ids, batch_size):
+    """Copy the institution's MOVE_PLAN rows from source to target in one transaction"""
+    copied = {}
+    with transaction.atomic(using=target):
+        # Directory rows that tenant foreign keys point at
+        Institutions.objects.using(target).bulk_create([institution], ignore_conflicts=True)
+        catalog = ClinicalActivities.objects.using('default').filter(institution_id=institution.pk)
+        catalog = catalog | ClinicalActivities.objects.using('default').filter(institution__isnull=True)
+        ClinicalActivities.objects.using(target).bulk_create(list(catalog), ignore_conflicts=True)
+
+        for model, lookup in MOVE_PLAN:
+            rows = _plan_rows(model, lookup, source, institution.pk, student_ids)
+            batch = []
+            count = 0
+            for row in rows.iterator(chunk_size=batch_size):
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    model.objects.using(target).bulk_create(batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                model.objects.using(target).bulk_create(batch)
+                count += len(batch)
+            copied[model._meta.db_table] = count
+    return copied
@@ -0,0 +1,153 @@
+"""
+Slow query capture
+
+SlowQueryRecorder is installed on every connection by QueryCountMiddleware.
+Any statement slower than ``SLOW_QUERY_THRESHOLD_MS`` is recorded with its
+fingerprint, redacted parameters, the view that issued it and, for a
+bounded sample of SELECTs on PostgreSQL, an ``EXPLAIN (ANALYZE, BUFFERS)``
+plan. Records go to a per-process ring buffer of ``SLOW_QUERY_BUFFER_SIZE``
+entries, read by the admin ``dashboard/slow_queries/`` endpoint.
+
+EXPLAIN ANALYZE executes the statement a second time, so plans are only
+taken for SELECTs, inside a savepoint, and at most
+``SLOW_QUERY_EXPLAINS_PER_MINUTE`` times a minute per process.
+"""
+import datetime
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from api.querycount import fingerprint
+
+
+_current_view = ContextVar('current_view', default=None)
+_explaining = threading.local()
+
+_buffer = None
+_buffer_lock = threading.Lock()
+_explain_times = deque()
+
+
+def set_current_view(label):
+    """Label queries in this context with the view issuing them; returns a reset token"""
+    return _current_view.set(label)
+
+
+def reset_current_view(token):
+    try:
+        _current_view.reset(token)
+    except ValueError:
+        # Set in another context: under ASGI process_view runs in a thread,
+        # and the request's task context ends with the request anyway
+        pass
+
+
+def _get_buffer():
+    global _buffer
+    if _buffer is None:
+        _buffer = deque(maxlen=getattr(settings, 'SLOW_QUERY_BUFFER_SIZE', 200))
+    return _buffer
+
+
+def redact(value):
+    """Keep numbers, booleans and NULLs; replace anything that could be PHI with its type"""
+    if value is None or isinstance(value, (bool, int, float, Decimal)):
+        return value
+    if isinstance(value, uuid.UUID):
+        return '<uuid>'
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return f'<{type(value).__name__}>'
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    return f'<{type(value).__name__}>'
+
+
+def _explain_allowed():
+    """Rate limit plans to SLOW_QUERY_EXPLAINS_PER_MINUTE, sampled by SLOW_QUERY_EXPLAIN_SAMPLE"""
+    if random.random() >= getattr(settings, 'SLOW_QUERY_EXPLAIN_SAMPLE', 1.0):
+        return False
+    limit = getattr(settings, 'SLOW_QUERY_EXPLAINS_PER_MINUTE', 6)
+    now = time.monotonic()
+    with _buffer_lock:
+        while _explain_times and now - _explain_times[0] > 60:
+            _explain_times.popleft()
+        if len(_explain_times) >= limit:
+            return False
+        _explain_times.append(now)
+    return True
+
+
+def _explain(connection, sql, params):
+    """EXPLAIN (ANALYZE, BUFFERS) inside a savepoint; None if it fails"""
+    _explaining.active = True
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {sql}", params)
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+            # Undo anything the re-run statement did
+            transaction.set_rollback(True, using=connection.alias)
+        return plan
+    except Exception as e:
+        return f"EXPLAIN failed: {e}"
+    finally:
+        _explaining.active = False
+
+
+class SlowQueryRecorder:
+    """Connection execute_wrapper recording statements over the threshold"""
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_explaining, 'active', False):
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration_ms = (time.perf_counter() - start) * 1000
+        if duration_ms < getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 200):
+            return result
+
+        connection = context['connection']
+        plan = None
+        if (
+            connection.vendor == 'postgresql'
+            and not many
+            and sql.lstrip().upper().startswith('SELECT')
+            and _explain_allowed()
+        ):
+            plan = _explain(connection, sql, params)
+
+        record = {
+            'at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'duration_ms': round(duration_ms, 2),
+            'database': connection.alias,
+            'view': _current_view.get(),
+            'fingerprint': fingerprint(sql),
+            'params': None if many else redact(params or []),
+            'plan': plan,
+        }
+        with _buffer_lock:
+            _get_buffer().append(record)
+        return result
+
+
+def slow_queries(limit=None):
+    """Recorded slow queries, newest first"""
+    with _buffer_lock:
+        records = list(_get_buffer())
+    records.reverse()
+    return records[:limit] if limit else records
+
+
+def clear_slow_queries():
+    with _buffer_lock:
+        _get_buffer().clear()
@@ -0,0 +1,192 @@
+"""
+Delta sync for offline-capable student clients
+
+Every insert or update of a log entry takes the next value of the
+``log_entry_change_seq`` sequence into ``change_seq``, and every delete
+leaves a row in ``log_entry_tombstones`` with its own sequence value
+(Postgres triggers, see supabase/migrations/20261019_log_entry_sync.sql).
+A client keeps the opaque token from its last sync and receives only the
+entries and deletions after it, in sequence order.
+
+Tokens name the shard holding the student's entries (not the alias the
+read went to, which varies between replicas and the primary) and the
+placement epoch of their institution. Each shard has its own sequence and
+moved rows are renumbered, so after an institution moves (even back to a
+shard it was on before) an old token gets ``reset`` and a full download
+instead of a silently incomplete delta.
+
+Sequence values are taken when a row is written, not when the transaction
+commits, so a slow transaction can commit a value below one a client has
+already synced past. Changes written less than SYNC_COMMIT_LAG_SECONDS
+ago (the longest a write transaction is expected to stay open) are
+therefore sent but not counted into the token: the next sync sends them
+again along with anything that committed in between.
+
+The triggers stamp change_seq and updated_at, so after a save on
+Postgres ``refresh_change`` reads them back into the instance.
+
+On other backends (SQLite test runs) the same bookkeeping is done by the
+signal handlers below, which only see changes made through the ORM's
+save() and delete().
+"""
+import base64
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from api.conditional import latest
+from api.exceptions import ValidationError
+from api.models import LogEntries, LogEntryTombstones
+from api.sharding import placement
+
+
+TOKEN_VERSION = 'v2'
+
+SyncPage = namedtuple('SyncPage', ['entries', 'deleted', 'token', 'has_more', 'reset'])
+
+
+def encode_token(shard, epoch, seq):
+    raw = f'{TOKEN_VERSION}:{shard}:{epoch}:{seq}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_token(token):
+    """
+    ((shard, epoch), sequence) from a sync token; ValidationError if malformed
+
+    Tokens from an older format decode to a placement of None, so they
+    reset like any other stale token.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        version, rest = raw.split(':', 1)
+        if version == 'v1':
+            return None, 0
+        if version != TOKEN_VERSION:
+            raise ValueError(version)
+        shard, epoch, seq = rest.split(':')
+        return (shard, int(epoch)), int(seq)
+    except (ValueError, UnicodeDecodeError):
+        raise ValidationError("Invalid sync token")
+
+
+def _changed_at(row):
+    if isinstance(row, LogEntryTombstones):
+        return row.deleted_at
+    return row.updated_at
+
+
+def changes_since(student, token=None, limit=500):
+    """
+    Entries changed and deleted after ``token``, oldest change first
+
+    Returns:
+        SyncPage. ``token`` resumes after this page, minus any changes
+        that may still have uncommitted predecessors (sent again next
+        time); ``has_more`` means the client should call again with it
+        straight away; ``reset`` means the client must drop its local
+        copy (first sync or stale token) and replace it with ``entries``.
+    """
+    db = router.db_for_read(LogEntries)
+    shard, epoch = placement(student.institution_id)
+    since_placement, since = decode_token(token) if token else (None, 0)
+    reset = token is None or since_placement != (shard, epoch)
+    if reset:
+        since = 0
+
+    entries = list(
+        LogEntries.objects.using(db)
+        .filter(student=student, change_seq__gt=since)
+        .select_related('student')
+        .order_by('change_seq')[:limit + 1]
+    )
+    deleted = [] if reset else list(
+        LogEntryTombstones.objects.using(db)
+        .filter(student_id=student.id, change_seq__gt=since)
+        .order_by('change_seq')[:limit + 1]
+    )
+
+    merged = sorted(entries + deleted, key=lambda row: row.change_seq)
+    page = merged[:limit]
+
+    settled = timezone.now() - timedelta(seconds=getattr(settings, 'SYNC_COMMIT_LAG_SECONDS', 30))
+    high_water = since
+    for row in page:
+        changed_at = _changed_at(row)
+        if changed_at is not None and changed_at > settled:
+            break
+        high_water = row.change_seq
+    # Calling straight back only helps if the token moved
+    has_more = len(merged) > limit and high_water > since
+
+    return SyncPage(
+        entries=[row for row in page if isinstance(row, LogEntries)],
+        deleted=[str(row.entry_id) for row in page if isinstance(row, LogEntryTombstones)],
+        token=encode_token(shard, epoch, high_water),
+        has_more=has_more,
+        reset=reset,
+    )
+
+
+def entries_version(student_ids):
+    """
+    Version of the given students' log entries, for conditional GETs
+
+    Returns:
+        (parts, last_modified): the highest change_seq among the entries
+        and their tombstones, the entry count, and the latest write or
+        delete time
+    """
+    db = router.db_for_read(LogEntries)
+    entries = LogEntries.objects.using(db).filter(student_id__in=student_ids).aggregate(
+        seq=Max('change_seq'), count=Count('id'), updated=Max('updated_at'),
+    )
+    deleted = LogEntryTombstones.objects.using(db).filter(student_id__in=student_ids).aggregate(
+        seq=Max('change_seq'), at=Max('deleted_at'),
+    )
+    return (
+        (entries['seq'], deleted['seq'], entries['count']),
+        latest(entries['updated'], deleted['at']),
+    )
+
+
+def _next_seq(db):
+    """Emulated sequence for backends without the triggers"""
+    last_entry = LogEntries.objects.using(db).aggregate(m=Max('change_seq'))['m'] or 0
+    last_tombstone = LogEntryTombstones.objects.using(db).aggregate(m=Max('change_seq'))['m'] or 0
+    return max(last_entry, last_tombstone) + 1
+
+
+def stamp_change(sender, instance, using, **kwargs):
+    """pre_save: take the next change_seq and stamp updated_at (the trigger does this on Postgres)"""
+    if connections[using].vendor != 'postgresql':
+        instance.change_seq = _next_seq(using)
+        instance.updated_at = timezone.now()
+
+
+def refresh_change(sender, instance, using, **kwargs):
+    """post_save: read back the change_seq and updated_at the trigger stamped"""
+    if connections[using].vendor == 'postgresql':
+        instance.refresh_from_db(using=using, fields=['change_seq', 'updated_at'])
+
+
+def record_tombstone(sender, instance, using, **kwargs):
+    """
+    pre_delete: leave a tombstone (the trigger does this on Postgres)
+
+    Runs before the row goes, inside the delete's transaction, so the
+    entry's own change_seq still counts towards the next value.
+    """
+    if connections[using].vendor != 'postgresql':
+        LogEntryTombstones.objects.using(using).update_or_create(
+            entry_id=instance.id,
+            defaults={
+                'student_id': instance.student_id,
+                'change_seq': _next_seq(using),
+                'deleted_at': timezone.now(),
+            },
+        )
@@ -1,3 +1,1842 @@
-from django.test import TestCase
+"""
+API tests
 
-# Create your tests here.
+Run with ``python manage.py test api``. Without DATABASE_URL they use
+SQLite (see core/settings.py and core/test_runner.py, which creates the
+unmanaged tables).
+"""
+import base64
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+import warnings
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+import psycopg2
+import psycopg2.extensions
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import router
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from prometheus_client import REGISTRY
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api import analytics, idempotency, memprofile, parsers, prepared, renderers, sharding, typeahead
+from api.analytics import CohortFrame, percentile_ranks, z_scores
+from api.async_db import gather_queries, wrap_queries
+from api.compiled import compile_serializer
+from api.coverage import ActivityMatcher, activity_aliases, build_matcher, get_matcher, tag_entry
+from api.cube import ActivityCube, entry_fact, get_cube, record_entry_change
+from api.exceptions import ValidationError
+from api.db_routers import reset_replica, use_replica
+from api.metrics import track_task
+from api.middleware import ReplicaRoutingMiddleware
+from api.models import (
+    AuthorizedUsers, ClinicalActivities, IdempotencyKeys, InstitutionShards, Institutions, LogEntries,
+    LogEntryTombstones, Patients, Profiles, StudentPreceptorAssignments,
+)
+from api.profiling import StackSampler
+from api.querycount import QueryBudgetExceeded, fingerprint, resolve_budget
+from api.search import highlight, stem
+from api.serializers import LOG_ENTRY_SUMMARY_FIELDS, LogEntrySerializer
+from api.slowqueries import _explain_allowed, redact, slow_queries
+from api.sync import changes_since, decode_token, encode_token
+from api.timeseries import bucket_count, bucket_label, bucket_start, next_bucket, time_series
+from api.tracing import SPAN_KIND_SERVER, TraceContextFilter, parse_traceparent, span, start_trace
+from api.views import AdminAssignmentViewSet, StudentLogViewSet
+from core.db.base import POOL_DEFAULTS, ConnectionPool
+
+
+def make_institution(name='General Hospital'):
+    return Institutions.objects.create(id=uuid.uuid4(), name=name, created_at=timezone.now())
+
+
+def make_user(email, role, institution, full_name=None):
+    """Profile, authorized user and Django user for one person; returns (profile, user)"""
+    now = timezone.now()
+    AuthorizedUsers.objects.create(
+        email=email, role=role, full_name=full_name, created_at=now, institution=institution, status='active',
+    )
+    profile = Profiles.objects.create(
+        id=uuid.uuid4(), email=email, full_name=full_name or email, role=role, created_at=now,
+        institution=institution,
+    )
+    user = User.objects.create_user(username=email, email=email)
+    return profile, user
+
+
+def auth(user):
+    """Request headers authenticating as ``user``"""
+    return {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'}
+
+
+def make_entry(student, **fields):
+    values = {
+        'student': student,
+        'date': date(2026, 1, 15),
+        'location': 'Ward 4',
+        'specialty': 'Cardiology',
+        'hours': 6,
+        'status': 'pending',
+    }
+    values.update(fields)
+    return LogEntries.objects.create(**values)
+
+
+@contextmanager
+def shared_cache():
+    """A cache shared between processes (file-based), standing in for Redis"""
+    with tempfile.TemporaryDirectory() as directory:
+        backend = 'django.core.cache.backends.filebased.FileBasedCache'
+        with override_settings(CACHES={'default': {'BACKEND': backend, 'LOCATION': directory}}):
+            yield
+
+
+class APITestCase(TestCase):
+    """Starts every test with an empty cache (shard maps, pins, versions)"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+
+# =======================
+# Full-text search
+# =======================
+class SearchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        institution = make_institution()
+        self.student, self.user = make_user('student@example.com', 'student', institution)
+        other, _ = make_user('other@example.com', 'student', institution)
+        self.in_activities = make_entry(self.student, activities='Sutured a scalp laceration')
+        self.in_feedback = make_entry(self.student, activities='Ward round', feedback='Practise suturing more')
+        make_entry(self.student, activities='Sutures removed', reflection='Wound infected')
+        make_entry(other, activities='Suturing workshop')
+
+    def search(self, q, **params):
+        response = self.client.get('/api/student/logs/search/', {'q': q, **params}, **auth(self.user))
+        self.assertEqual(response.status_code, 200)
+        return response.json()['data']
+
+    def test_stems_match_across_word_forms(self):
+        self.assertEqual(stem('sutures'), stem('suturing'))
+        self.assertEqual(self.search('suture')['total_count'], 3)
+
+    def test_results_are_scoped_to_the_student(self):
+        ids = {result['id'] for result in self.search('workshop')['results']}
+        self.assertEqual(ids, set())
+
+    def test_matches_in_heavier_fields_rank_first(self):
+        results = self.search('suture laceration OR suture')['results']
+        self.assertEqual(results[0]['id'], str(self.in_activities.id))
+
+        results = self.search('suture -wound')['results']
+        self.assertEqual(
+            [result['id'] for result in results], [str(self.in_activities.id), str(self.in_feedback.id)]
+        )
+        self.assertGreater(results[0]['rank'], results[1]['rank'])
+
+    def test_highlights_mark_matches_and_escape_text(self):
+        self.assertEqual(
+            highlight('<b>Sutured</b> & dressed', ['sutur']),
+            '&lt;b&gt;<mark>Sutured</mark>&lt;/b&gt; &amp; dressed',
+        )
+        self.assertIsNone(highlight('Ward round', ['sutur']))
+
+        result = self.search('laceration')['results'][0]
+        self.assertEqual(result['highlights'], {'activities': 'Sutured a scalp <mark>laceration</mark>'})
+
+    def test_missing_query_is_rejected(self):
+        response = self.client.get('/api/student/logs/search/', **auth(self.user))
+        self.assertEqual(response.status_code, 400)
+
+    def test_large_scopes_are_flagged_as_truncated(self):
+        self.assertFalse(self.search('suture')['truncated'])
+        with mock.patch('api.search.FALLBACK_MAX_ROWS', 2):
+            data = self.search('suture')
+        self.assertTrue(data['truncated'])
+        self.assertLessEqual(data['total_count'], 2)
+
+
+# =======================
+# Competency coverage
+# =======================
+class CoverageTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        institution = make_institution()
+        self.student, self.user = make_user('student@example.com', 'student', institution)
+        self.lp = self.activity('Lumbar puncture / LP', institution, category='Procedures')
+        self.puncture = self.activity('Puncture', institution, category='Procedures')
+        self.venepuncture = self.activity('Venepuncture (Phlebotomy)', category='Procedures')
+        self.other = self.activity('Chest drain', make_institution('Elsewhere'))
+
+    def activity(self, name, institution=None, category=None):
+        return ClinicalActivities.objects.create(
+            id=uuid.uuid4(), name=name, category=category, institution=institution,
+        )
+
+    def test_aliases_include_inline_synonyms(self):
+        self.assertEqual(activity_aliases('Lumbar puncture / LP'), {'lumbar puncture', 'lp'})
+        self.assertEqual(activity_aliases('Venepuncture (Phlebotomy)'), {'venepuncture', 'phlebotomy'})
+
+    def test_matches_are_leftmost_longest_whole_words(self):
+        matcher = ActivityMatcher([('lumbar puncture', 'lp'), ('puncture', 'p'), ('lp', 'lp')])
+        self.assertEqual(matcher.find('Lumbar-puncture, then a second puncture'), Counter({'lp': 1, 'p': 1}))
+        self.assertEqual(matcher.find('Helped with LP; no punctures'), Counter({'lp': 1}))
+
+    def test_catalog_covers_own_and_shared_activities(self):
+        counts = build_matcher(self.student.institution_id).find('LP, phlebotomy and a chest drain')
+        self.assertEqual(counts, Counter({self.lp.id: 1, self.venepuncture.id: 1}))
+
+    def test_created_entries_are_tagged_and_counted(self):
+        response = self.client.post(
+            '/api/student/logs/',
+            {
+                'date': '2026-01-16', 'location': 'Ward 9', 'specialty': 'Neurology', 'hours': '4',
+                'activities': 'Two LPs? No: one LP and a puncture',
+            },
+            content_type='application/json', **auth(self.user),
+        )
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.get('/api/student/logs/coverage/', **auth(self.user))
+        data = response.json()['data']
+        rows = {row['name']: row for row in data['activities']}
+        self.assertEqual(rows['Lumbar puncture / LP']['occurrences'], 1)
+        self.assertEqual(rows['Puncture']['entries'], 1)
+        self.assertEqual(rows['Venepuncture (Phlebotomy)']['entries'], 0)
+        self.assertEqual((data['covered_count'], data['catalog_size']), (2, 3))
+
+    def test_catalog_changes_rebuild_the_matcher(self):
+        matcher = get_matcher(self.student.institution_id)
+        self.assertIs(get_matcher(self.student.institution_id), matcher)
+
+        thoracentesis = self.activity('Thoracentesis', self.student.institution)
+        entry = make_entry(self.student, activities='Assisted a thoracentesis')
+        self.assertEqual(tag_entry(entry), Counter({thoracentesis.id: 1}))
+
+
+# =======================
+# Cohort analytics
+# =======================
+class CohortAnalyticsTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        analytics._frames.clear()
+        self.institution = make_institution()
+        _, self.admin = make_user('admin@example.com', 'admin', self.institution)
+        self.students = [
+            make_user(f'student{n}@example.com', 'student', self.institution, full_name=f'Student {n}')[0]
+            for n in range(4)
+        ]
+        hours = [(10, 'Cardiology'), (4, 'Surgery'), (6, ''), (2, '')]
+        for student, (entry_hours, specialty) in zip(self.students, hours):
+            make_entry(student, hours=entry_hours, specialty=specialty)
+        make_entry(self.students[0], hours=5, specialty='Surgery', status='approved')
+
+    def frame(self, status=None):
+        return CohortFrame.load(institution_id=self.institution.id, status=status)
+
+    def get(self, action, **params):
+        response = self.client.get(
+            f'/api/admin/dashboard/{action}/', {'institution': str(self.institution.id), **params},
+            **auth(self.admin),
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()['data']
+
+    def test_group_by_matches_a_naive_sum(self):
+        frame = self.frame()
+        expected = {}
+        for entry in LogEntries.objects.all():
+            key = (entry.student_id, entry.specialty or analytics.UNSPECIFIED)
+            expected[key] = expected.get(key, 0) + float(entry.hours)
+
+        matrix = frame.hours_matrix()
+        actual = {
+            (frame.students[row], frame.specialties[col]): matrix[row, col]
+            for row, col in zip(*matrix.nonzero())
+        }
+        self.assertEqual(actual, expected)
+        self.assertEqual(frame.entries_matrix().sum(), 5)
+
+    def test_blank_specialties_are_unspecified(self):
+        frame = self.frame()
+        self.assertEqual(sorted(frame.specialties), ['Cardiology', 'Surgery', 'Unspecified'])
+
+    def test_status_filter_keeps_the_whole_roster(self):
+        frame = self.frame(status='approved')
+        self.assertEqual(frame.n_students, 4)
+        self.assertEqual(frame.hours_matrix().sum(axis=1).tolist(), [5.0, 0.0, 0.0, 0.0])
+
+    def test_concat_merges_specialties_by_name(self):
+        other = make_institution('Elsewhere')
+        student, _ = make_user('elsewhere@example.com', 'student', other)
+        make_entry(student, hours=3, specialty='Surgery')
+
+        frame = CohortFrame.concat([self.frame(), CohortFrame.load(institution_id=other.id)])
+        self.assertEqual(frame.n_students, 5)
+        totals = dict(zip(frame.specialties, frame.hours_matrix().sum(axis=0).tolist()))
+        self.assertEqual(totals, {'Cardiology': 10.0, 'Surgery': 12.0, 'Unspecified': 8.0})
+
+    def test_z_scores_and_percentile_ranks(self):
+        values = np.array([1.0, 2.0, 3.0, 4.0])
+        np.testing.assert_allclose(z_scores(values), (values - 2.5) / values.std())
+        self.assertEqual(z_scores(np.array([3.0, 3.0])).tolist(), [0.0, 0.0])
+        self.assertEqual(percentile_ranks(np.array([5.0, 1.0, 5.0, 3.0])).tolist(), [100.0, 25.0, 100.0, 50.0])
+
+    def test_empty_cohorts_do_not_warn(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            self.assertEqual(z_scores(np.array([])).size, 0)
+            self.assertEqual(percentile_ranks(np.array([])).size, 0)
+
+    def test_cohort_students_endpoint(self):
+        data = self.get('cohort_students', z='1')
+        self.assertEqual(data['total_count'], 4)
+        first = data['results'][0]
+        self.assertEqual(first['student_name'], 'Student 0')
+        self.assertEqual(first['hours_by_specialty'], {'Cardiology': 10.0, 'Surgery': 5.0})
+        self.assertEqual(first['outlier'], 'high')
+        self.assertEqual([row['total_hours'] for row in data['results']], [15.0, 6.0, 4.0, 2.0])
+
+        data = self.get('cohort_students', order='asc', limit='1', offset='1')
+        self.assertEqual([row['total_hours'] for row in data['results']], [4.0])
+
+    def test_cohort_outliers_endpoint(self):
+        self.assertEqual(self.get('cohort_outliers'), [])
+        outliers = self.get('cohort_outliers', z='1')
+        self.assertEqual([(row['student_name'], row['direction']) for row in outliers], [('Student 0', 'high')])
+
+    def test_cohort_summary_endpoint(self):
+        data = self.get('cohort_summary')
+        self.assertEqual((data['student_count'], data['entry_count'], data['total_hours']), (4, 5, 27.0))
+        self.assertEqual(data['percentiles']['p50'], 5.0)
+
+
+# =======================
+# Activity cube
+# =======================
+@mock.patch('api.cube.POLL_INTERVAL_SECONDS', 0)
+@mock.patch.dict('api.cube._cubes', clear=True)
+class ActivityCubeTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        institution = make_institution()
+        _, self.admin = make_user('admin@example.com', 'admin', institution)
+        self.student, self.user = make_user('student@example.com', 'student', institution)
+        self.entries = [
+            make_entry(self.student, specialty='Cardiology', hours=4),
+            make_entry(self.student, specialty='Surgery', hours=3, date=date(2026, 2, 3)),
+            make_entry(self.student, specialty='', hours=2),
+            make_entry(self.student, specialty='Unspecified', hours=1, date=date(2026, 2, 9)),
+        ]
+
+    def rebuilt(self):
+        cube = ActivityCube()
+        cube.rebuild()
+        return cube.cells
+
+    def assertMatchesRebuild(self, cube):
+        self.assertEqual(
+            {key: [entries, round(hours, 2)] for key, (entries, hours) in cube.cubes[0].cells.items()},
+            {key: [entries, round(hours, 2)] for key, (entries, hours) in self.rebuilt().items()},
+        )
+
+    def test_deltas_match_a_full_rebuild(self):
+        cube = get_cube()
+        self.assertMatchesRebuild(cube)
+
+        response = self.client.patch(
+            f'/api/student/logs/{self.entries[0].id}/', {'specialty': 'Surgery', 'hours': '5.5'},
+            content_type='application/json', **auth(self.user),
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.client.delete(f'/api/student/logs/{self.entries[1].id}/', **auth(self.user)).status_code, 204
+        )
+        entry = self.entries[2]
+        before = entry_fact(entry)
+        entry.status = 'approved'
+        entry.save()
+        record_entry_change(before, entry_fact(entry))
+
+        self.assertMatchesRebuild(cube)
+
+    def test_new_entries_are_polled_in(self):
+        cube = get_cube()
+        make_entry(self.student, specialty='Surgery', hours=7)
+        self.assertMatchesRebuild(get_cube())
+        self.assertEqual(cube.query({'specialty': 'Surgery'}), [{'entries': 2, 'hours': 10.0}])
+
+    def test_query_filters_groups_and_orders(self):
+        cube = get_cube()
+        rows = cube.query(group_by=['month'], order_by='month')
+        self.assertEqual(
+            rows,
+            [
+                {'month': date(2026, 1, 1), 'entries': 2, 'hours': 6.0},
+                {'month': date(2026, 2, 1), 'entries': 2, 'hours': 4.0},
+            ],
+        )
+        rows = cube.query({'month_from': date(2026, 2, 1)}, group_by=['specialty'], order_by='-hours', limit=1)
+        self.assertEqual(rows, [{'specialty': 'Surgery', 'entries': 1, 'hours': 3.0}])
+        with self.assertRaises(ValueError):
+            cube.query(group_by=['colour'])
+
+    def test_chart_data_skips_only_missing_specialties(self):
+        response = self.client.get('/api/admin/dashboard/chart_data/', **auth(self.admin))
+        data = response.json()['data']
+        self.assertEqual([item['month'] for item in data['activity']], ['Jan', 'Feb'])
+        self.assertEqual(
+            sorted(item['name'] for item in data['specialty']), ['Cardiology', 'Surgery', 'Unspecified']
+        )
+
+    def test_cube_endpoint(self):
+        response = self.client.get(
+            '/api/admin/dashboard/cube/', {'group_by': 'specialty', 'order_by': 'specialty'}, **auth(self.admin),
+        )
+        self.assertEqual(
+            [(row['specialty'], row['entries']) for row in response.json()['data']],
+            [(None, 1), ('Cardiology', 1), ('Surgery', 1), ('Unspecified', 1)],
+        )
+        response = self.client.get('/api/admin/dashboard/cube/', {'group_by': 'colour'}, **auth(self.admin))
+        self.assertEqual(response.status_code, 400)
+
+
+# =======================
+# Time series
+# =======================
+class TimeSeriesTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        institution = make_institution()
+        _, self.admin = make_user('admin@example.com', 'admin', institution)
+        self.student, _ = make_user('student@example.com', 'student', institution)
+        make_entry(self.student, date=date(2025, 12, 31), hours=1)
+        make_entry(self.student, date=date(2026, 1, 5), hours=2)
+        make_entry(self.student, date=date(2026, 1, 11), hours=3, specialty='Surgery')
+        make_entry(self.student, date=date(2026, 3, 2), hours=4)
+
+    def get(self, **params):
+        return self.client.get('/api/admin/dashboard/timeseries/', params, **auth(self.admin))
+
+    def test_buckets_and_labels(self):
+        self.assertEqual(bucket_start(date(2026, 1, 11), 'week'), date(2026, 1, 5))
+        self.assertEqual(bucket_start(date(2026, 8, 20), 'quarter'), date(2026, 7, 1))
+        self.assertEqual(next_bucket(date(2025, 10, 1), 'quarter'), date(2026, 1, 1))
+        self.assertEqual(next_bucket(date(2025, 12, 1), 'month'), date(2026, 1, 1))
+        self.assertEqual(bucket_label(date(2025, 12, 29), 'week'), '2026-W01')
+        self.assertEqual(bucket_label(date(2026, 4, 1), 'quarter'), '2026-Q2')
+        self.assertEqual(bucket_count(date(2025, 12, 31), date(2026, 3, 2), 'month'), 4)
+
+    def test_series_is_dense(self):
+        series = time_series('month', date(2025, 12, 15), date(2026, 4, 30))
+        self.assertEqual(
+            [(row['label'], row['entries'], row['hours']) for row in series],
+            [('2025-12', 1, 1.0), ('2026-01', 2, 5.0), ('2026-02', 0, 0.0), ('2026-03', 1, 4.0), ('2026-04', 0, 0.0)],
+        )
+
+    def test_weeks_start_on_monday(self):
+        series = time_series('week', date(2025, 12, 29), date(2026, 1, 11))
+        self.assertEqual(
+            [(row['bucket'], row['entries']) for row in series], [('2025-12-29', 1), ('2026-01-05', 2)]
+        )
+
+    def test_endpoint_filters(self):
+        response = self.get(granularity='quarter', start='2025-10-01', end='2026-06-30', specialty='Surgery')
+        self.assertEqual(response.status_code, 200)
+        series = response.json()['data']['series']
+        self.assertEqual(
+            [(row['label'], row['entries']) for row in series], [('2025-Q4', 0), ('2026-Q1', 1), ('2026-Q2', 0)]
+        )
+
+    def test_endpoint_rejects_bad_ranges(self):
+        self.assertEqual(self.get(granularity='hour').status_code, 400)
+        self.assertEqual(self.get(field='updated_at').status_code, 400)
+        self.assertEqual(self.get(start='2026-02-01', end='2026-01-01').status_code, 400)
+        self.assertEqual(self.get(start='January').status_code, 400)
+        self.assertEqual(self.get(granularity='day', start='2020-01-01', end='2026-01-01').status_code, 400)
+
+
+# =======================
+# Async views
+# =======================
+class AsyncViewTests(TransactionTestCase):
+    """
+    The async views run their queries on the async_db worker threads, whose
+    connections can't see a TestCase transaction, so rows are committed
+    (and the unmanaged tables emptied by hand afterwards).
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.addCleanup(self.delete_rows)
+        institution = make_institution()
+        _, self.admin = make_user('admin@example.com', 'admin', institution)
+        self.student, self.user = make_user('student@example.com', 'student', institution)
+        make_entry(self.student, hours=3)
+        make_entry(self.student, hours='4.5', status='approved')
+
+    def get(self, path, user=None):
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'} if user else {}
+        return self.async_client.get(path, headers=headers)
+
+    def delete_rows(self):
+        for model in (LogEntries, Profiles, AuthorizedUsers, Institutions):
+            model.objects.all().delete()
+
+    async def test_payloads_match_the_sync_views(self):
+        for path, user in (
+            ('/api/student/logs/stats/', self.user),
+            ('/api/admin/dashboard/stats/', self.admin),
+            ('/api/admin/dashboard/institution_stats/', self.admin),
+        ):
+            with self.subTest(path=path):
+                sync_response = await sync_to_async(self.client.get)(path, **auth(user))
+                async_response = await self.get(f'/api/async{path[4:]}', user)
+                self.assertEqual(async_response.status_code, 200)
+                self.assertEqual(json.loads(async_response.content), sync_response.json())
+
+    async def test_student_stats(self):
+        response = await self.get('/api/async/student/logs/stats/', self.user)
+        data = json.loads(response.content)['data']
+        self.assertEqual((data['total_entries'], data['approved_count']), (2, 1))
+        self.assertEqual(float(data['total_hours']), 7.5)
+
+    async def test_authentication_and_roles(self):
+        response = await self.get('/api/async/student/logs/stats/')
+        self.assertEqual(response.status_code, 401)
+        response = await self.get('/api/async/admin/dashboard/stats/', self.user)
+        self.assertEqual(response.status_code, 403)
+
+    async def test_only_get_is_allowed(self):
+        response = await self.async_client.post('/api/async/student/logs/stats/')
+        self.assertEqual(response.status_code, 405)
+
+    async def test_queries_on_worker_threads_are_counted(self):
+        response = await self.get('/api/async/admin/dashboard/stats/', self.admin)
+        self.assertRegex(response['Server-Timing'], r'desc="([1-9]\d*) queries"')
+
+    async def test_wrap_queries_follows_gathered_queries(self):
+        seen = []
+
+        def record(execute, sql, params, many, context):
+            seen.append(sql)
+            return execute(sql, params, many, context)
+
+        queryset = LogEntries.objects.filter(student=self.student)
+        with wrap_queries(record):
+            results = await gather_queries({
+                'all': queryset.count,
+                'approved': queryset.filter(status='approved').count,
+            })
+        self.assertEqual(results, {'all': 2, 'approved': 1})
+        self.assertEqual(len(seen), 2)
+
+
+# =======================
+# Connection pool and prepared statements
+# =======================
+class FakeConnection:
+    """Just enough of a psycopg2 connection for ConnectionPool"""
+
+    def __init__(self):
+        self.closed = 0
+        self.created_at = self.returned_at = time.monotonic()
+        self.info = SimpleNamespace(transaction_status=psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+        self.rolled_back = False
+
+    def rollback(self):
+        self.rolled_back = True
+        self.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class FakePool(ConnectionPool):
+    def _connect(self):
+        self.opened += 1
+        return FakeConnection()
+
+
+class ConnectionPoolTests(TestCase):
+    def make_pool(self, **options):
+        return FakePool(conn_params={}, **{**POOL_DEFAULTS, 'min_size': 0, **options})
+
+    def test_connections_are_reused_most_recent_first(self):
+        pool = self.make_pool()
+        first, second = pool.getconn(), pool.getconn()
+        pool.putconn(first)
+        pool.putconn(second)
+        self.assertIs(pool.getconn(), second)
+        self.assertEqual(pool.stats()['opened'], 2)
+
+    def test_exhausted_pool_times_out(self):
+        pool = self.make_pool(max_size=1, timeout=0.05)
+        pool.getconn()
+        with self.assertRaisesMessage(psycopg2.OperationalError, 'Connection pool exhausted'):
+            pool.getconn()
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_waiters_get_returned_connections(self):
+        pool = self.make_pool(max_size=1, timeout=5)
+        connection = pool.getconn()
+        threading.Timer(0.05, pool.putconn, [connection]).start()
+        self.assertIs(pool.getconn(), connection)
+        stats = pool.stats()
+        self.assertEqual((stats['waits'], stats['in_use'], stats['utilization']), (1, 1, 1.0))
+
+    def test_open_transactions_are_rolled_back(self):
+        pool = self.make_pool()
+        connection = pool.getconn()
+        connection.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+        pool.putconn(connection)
+        self.assertTrue(connection.rolled_back)
+        self.assertIs(pool.getconn(), connection)
+
+    def test_old_connections_are_replaced(self):
+        pool = self.make_pool(max_lifetime=60)
+        connection = pool.getconn()
+        connection.created_at -= 120
+        pool.putconn(connection)
+        self.assertTrue(connection.closed)
+        self.assertIsNot(pool.getconn(), connection)
+        self.assertEqual((pool.stats()['size'], pool.stats()['closed']), (1, 1))
+
+
+class PreparedQueryTests(APITestCase):
+    """The ORM paths used when prepared statements are off (as on SQLite)"""
+
+    def setUp(self):
+        super().setUp()
+        institution = make_institution()
+        self.student, self.user = make_user('student@example.com', 'student', institution, full_name='Sam')
+        self.preceptor, self.instructor = make_user('preceptor@example.com', 'instructor', institution)
+        StudentPreceptorAssignments.objects.create(
+            id=uuid.uuid4(), student=self.student, preceptor=self.preceptor,
+            assigned_at=timezone.now(), status='active',
+        )
+        self.older = make_entry(self.student, date=date(2026, 1, 10))
+        self.newer = make_entry(self.student, date=date(2026, 1, 20))
+        make_entry(self.student, status='approved')
+
+    def test_rows_serialize_like_the_serializer(self):
+        compiled = compile_serializer(LogEntrySerializer)
+        expected = LogEntrySerializer(LogEntries.objects.filter(student=self.student).order_by('-date'), many=True)
+        self.assertEqual(as_json(compiled.many(prepared.student_logs(self.student))), as_json(expected.data))
+
+    def test_pending_reviews_and_assignments(self):
+        self.assertEqual(prepared.assigned_student_ids(self.preceptor), [self.student.id])
+        rows = prepared.pending_reviews(self.preceptor)
+        self.assertEqual({row['id'] for row in rows}, {self.older.id, self.newer.id})
+        self.assertEqual(rows[0]['student__full_name'], 'Sam')
+
+        response = self.client.get('/api/instructor/reviews/pending/', **auth(self.instructor))
+        self.assertEqual(len(response.json()['data']), 2)
+
+    def test_profile_is_looked_up_once_per_request(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        with self.assertNumQueries(1):
+            self.assertEqual(prepared.request_profile(request), self.student)
+            prepared.request_profile(request)
+        self.assertIsNone(prepared.profile_by_email(''))
+
+    def test_pool_stats_are_empty_without_a_pool(self):
+        _, admin = make_user('admin@example.com', 'admin', self.student.institution)
+        response = self.client.get('/api/admin/dashboard/db_pool/', **auth(admin))
+        self.assertEqual(response.json()['data'], {})
+
+
+# =======================
+# Slow queries
+# =======================
+@mock.patch('api.slowqueries._buffer', None)
+@mock.patch('api.slowqueries._explain_times', deque())
+class SlowQueryTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        institution = make_institution()
+        self.student, self.user = make_user('student@example.com', 'student', institution)
+        _, self.admin = make_user('admin@example.com', 'admin', institution)
+        make_entry(self.student)
+
+    def test_redaction_keeps_only_non_identifying_values(self):
+        self.assertEqual(
+            redact(['jane@example.com', 42, Decimal('1.5'), None, True, uuid.uuid4(), date(2026, 1, 1)]),
+            ['<str>', 42, Decimal('1.5'), None, True, '<uuid>', '<date>'],
+        )
+        self.assertEqual(redact({'name': 'Jane', 'n': 3}), {'name': '<str>', 'n': 3})
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_slow_queries_are_recorded_with_their_view(self):
+        self.client.get('/api/student/logs/', **auth(self.user))
+        records = slow_queries()
+        self.assertTrue(records)
+        self.assertIn('StudentLogViewSet.list', {record['view'] for record in records})
+
+        lookup = next(record for record in records if '<str>' in (record['params'] or []))
+        self.assertNotIn('student@example.com', json.dumps(lookup))
+        self.assertNotIn('student@example.com', lookup['fingerprint'])
+        self.assertIsNone(lookup['plan'])
+
+    def test_fast_queries_are_not_recorded(self):
+        self.client.get('/api/student/logs/', **auth(self.user))
+        self.assertEqual(slow_queries(), [])
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_buffer_is_bounded(self):
+        with mock.patch('api.slowqueries._buffer', deque(maxlen=3)):
+            self.client.get('/api/student/logs/', **auth(self.user))
+            self.assertEqual(len(slow_queries()), 3)
+
+    @override_settings(SLOW_QUERY_EXPLAINS_PER_MINUTE=2, SLOW_QUERY_EXPLAIN_SAMPLE=1.0)
+    def test_explains_are_rate_limited(self):
+        self.assertEqual([_explain_allowed() for _ in range(3)], [True, True, False])
+
+    def test_endpoint_lists_newest_first_and_clears(self):
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=0):
+            self.client.get('/api/student/logs/', **auth(self.user))
+        records = slow_queries()
+
+        response = self.client.get('/api/admin/dashboard/slow_queries/', {'limit': 2}, **auth(self.admin))
+        self.assertEqual(response.json()['data'], records[:2])
+        self.assertGreaterEqual(records[0]['at'], records[-1]['at'])
+
+        self.client.delete('/api/admin/dashboard/slow_queries/', **auth(self.admin))
+        self.assertEqual(slow_queries(), [])
+
+
+# =======================
+# Request profiling
+# =======================
+class ProfilingTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        institution = make_institution()
+        _, self.admin = make_user('admin@example.com', 'admin', institution)
+        _, self.user = make_user('student@example.com', 'student', institution)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings_override = override_settings(PROFILE_DIR=self.directory, PROFILE_SAMPLE_RATE=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def get(self, user, **extra):
+        return self.client.get('/api/me/', **auth(user), **extra)
+
+    def test_admins_can_profile_a_request(self):
+        response = self.get(self.admin, HTTP_X_PROFILE='cprofile')
+        self.assertEqual(response.status_code, 200)
+        name = response['X-Profile-File']
+        self.assertRegex(name, r'-GET-api-me-[0-9a-f]{8}\.prof$')
+        stats = pstats.Stats(os.path.join(self.directory, name))
+        self.assertTrue(stats.total_calls)
+
+    def test_sampler_writes_folded_stacks(self):
+        response = self.client.get('/api/me/', {'profile': 'sample'}, **auth(self.admin))
+        self.assertTrue(response['X-Profile-File'].endswith('.folded'))
+
+        sampler = StackSampler(0.001)
+        sampler.enable()
+        deadline = time.monotonic() + 0.05
+        while time.monotonic() < deadline:
+            pass
+        sampler.disable()
+        path = os.path.join(self.directory, 'busy.folded')
+        sampler.dump_stats(path)
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertTrue(lines)
+        self.assertTrue(all(re.fullmatch(r'.+ \d+', line) for line in lines))
+        self.assertTrue(any('test_sampler_writes_folded_stacks' in line for line in lines))
+
+    def test_only_admins_can_ask(self):
+        self.assertFalse(self.get(self.user, HTTP_X_PROFILE='cprofile').has_header('X-Profile-File'))
+        response = self.client.get('/api/me/', HTTP_X_PROFILE='cprofile', HTTP_AUTHORIZATION='Bearer nonsense')
+        self.assertFalse(response.has_header('X-Profile-File'))
+        self.assertFalse(self.get(self.admin, HTTP_X_PROFILE='perf').has_header('X-Profile-File'))
+        self.assertEqual(os.listdir(self.directory), [])
+
+    @override_settings(PROFILE_SAMPLE_RATE=1.0, PROFILE_DEFAULT_MODE='cprofile')
+    def test_sample_rate_profiles_any_request(self):
+        self.assertTrue(self.get(self.user)['X-Profile-File'].endswith('.prof'))
+
+
+# =======================
+# Allocation profiling
+# =======================
+class AllocationProfilingTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        institution = make_institution()
+        _, self.admin = make_user('admin@example.com', 'admin', institution)
+        _, self.user = make_user('student@example.com', 'student', institution)
+        memprofile.clear_allocation_stats()
+        self.addCleanup(memprofile.clear_allocation_stats)
+        self.addCleanup(tracemalloc.stop)
+
+    def test_off_by_default(self):
+        response = self.client.get('/api/me/', **auth(self.user))
+        self.assertNotIn('mem;', response['Server-Timing'])
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertEqual(memprofile.allocation_stats(), [])
+
+    def test_measure_attributes_allocations_to_lines(self):
+        baseline = memprofile.start()
+        blocks = [bytes(1024) for _ in range(1000)]
+        peak, net, sites = memprofile.measure(baseline)
+        self.assertGreater(net, 1000 * 1024)
+        self.assertGreaterEqual(peak, net)
+        site, size = sites.most_common(1)[0]
+        self.assertTrue(site.startswith(__file__.rstrip('c')))
+        self.assertGreater(size, 1000 * 1024)
+        del blocks
+
+    @override_settings(MEMORY_PROFILING=True)
+    def test_views_are_recorded_and_exported(self):
+        view = 'MeView.get'
+        before = REGISTRY.get_sample_value(
+            'clinlogix_http_request_memory_peak_bytes_count', {'view': view}
+        ) or 0
+
+        response = self.client.get('/api/me/', **auth(self.user))
+        self.assertRegex(response['Server-Timing'], r'mem;desc="peak \d+ KiB, net -?\d+ KiB"')
+
+        stats = {row['view']: row for row in memprofile.allocation_stats()}
+        self.assertEqual(stats[view]['requests'], 1)
+        self.assertGreater(stats[view]['peak_bytes_max'], 0)
+        self.assertEqual(
+            REGISTRY.get_sample_value('clinlogix_http_request_memory_peak_bytes_count', {'view': view}),
+            before + 1,
+        )
+        self.assertIsNotNone(
+            REGISTRY.get_sample_value('clinlogix_http_request_memory_net_bytes_sum', {'view': view})
+        )
+
+    @override_settings(MEMORY_PROFILING=True)
+    def test_admin_endpoint(self):
+        self.client.get('/api/me/', **auth(self.user))
+        data = self.client.get('/api/admin/dashboard/memory/', {'top': 1}, **auth(self.admin)).json()['data']
+        self.assertTrue(data['enabled'])
+        self.assertIn('MeView.get', [row['view'] for row in data['views']])
+        self.assertTrue(all(len(row['top_sites']) <= 1 for row in data['views']))
+
+        self.client.delete('/api/admin/dashboard/memory/', **auth(self.admin))
+        # Only the DELETE itself, recorded once it finished
+        self.assertEqual([row['view'] for row in memprofile.allocation_stats()], ['AdminDashboardViewSet.memory'])
+
+
+# =======================
+# Prometheus metrics
+# =======================
+class MetricsTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        _, self.user = make_user('student@example.com', 'student', make_institution())
+
+    def scrape(self, **extra):
+        return self.client.get('/metrics', **extra)
+
+    def test_closed_by_default(self):
+        self.assertEqual(self.scrape().status_code, 403)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_token(self):
+        self.assertEqual(self.scrape().status_code, 401)
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        response = self.scrape(HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+    @override_settings(METRICS_ALLOWED_NETWORKS=['10.0.0.0/8', '127.0.0.1'])
+    def test_allowed_networks(self):
+        self.assertEqual(self.scrape().status_code, 200)
+        self.assertEqual(self.scrape(REMOTE_ADDR='10.1.2.3').status_code, 200)
+        self.assertEqual(self.scrape(REMOTE_ADDR='192.0.2.1').status_code, 403)
+        # The forwarded address is client-controlled and ignored
+        self.assertEqual(self.scrape(REMOTE_ADDR='192.0.2.1', HTTP_X_FORWARDED_FOR='10.1.2.3').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_requests_are_counted_by_view(self):
+        labels = {'view': 'MeView.get', 'method': 'GET', 'status': '200'}
+        before = REGISTRY.get_sample_value('clinlogix_http_requests_total', labels) or 0
+        self.client.get('/api/me/', **auth(self.user))
+        self.client.get('/api/nowhere/', **auth(self.user))
+
+        body = self.scrape(HTTP_AUTHORIZATION='Bearer s3cret').content.decode()
+        self.assertEqual(REGISTRY.get_sample_value('clinlogix_http_requests_total', labels), before + 1)
+        self.assertIn(
+            'clinlogix_http_request_duration_seconds_bucket{le="0.005",method="GET",view="MeView.get"}', body
+        )
+        self.assertIn('clinlogix_http_requests_total{method="GET",status="404",view="unmatched"}', body)
+
+    def test_tasks_are_tracked(self):
+        with track_task('pdf'):
+            self.assertEqual(REGISTRY.get_sample_value('clinlogix_tasks_in_progress', {'task': 'pdf'}), 1)
+        self.assertEqual(REGISTRY.get_sample_value('clinlogix_tasks_in_progress', {'task': 'pdf'}), 0)
+        self.assertGreaterEqual(
+            REGISTRY.get_sample_value('clinlogix_task_duration_seconds_count', {'task': 'pdf'}), 1
+        )
+
+
+# =======================
+# Request tracing
+# =======================
+TRACE_ID = '4bf92f3577b34da6a3ce929d0e0e4736'
+PARENT_ID = '00f067aa0ba902b7'
+
+
+class TracingTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        _, self.user = make_user('student@example.com', 'student', make_institution())
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.trace_file = os.path.join(directory.name, 'traces.jsonl')
+        settings_override = override_settings(
+            TRACE_EXPORT='file', TRACE_FILE=self.trace_file, TRACE_SAMPLE_RATE=0, TRACE_TRUSTED_PROXIES=[],
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def get(self, **extra):
+        return self.client.get('/api/me/', **auth(self.user), **extra)
+
+    def spans(self):
+        """Spans of every exported trace"""
+        if not os.path.exists(self.trace_file):
+            return []
+        with open(self.trace_file) as f:
+            return [
+                span
+                for line in f
+                for span in json.loads(line)['resourceSpans'][0]['scopeSpans'][0]['spans']
+            ]
+
+    def test_traceparent_parsing(self):
+        self.assertEqual(parse_traceparent(f'00-{TRACE_ID}-{PARENT_ID}-01'), (TRACE_ID, PARENT_ID, True))
+        self.assertEqual(parse_traceparent(f'00-{TRACE_ID}-{PARENT_ID}-00'), (TRACE_ID, PARENT_ID, False))
+        self.assertIsNone(parse_traceparent(f'00-{TRACE_ID}-{PARENT_ID}'))
+        self.assertIsNone(parse_traceparent(f'00-{"z" * 32}-{PARENT_ID}-01'))
+        self.assertIsNone(parse_traceparent(None))
+
+    @override_settings(TRACE_SAMPLE_RATE=1.0)
+    def test_sampled_requests_export_a_span_tree(self):
+        response = self.get()
+        spans = self.spans()
+        root = next(span for span in spans if 'parentSpanId' not in span)
+        self.assertEqual(response['X-Trace-Id'], root['traceId'])
+        self.assertEqual(root['name'], 'GET MeView.get')
+        self.assertIn({'key': 'http.status_code', 'value': {'intValue': '200'}}, root['attributes'])
+
+        queries = [span for span in spans if span['name'] == 'db.query']
+        self.assertTrue(queries)
+        self.assertTrue(all(span['traceId'] == root['traceId'] for span in spans))
+        statements = [
+            attribute['value']['stringValue']
+            for span in queries for attribute in span['attributes'] if attribute['key'] == 'db.statement'
+        ]
+        self.assertFalse(any('student@example.com' in statement for statement in statements))
+
+    def test_unsampled_requests_are_not_traced(self):
+        response = self.get()
+        self.assertFalse(response.has_header('X-Trace-Id'))
+        self.assertEqual(self.spans(), [])
+
+    def test_untrusted_callers_cannot_force_sampling(self):
+        response = self.get(HTTP_TRACEPARENT=f'00-{TRACE_ID}-{PARENT_ID}-01')
+        self.assertFalse(response.has_header('X-Trace-Id'))
+
+    @override_settings(TRACE_TRUSTED_PROXIES=['127.0.0.1'])
+    def test_trusted_proxies_decide_sampling(self):
+        response = self.get(HTTP_TRACEPARENT=f'00-{TRACE_ID}-{PARENT_ID}-01')
+        self.assertEqual(response['X-Trace-Id'], TRACE_ID)
+        root = next(span for span in self.spans() if span['kind'] == SPAN_KIND_SERVER)
+        self.assertEqual(root['parentSpanId'], PARENT_ID)
+
+        with override_settings(TRACE_SAMPLE_RATE=1.0):
+            response = self.get(HTTP_TRACEPARENT=f'00-{TRACE_ID}-{PARENT_ID}-00')
+        self.assertFalse(response.has_header('X-Trace-Id'))
+
+    @override_settings(TRACE_SAMPLE_RATE=1.0)
+    def test_untrusted_traceparent_keeps_the_trace_id(self):
+        self.assertEqual(self.get(HTTP_TRACEPARENT=f'00-{TRACE_ID}-{PARENT_ID}-00')['X-Trace-Id'], TRACE_ID)
+
+    @override_settings(TRACE_SAMPLE_RATE=1.0)
+    def test_spans_record_errors_and_log_context(self):
+        record = logging.LogRecord('api', logging.INFO, __file__, 1, 'message', None, None)
+        with self.assertRaises(ZeroDivisionError):
+            with start_trace('job') as root:
+                with span('step', attempt=2) as child:
+                    TraceContextFilter().filter(record)
+                    1 / 0
+        self.assertEqual((record.trace_id, record.span_id), (root.trace.trace_id, child.span_id))
+        step = next(span for span in self.spans() if span['name'] == 'step')
+        self.assertEqual(step['status']['message'], 'ZeroDivisionError: division by zero')
+        self.assertIn({'key': 'attempt', 'value': {'intValue': '2'}}, step['attributes'])
+
+        with span('outside') as nothing:
+            self.assertIsNone(nothing)
+
+
+# =======================
+# Admin directories
+# =======================
+class AdminDirectoryTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.institution = make_institution()
+        self.other_institution = make_institution('Elsewhere')
+        _, self.admin = make_user('admin@example.com', 'admin', self.institution)
+        for n in range(5):
+            make_user(f'student{n}@example.com', 'student', self.institution if n < 3 else self.other_institution)
+        make_user('preceptor@example.com', 'instructor', self.institution)
+        AuthorizedUsers.objects.filter(email='student4@example.com').update(status='invited')
+        start = timezone.now() - timedelta(days=30)
+        for n, email in enumerate(AuthorizedUsers.objects.order_by('email').values_list('email', flat=True)):
+            AuthorizedUsers.objects.filter(email=email).update(created_at=start + timedelta(days=n))
+
+        for n, category in enumerate(['Cardiology', 'Cardiology', 'Surgery']):
+            Patients.objects.create(
+                id=uuid.uuid4(), reference_id=f'P-{n}', clinical_category=category,
+                institution=self.institution if n else self.other_institution,
+                created_at=start + timedelta(days=n),
+            )
+
+    def get(self, path='/api/admin/users/', **params):
+        response = self.client.get(path, params, **auth(self.admin))
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def emails(self, rows):
+        return [row['email'] for row in rows]
+
+    def test_filters(self):
+        self.assertEqual(len(self.get(role='student')), 5)
+        self.assertEqual(self.emails(self.get(status='invited')), ['student4@example.com'])
+        self.assertEqual(
+            sorted(self.emails(self.get(role='student', institution_id=str(self.other_institution.id)))),
+            ['student3@example.com', 'student4@example.com'],
+        )
+        self.assertEqual(self.emails(self.get(email='preceptor@example.com')), ['preceptor@example.com'])
+
+    def test_bad_uuid_is_rejected(self):
+        response = self.client.get('/api/admin/users/', {'institution_id': 'nope'}, **auth(self.admin))
+        self.assertEqual(response.status_code, 400)
+
+    def test_ordering(self):
+        self.assertEqual(self.emails(self.get(ordering='email'))[:2], ['admin@example.com', 'preceptor@example.com'])
+        self.assertEqual(self.emails(self.get())[0], 'student4@example.com')
+
+    def test_plain_requests_get_the_whole_list(self):
+        self.assertIsInstance(self.get(), list)
+        self.assertEqual(len(self.get()), 7)
+
+    def test_cursor_pages_cover_the_list_once(self):
+        page = self.get(page_size=3, ordering='-created_at')
+        seen = self.emails(page['results'])
+        while page['next']:
+            page = self.client.get(page['next'], **auth(self.admin)).json()
+            seen.extend(self.emails(page['results']))
+        self.assertEqual(seen, self.emails(self.get(ordering='-created_at')))
+        self.assertEqual(len(set(seen)), 7)
+
+    def test_patient_filters(self):
+        rows = self.get('/api/admin/patients/', clinical_category='Cardiology', ordering='reference_id')
+        self.assertEqual([row['reference_id'] for row in rows], ['P-0', 'P-1'])
+        rows = self.get('/api/admin/patients/', institution=str(self.institution.id), page_size=1)
+        self.assertEqual([row['reference_id'] for row in rows['results']], ['P-2'])
+        self.assertIsNotNone(rows['next'])
+
+
+# =======================
+# Typeahead
+# =======================
+class TypeaheadTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.institution = make_institution()
+        self.other_institution = make_institution('Elsewhere')
+        _, self.admin = make_user('admin@example.com', 'admin', self.institution, 'Ada Admin')
+        make_user('sam.jones@example.com', 'student', self.institution, 'Sam Jones')
+        make_user('jo.smith@example.com', 'student', self.institution, 'Jo Smith')
+        make_user('ann.majors@example.com', 'instructor', self.institution, 'Ann Majors')
+        make_user('jonah@example.com', 'student', self.other_institution, 'Jonah Hill')
+        for reference_id in ['JX-100', 'AB-JX1', 'JX-200']:
+            Patients.objects.create(
+                id=uuid.uuid4(), reference_id=reference_id, institution=self.institution, created_at=timezone.now(),
+            )
+
+    def search(self, kind, **params):
+        response = self.client.get(f'/api/admin/search/{kind}/', params, **auth(self.admin))
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['data']
+
+    def test_prefix_beats_word_start_beats_substring(self):
+        names = [hit['full_name'] for hit in self.search('people', q='jo')]
+        self.assertEqual(names, ['Jo Smith', 'Sam Jones', 'Ann Majors'])
+
+    def test_scoped_to_admin_institution_by_default(self):
+        self.assertNotIn('Jonah Hill', [hit['full_name'] for hit in self.search('people', q='jonah')])
+        hits = self.search('people', q='jonah', institution=str(self.other_institution.id))
+        self.assertEqual([hit['full_name'] for hit in hits], ['Jonah Hill'])
+
+    def test_role_filter_and_limit(self):
+        self.assertEqual([hit['role'] for hit in self.search('people', q='jo', role='instructor')], ['instructor'])
+        self.assertEqual(len(self.search('people', q='jo', limit=1)), 1)
+        self.assertEqual(len(self.search('people', q='jo', limit=500)), 3)
+
+    def test_blank_query_returns_nothing(self):
+        self.assertEqual(self.search('people', q='  '), [])
+
+    def test_patients_rank_prefix_first(self):
+        hits = self.search('patients', q='jx')
+        self.assertEqual(sorted(hit['reference_id'] for hit in hits[:2]), ['JX-100', 'JX-200'])
+        self.assertEqual(hits[-1]['reference_id'], 'AB-JX1')
+
+    def test_bad_params_are_rejected(self):
+        for params in ({'q': 'jo', 'limit': 'ten'}, {'q': 'jo', 'institution': 'nope'}):
+            response = self.client.get('/api/admin/search/people/', params, **auth(self.admin))
+            self.assertEqual(response.status_code, 400)
+
+    def test_rank_scores_prefix_above_word_start(self):
+        self.assertGreater(typeahead._score('jo', 'Jo Smith'), typeahead._score('jo', 'Sam Jones'))
+        self.assertLess(typeahead._score('jo', 'Sam Jones'), 2)
+        self.assertLess(typeahead._score('jo', 'Ann Majors'), 1)
+
+
+# =======================
+# Home endpoints
+# =======================
+class HomeTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.institution = make_institution()
+        self.student, self.student_user = make_user('student@example.com', 'student', self.institution)
+        self.preceptor, self.preceptor_user = make_user('preceptor@example.com', 'instructor', self.institution)
+        _, self.admin_user = make_user('admin@example.com', 'admin', self.institution)
+        StudentPreceptorAssignments.objects.create(
+            id=uuid.uuid4(), student=self.student, preceptor=self.preceptor,
+            assigned_at=timezone.now(), status='active',
+        )
+        make_entry(self.student, date=date(2026, 1, 10))
+        make_entry(self.student, status='approved')
+
+    def home(self, role, user, **params):
+        response = self.client.get(f'/api/{role}/home/', params, **auth(user))
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['data']
+
+    def unwrap(self, path, user):
+        data = self.client.get(path, **auth(user)).json()
+        return data['data'] if isinstance(data, dict) and 'data' in data else data
+
+    def test_every_section_by_default(self):
+        self.assertEqual(
+            set(self.home('student', self.student_user)), {'profile', 'logs', 'stats', 'preceptor', 'instructors'},
+        )
+        self.assertEqual(
+            set(self.home('instructor', self.preceptor_user)), {'profile', 'reviews', 'pending', 'students'},
+        )
+        self.assertEqual(
+            set(self.home('admin', self.admin_user)),
+            {'profile', 'stats', 'chart_data', 'institution_stats', 'recent_activity'},
+        )
+
+    def test_include_picks_sections(self):
+        self.assertEqual(list(self.home('student', self.student_user, include='stats, logs')), ['stats', 'logs'])
+
+    def test_sections_match_the_standalone_endpoints(self):
+        home = self.home('student', self.student_user)
+        self.assertEqual(as_json(home['logs']), self.unwrap('/api/student/logs/', self.student_user))
+        self.assertEqual(as_json(home['stats']), self.unwrap('/api/student/logs/stats/', self.student_user))
+        self.assertEqual(as_json(home['profile']), self.unwrap('/api/me/', self.student_user))
+        pending = self.home('instructor', self.preceptor_user, include='pending')['pending']
+        self.assertEqual(
+            as_json(pending), self.unwrap('/api/instructor/reviews/pending/', self.preceptor_user),
+        )
+
+    def test_unknown_section_is_rejected(self):
+        response = self.client.get('/api/student/home/', {'include': 'logs,bogus'}, **auth(self.student_user))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('bogus', response.content.decode())
+
+    def test_home_is_role_checked(self):
+        response = self.client.get('/api/admin/home/', **auth(self.student_user))
+        self.assertEqual(response.status_code, 403)
+
+
+# =======================
+# Batch requests
+# =======================
+class BatchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.institution = make_institution()
+        self.student, self.user = make_user('student@example.com', 'student', self.institution)
+        make_entry(self.student)
+
+    def batch(self, paths):
+        return self.client.post(
+            '/api/batch/', {'requests': paths}, content_type='application/json', **auth(self.user),
+        )
+
+    def test_responses_match_the_standalone_endpoints_in_order(self):
+        response = self.batch(['student/logs/stats/', '/api/me/'])
+        self.assertEqual(response.status_code, 200)
+        stats, me = response.json()['responses']
+        self.assertEqual((stats['path'], stats['status']), ('student/logs/stats/', 200))
+        self.assertEqual(stats['body'], self.client.get('/api/student/logs/stats/', **auth(self.user)).json())
+        self.assertEqual(me['body'], self.client.get('/api/me/', **auth(self.user)).json())
+
+    def test_sub_requests_keep_the_caller_permissions(self):
+        [sub] = self.batch(['/api/admin/users/']).json()['responses']
+        self.assertEqual(sub['status'], 403)
+
+    def test_malformed_and_oversized_batches_are_rejected(self):
+        self.assertEqual(self.batch('student/logs/').status_code, 400)
+        self.assertEqual(self.batch([1, 2]).status_code, 400)
+        with self.settings(BATCH_MAX_REQUESTS=2):
+            self.assertEqual(self.batch(['/api/me/'] * 3).status_code, 400)
+
+    def test_bad_paths_get_per_item_errors(self):
+        responses = self.batch([
+            'https://example.com/api/me/', '/admin/', '/api/nope/', '/api/batch/',
+        ]).json()['responses']
+        self.assertEqual([sub['status'] for sub in responses], [400, 400, 404, 400])
+
+    def test_budget_exhaustion_answers_429(self):
+        with self.settings(BATCH_MAX_QUERIES=1):
+            responses = self.batch(['student/logs/stats/', 'student/logs/stats/']).json()['responses']
+        self.assertEqual([sub['status'] for sub in responses], [200, 429])
+        with self.settings(BATCH_MAX_SECONDS=0):
+            [sub] = self.batch(['/api/me/']).json()['responses']
+        self.assertEqual(sub['status'], 429)
+
+    def test_failures_do_not_leak_exception_text(self):
+        with mock.patch.object(StudentLogViewSet, 'stats', side_effect=RuntimeError('secret dsn')), \
+                self.assertLogs('api.batch', 'ERROR'):
+            [sub] = self.batch(['/api/student/logs/stats/']).json()['responses']
+        self.assertEqual(sub['status'], 500)
+        self.assertEqual(sub['body'], {'detail': 'Internal server error'})
+
+
+
+
+
+# =======================
+# orjson rendering and parsing
+# =======================
+class OrjsonTests(APITestCase):
+    def render(self, data, renderer_class=renderers.JSONRenderer):
+        return renderer_class().render(data, 'application/json', {})
+
+    def test_output_matches_drf(self):
+        data = {
+            'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'hours': Decimal('6.50'),
+            'at': timezone.make_aware(datetime(2026, 1, 15, 10, 30)),
+            'on': date(2026, 1, 15),
+            'spent': timedelta(minutes=90),
+            'count': np.int64(3),
+            'text': 'line\u2028break\u2029',
+            'nested': [{'a': None, 'b': True}],
+        }
+        rendered = self.render(data)
+        self.assertEqual(json.loads(rendered), json.loads(self.render(data, JSONRenderer)))
+        self.assertIn(b'"2026-01-15T10:30:00Z"', rendered)
+        self.assertIn(b'\\u2028break\\u2029', rendered)
+
+    def test_unsupported_values_fall_back_to_drf(self):
+        self.assertEqual(json.loads(self.render({'big': 2 ** 70})), {'big': 2 ** 70})
+        self.assertEqual(self.render(None), b'')
+
+    def test_round_trip(self):
+        data = {'date': '2026-01-16', 'hours': 4.5, 'tags': ['é', '漢'], 'ok': False}
+        parsed = parsers.JSONParser().parse(io.BytesIO(self.render(data)), 'application/json', {})
+        self.assertEqual(parsed, data)
+
+    def test_other_charsets_use_drf_parser(self):
+        body = io.BytesIO('{"location": "Salle é"}'.encode('latin-1'))
+        parsed = parsers.JSONParser().parse(body, 'application/json', {'encoding': 'latin-1'})
+        self.assertEqual(parsed, {'location': 'Salle é'})
+
+    def test_invalid_json_is_a_400(self):
+        _, user = make_user('student@example.com', 'student', make_institution())
+        for body in ('{"date": ', '{"hours": NaN}'):
+            response = self.client.post(
+                '/api/student/logs/', body, content_type='application/json', **auth(user),
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('JSON parse error', response.content.decode())
+
+
+# =======================
+# Read replicas
+# =======================
+@override_settings(DATABASE_REPLICAS=['replica_test'])
+class ReplicaRoutingTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.factory = RequestFactory()
+        institution = make_institution()
+        _, self.user = make_user('student@example.com', 'student', institution)
+        _, self.other = make_user('other@example.com', 'student', institution)
+
+    def run_request(self, method, user, status=200):
+        """Run a request through the middleware; returns the alias its reads went to"""
+        seen = []
+
+        def view(request):
+            seen.append(router.db_for_read(LogEntries))
+            return HttpResponse(status=status)
+
+        request = getattr(self.factory, method)('/api/student/logs/', **auth(user))
+        ReplicaRoutingMiddleware(view)(request)
+        return seen[0]
+
+    def test_router_reads_from_replica_only_when_allowed(self):
+        self.assertEqual(router.db_for_read(LogEntries), 'default')
+        token = use_replica(True)
+        try:
+            self.assertEqual(router.db_for_read(LogEntries), 'replica_test')
+            self.assertEqual(router.db_for_write(LogEntries), 'default')
+        finally:
+            reset_replica(token)
+
+    def test_safe_requests_read_from_replica(self):
+        self.assertEqual(self.run_request('get', self.user), 'replica_test')
+        self.assertEqual(self.run_request('head', self.user), 'replica_test')
+
+    def test_unsafe_requests_read_from_primary(self):
+        self.assertEqual(self.run_request('post', self.user, status=201), 'default')
+
+    def test_write_pins_the_writer_to_primary(self):
+        self.run_request('post', self.user, status=201)
+        self.assertEqual(self.run_request('get', self.user), 'default')
+        self.assertEqual(self.run_request('get', self.other), 'replica_test')
+
+    def test_failed_write_does_not_pin(self):
+        self.run_request('post', self.user, status=400)
+        self.assertEqual(self.run_request('get', self.user), 'replica_test')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_everything_reads_from_primary(self):
+        self.assertEqual(self.run_request('get', self.user), 'default')
+
+
+# =======================
+# Shard moves
+# =======================
+@override_settings(DATABASE_SHARDS=['shard_test'])
+class ShardMoveTests(APITestCase):
+    databases = {'default', 'shard_test'}
+
+    def setUp(self):
+        super().setUp()
+        self.institution = make_institution()
+        self.student, self.user = make_user('student@example.com', 'student', self.institution)
+        self.entries = [make_entry(self.student, location=f'Ward {n}') for n in range(3)]
+        self.entries.pop().delete()
+
+    def move(self, target, **kwargs):
+        return sharding.move_institution(self.institution.id, target, settle_seconds=0, **kwargs)
+
+    def test_move_copies_rows_and_repoints_the_institution(self):
+        copied = self.move('shard_test')
+
+        self.assertEqual(copied['log_entries'], 2)
+        self.assertEqual(copied['log_entry_tombstones'], 1)
+        self.assertEqual(sharding.shard_for_institution(self.institution.id), 'shard_test')
+        self.assertFalse(sharding.is_moving(self.institution.id))
+        self.assertEqual(LogEntries.objects.using('shard_test').filter(student_id=self.student.id).count(), 2)
+        self.assertEqual(LogEntryTombstones.objects.using('shard_test').filter(student_id=self.student.id).count(), 1)
+
+    def test_move_removes_source_rows(self):
+        self.move('shard_test')
+
+        self.assertFalse(Profiles.objects.using('default').filter(institution=self.institution).exists())
+        self.assertFalse(LogEntries.objects.using('default').filter(student_id=self.student.id).exists())
+        self.assertFalse(LogEntryTombstones.objects.using('default').filter(student_id=self.student.id).exists())
+
+    def test_keep_source_leaves_source_rows(self):
+        self.move('shard_test', keep_source=True)
+
+        self.assertEqual(LogEntries.objects.using('default').filter(student_id=self.student.id).count(), 2)
+
+    def test_move_changes_the_placement_epoch(self):
+        _, before = sharding.placement(self.institution.id)
+        self.move('shard_test')
+        self.move('default')
+
+        alias, after = sharding.placement(self.institution.id)
+        self.assertEqual(alias, 'default')
+        self.assertNotEqual(after, before)
+        self.assertEqual(LogEntries.objects.using('default').filter(student_id=self.student.id).count(), 2)
+
+    def test_failed_move_leaves_the_institution_in_place(self):
+        with mock.patch('api.sharding._copy_institution', side_effect=RuntimeError('copy failed')):
+            with self.assertRaises(RuntimeError):
+                self.move('shard_test')
+
+        self.assertEqual(sharding.shard_for_institution(self.institution.id), 'default')
+        self.assertFalse(sharding.is_moving(self.institution.id))
+
+    def test_unknown_target_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.move('shard_missing')
+
+    def test_requests_are_routed_to_the_new_shard(self):
+        self.move('shard_test')
+
+        response = self.client.get('/api/student/logs/', **auth(self.user))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+
+    def test_writes_are_refused_while_moving(self):
+        sharding._set_shard(self.institution.id, 'default', moving=True)
+
+        response = self.client.post(
+            '/api/student/logs/',
+            {'date': '2026-01-16', 'location': 'Ward 9', 'specialty': 'Cardiology'},
+            content_type='application/json',
+            **auth(self.user),
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.client.get('/api/student/logs/', **auth(self.user)).status_code, 200)
+        self.assertTrue(InstitutionShards.objects.get(institution=self.institution).moving)
+
+
+# =======================
+# Query budgets
+# =======================
+class QueryBudgetTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        institution = make_institution()
+        self.student, self.user = make_user('student@example.com', 'student', institution)
+        _, self.admin = make_user('admin@example.com', 'admin', institution)
+        for n in range(4):
+            make_user(f'preceptor{n}@example.com', 'instructor', institution)
+        make_entry(self.student)
+
+    def test_fingerprint_collapses_literals(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE a = 'x' AND b = 42 AND c IN (%s, %s, %s)"),
+            fingerprint("SELECT *  FROM t WHERE a = 'yy' AND b = 7 AND c IN (%s)"),
+        )
+
+    @override_settings(DEFAULT_QUERY_BUDGET=7)
+    def test_action_budget_overrides_the_default(self):
+        self.assertEqual(resolve_budget(AdminAssignmentViewSet.as_view({'get': 'preceptor_stats'}), 'GET'), 5)
+        self.assertEqual(resolve_budget(StudentLogViewSet.as_view({'get': 'list'}), 'GET'), 7)
+
+    @override_settings(QUERY_BUDGET_ENFORCE=True)
+    def test_budgeted_endpoint_stays_within_budget(self):
+        response = self.client.get('/api/admin/assignments/preceptor_stats/', **auth(self.admin))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['data']), 4)
+
+    @override_settings(QUERY_BUDGET_ENFORCE=True, DEFAULT_QUERY_BUDGET=1)
+    def test_over_budget_request_fails_when_enforced(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'GET /api/student/logs/ ran'):
+            self.client.get('/api/student/logs/', **auth(self.user))
+
+    @override_settings(QUERY_BUDGET_ENFORCE=False, DEFAULT_QUERY_BUDGET=1)
+    def test_over_budget_request_is_logged_otherwise(self):
+        with self.assertLogs('api.queries', 'WARNING') as logs:
+            response = self.client.get('/api/student/logs/', **auth(self.user))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('(budget 1)', logs.output[0])
+
+    def test_server_timing_reports_the_query_count(self):
+        response = self.client.get('/api/student/logs/', **auth(self.user))
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries"')
+
+
+# =======================
+# Delta sync
+# =======================
+@override_settings(SYNC_COMMIT_LAG_SECONDS=0)
+class SyncTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        institution = make_institution()
+        self.student, self.user = make_user('student@example.com', 'student', institution)
+        self.entries = [make_entry(self.student, location=f'Ward {n}') for n in range(3)]
+
+    def sync(self, token=None, limit=500):
+        return changes_since(self.student, token, limit=limit)
+
+    def test_token_round_trip(self):
+        self.assertEqual(decode_token(encode_token('shard_eu', 12345, 42)), (('shard_eu', 12345), 42))
+
+    def test_malformed_token_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            decode_token('not a token')
+
+    def test_old_format_token_resets(self):
+        self.assertEqual(decode_token(base64.urlsafe_b64encode(b'v1:default:5').decode()), (None, 0))
+
+    def test_first_sync_is_a_full_download(self):
+        page = self.sync()
+        self.assertTrue(page.reset)
+        self.assertEqual({entry.id for entry in page.entries}, {entry.id for entry in self.entries})
+        self.assertEqual(page.deleted, [])
+
+    def test_sync_without_changes_returns_the_same_token(self):
+        token = self.sync().token
+        page = self.sync(token)
+        self.assertFalse(page.reset)
+        self.assertEqual((page.entries, page.deleted, page.token), ([], [], token))
+
+    def test_delta_carries_updates_and_deletions(self):
+        token = self.sync().token
+        updated, deleted = self.entries[0], self.entries[1]
+        deleted_id = str(deleted.id)
+        updated.location = 'ICU'
+        updated.save()
+        deleted.delete()
+
+        page = self.sync(token)
+        self.assertFalse(page.reset)
+        self.assertEqual([entry.id for entry in page.entries], [updated.id])
+        self.assertEqual(page.deleted, [deleted_id])
+        self.assertEqual(self.sync(page.token).entries, [])
+
+    def test_pages_resume_from_the_token(self):
+        seen = []
+        token, has_more = None, True
+        while has_more:
+            page = self.sync(token, limit=1)
+            seen.extend(entry.id for entry in page.entries)
+            token, has_more = page.token, page.has_more
+        self.assertEqual(seen, [entry.id for entry in self.entries])
+
+    @override_settings(SYNC_COMMIT_LAG_SECONDS=30)
+    def test_recent_changes_are_sent_again(self):
+        token = self.sync().token
+        self.assertEqual(token, encode_token('default', 0, 0))
+
+        page = self.sync(token, limit=1)
+        self.assertEqual(len(page.entries), 1)
+        self.assertEqual(page.token, token)
+        self.assertFalse(page.has_more)
+
+    def test_token_from_another_placement_resets(self):
+        page = self.sync(encode_token('shard_other', 0, 10**6))
+        self.assertTrue(page.reset)
+        self.assertEqual(len(page.entries), 3)
+
+    def test_sync_endpoint(self):
+        response = self.client.get('/api/student/logs/sync/', **auth(self.user))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        self.assertTrue(data['reset'])
+        self.assertEqual(len(data['entries']), 3)
+
+        response = self.client.get('/api/student/logs/sync/', {'token': data['token']}, **auth(self.user))
+        self.assertEqual(response.json()['data']['entries'], [])
+        response = self.client.get('/api/student/logs/sync/', {'token': 'garbage'}, **auth(self.user))
+        self.assertEqual(response.status_code, 400)
+
+
+# =======================
+# Idempotency keys
+# =======================
+class IdempotencyTests(APITestCase):
+    body = {'date': '2026-01-16', 'location': 'Ward 9', 'specialty': 'Cardiology'}
+
+    def setUp(self):
+        super().setUp()
+        institution = make_institution()
+        self.student, self.user = make_user('student@example.com', 'student', institution)
+        _, self.other = make_user('other@example.com', 'student', institution)
+
+    def post(self, key, body=None, user=None):
+        headers = auth(user or self.user)
+        if key is not None:
+            headers['HTTP_IDEMPOTENCY_KEY'] = key
+        return self.client.post('/api/student/logs/', body or self.body, content_type='application/json', **headers)
+
+    def test_retry_replays_the_first_response(self):
+        first = self.post('key-1')
+        retry = self.post('key-1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(LogEntries.objects.filter(student=self.student).count(), 1)
+
+    def test_key_reused_with_another_body_is_rejected(self):
+        self.post('key-1')
+        self.assertEqual(self.post('key-1', {**self.body, 'location': 'ICU'}).status_code, 422)
+
+    def test_keys_are_per_user(self):
+        self.post('key-1')
+        response = self.post('key-1', user=self.other)
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+
+    def test_requests_without_a_key_are_not_deduplicated(self):
+        self.post(None)
+        self.post(None)
+        self.assertEqual(LogEntries.objects.filter(student=self.student).count(), 2)
+
+    def test_token_and_batch_posts_are_not_tracked(self):
+        self.user.set_password('pw')
+        self.user.save()
+        credentials = {'username': 'student@example.com', 'password': 'pw'}
+        first = self.client.post('/api/token/', credentials, HTTP_IDEMPOTENCY_KEY='key-1')
+        retry = self.client.post('/api/token/', credentials, HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual((first.status_code, retry.status_code), (200, 200))
+        self.assertFalse(retry.has_header('Idempotent-Replayed'))
+        self.client.post(
+            '/api/batch/', {'requests': ['/api/me/']}, content_type='application/json',
+            HTTP_IDEMPOTENCY_KEY='key-2', **auth(self.user),
+        )
+        self.assertFalse(IdempotencyKeys.objects.exists())
+
+    def test_overlong_key_is_rejected(self):
+        self.assertEqual(self.post('k' * (idempotency.MAX_KEY_LENGTH + 1)).status_code, 400)
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0)
+    def test_retry_during_the_first_attempt_gets_409(self):
+        factory = RequestFactory()
+
+        def request():
+            return factory.post('/api/x/', {}, content_type='application/json', HTTP_IDEMPOTENCY_KEY='key-1')
+
+        retries = []
+
+        def first_attempt(_):
+            retries.append(idempotency.handle(request(), lambda _: HttpResponse(status=201)))
+            return HttpResponse(status=201)
+
+        self.assertEqual(idempotency.handle(request(), first_attempt).status_code, 201)
+        self.assertEqual(retries[0].status_code, 409)
+
+    def test_server_errors_are_not_replayed(self):
+        factory = RequestFactory()
+        statuses = iter([500, 201])
+
+        def view(_):
+            return HttpResponse(status=next(statuses))
+
+        for expected in (500, 201):
+            request = factory.post('/api/x/', {}, content_type='application/json', HTTP_IDEMPOTENCY_KEY='key-1')
+            self.assertEqual(idempotency.handle(request, view).status_code, expected)
+
+    def test_without_a_shared_cache_keys_are_claimed_in_the_database(self):
+        self.assertIsInstance(idempotency.get_store(), idempotency.DatabaseStore)
+        self.post('key-1')
+        self.assertEqual(IdempotencyKeys.objects.filter(status=201).count(), 1)
+
+    def test_database_claims_are_exclusive_until_abandoned(self):
+        store = idempotency.DatabaseStore()
+        self.assertTrue(store.claim('k', 'fingerprint'))
+        self.assertFalse(store.claim('k', 'fingerprint'))
+
+        IdempotencyKeys.objects.filter(key='k').update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(store.claim('k', 'fingerprint'))
+
+    def test_shared_cache_keeps_records_in_the_cache(self):
+        with shared_cache():
+            self.assertIsInstance(idempotency.get_store(), idempotency.CacheStore)
+            self.post('key-1')
+            self.assertEqual(self.post('key-1')['Idempotent-Replayed'], 'true')
+        self.assertFalse(IdempotencyKeys.objects.exists())
+
+
+# =======================
+# Conditional GETs
+# =======================
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        institution = make_institution()
+        self.student, self.user = make_user('student@example.com', 'student', institution)
+        _, self.other = make_user('other@example.com', 'student', institution)
+        self.entry = make_entry(self.student)
+
+    def get(self, path='/api/student/logs/', user=None, **headers):
+        return self.client.get(path, **auth(user or self.user), **headers)
+
+    def test_unchanged_list_is_not_modified(self):
+        first = self.get()
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first['ETag'].startswith('W/"'))
+
+        second = self.get(HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(second.content, b'')
+
+    def test_unchanged_list_is_not_modified_since(self):
+        first = self.get()
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304)
+
+    def test_changed_entry_returns_the_new_list(self):
+        etag = self.get()['ETag']
+        self.entry.location = 'ICU'
+        self.entry.save()
+
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_renamed_student_returns_the_new_list(self):
+        etag = self.get()['ETag']
+        Profiles.objects.filter(pk=self.student.pk).update(full_name='Renamed Student')
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etags_are_per_user(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(user=self.other, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_cache_versioned_views_skip_etags_without_a_shared_cache(self):
+        response = self.get('/api/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_cache_versioned_views_with_a_shared_cache(self):
+        with shared_cache():
+            etag = self.get('/api/me/')['ETag']
+            self.assertEqual(self.get('/api/me/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+            self.student.full_name = 'Renamed Student'
+            self.student.save()
+            self.assertEqual(self.get('/api/me/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+# =======================
+# Compiled serializers
+# =======================
+def as_json(data):
+    """``data`` as a client would decode it from the response body"""
+    return json.loads(JSONRenderer().render(data))
+
+
+class CompiledSerializerTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        institution = make_institution()
+        self.student, self.user = make_user('student@example.com', 'student', institution, full_name='Sam Student')
+        make_entry(self.student, hours='7.50', patients_seen=3, reflection='Long day', is_locked=True)
+        make_entry(self.student, date=date(2026, 1, 16), feedback='Good work')
+        self.queryset = LogEntries.objects.filter(student=self.student).order_by('date')
+
+    def test_output_matches_the_serializer(self):
+        compiled = compile_serializer(LogEntrySerializer)
+        expected = LogEntrySerializer(self.queryset, many=True).data
+        rows = self.queryset.values(*compiled.columns)
+
+        self.assertEqual(as_json(compiled.many(rows)), as_json(expected))
+        self.assertEqual(list(compiled.many(rows)[0]), list(expected[0]))
+
+    def test_field_subset_matches_the_serializer(self):
+        fields = {'id', 'date', 'hours', 'student_name'}
+        compiled = compile_serializer(LogEntrySerializer, fields=fields)
+        self.assertEqual(set(compiled.fields), fields)
+
+        expected = [
+            {name: value for name, value in data.items() if name in fields}
+            for data in as_json(LogEntrySerializer(self.queryset, many=True).data)
+        ]
+        self.assertEqual(as_json(compiled.many(self.queryset.values(*compiled.columns))), expected)
+
+    def test_list_endpoint_matches_the_serializer(self):
+        response = self.client.get('/api/student/logs/', **auth(self.user))
+        self.assertEqual(response.status_code, 200)
+
+        expected = as_json(LogEntrySerializer(self.queryset.order_by('-date'), many=True).data)
+        body = response.json()
+        self.assertEqual(body['results'] if isinstance(body, dict) else body, expected)
+
+    def test_method_fields_are_not_compiled(self):
+        class WithMethodField(LogEntrySerializer):
+            label = serializers.SerializerMethodField()
+
+            def get_label(self, entry):
+                return str(entry)
+
+        with self.assertRaises(ImproperlyConfigured):
+            compile_serializer(WithMethodField)
+
+
+# =======================
+# Sparse fieldsets
+# =======================
+class SparseFieldsetTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        institution = make_institution()
+        self.student, self.user = make_user('student@example.com', 'student', institution)
+        self.entry = make_entry(self.student, reflection='Long day')
+
+    def get(self, path='/api/student/logs/', **params):
+        response = self.client.get(path, params, **auth(self.user))
+        body = response.json()
+        if isinstance(body, dict) and 'results' in body:
+            body = body['results']
+        return response, body
+
+    def test_fields(self):
+        response, body = self.get(fields='id,date')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, [{'id': str(self.entry.id), 'date': '2026-01-15'}])
+
+    def test_fields_on_retrieve(self):
+        response, body = self.get(f'/api/student/logs/{self.entry.id}/', fields='id,reflection')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, {'id': str(self.entry.id), 'reflection': 'Long day'})
+
+    def test_view(self):
+        _, body = self.get(view='summary')
+        self.assertEqual(set(body[0]), set(LOG_ENTRY_SUMMARY_FIELDS))
+
+    def test_view_and_fields_combine(self):
+        _, body = self.get(view='summary', fields='reflection')
+        self.assertEqual(set(body[0]), set(LOG_ENTRY_SUMMARY_FIELDS) | {'reflection'})
+        self.assertEqual(body[0]['reflection'], 'Long day')
+
+    def test_without_params_returns_every_field(self):
+        _, body = self.get()
+        self.assertEqual(set(body[0]), set(LogEntrySerializer().fields))
+
+    def test_unknown_field_is_rejected(self):
+        response, _ = self.get(fields='id,nonexistent')
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_view_is_rejected(self):
+        response, _ = self.get(view='everything')
+        self.assertEqual(response.status_code, 400)
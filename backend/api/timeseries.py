@@ -0,0 +1,183 @@
+"""
+Activity time series with configurable bucket granularity
+
+Buckets entries and hours by day, ISO week, month or quarter over any date
+range. Queries use plain range predicates (``>= start`` and ``< end``) on
+``date`` or ``submitted_at`` so the existing b-tree indexes are used, and
+empty buckets are filled in densely in Python. Each shard's buckets are
+counted in parallel (``fan_out``) and cached by shard and query shape for
+``TIMESERIES_CACHE_SECONDS``.
+"""
+import datetime
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncQuarter, TruncWeek
+
+from api.db_routers import current_shard
+from api.models import LogEntries
+from api.sharding import fan_out
+
+
+GRANULARITIES = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+    'quarter': TruncQuarter,
+}
+
+DATE_FIELDS = ('date', 'submitted_at')
+
+# Protects against e.g. ten years of daily buckets in one response
+MAX_BUCKETS = 1000
+
+
+def bucket_start(day, granularity):
+    """First day of the bucket containing ``day``"""
+    if granularity == 'day':
+        return day
+    if granularity == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return datetime.date(day.year, 3 * ((day.month - 1) // 3) + 1, 1)
+
+
+def next_bucket(start, granularity):
+    """First day of the bucket after the one starting at ``start``"""
+    if granularity == 'day':
+        return start + datetime.timedelta(days=1)
+    if granularity == 'week':
+        return start + datetime.timedelta(weeks=1)
+    months = 1 if granularity == 'month' else 3
+    month = start.month - 1 + months
+    return datetime.date(start.year + month // 12, month % 12 + 1, 1)
+
+
+def bucket_label(start, granularity):
+    """Unambiguous label that always includes the year"""
+    if granularity == 'day':
+        return start.isoformat()
+    if granularity == 'week':
+        year, week, _ = start.isocalendar()
+        return f'{year}-W{week:02d}'
+    if granularity == 'month':
+        return start.strftime('%Y-%m')
+    return f'{start.year}-Q{(start.month - 1) // 3 + 1}'
+
+
+def bucket_count(start, end, granularity):
+    """Number of buckets needed to cover [start, end]"""
+    first = bucket_start(start, granularity)
+    if granularity == 'day':
+        return (end - first).days + 1
+    if granularity == 'week':
+        return (end - first).days // 7 + 1
+    months = (end.year - first.year) * 12 + end.month - first.month
+    return months // (1 if granularity == 'month' else 3) + 1
+
+
+def cache_key(**shape):
+    """Stable cache key for a query shape on the current shard"""
+    digest = hashlib.sha1(json.dumps(shape, sort_keys=True, default=str).encode()).hexdigest()
+    return f'timeseries:{current_shard() or "default"}:{digest}'
+
+
+def time_series(granularity, start, end, field='date', institution=None,
+                specialty=None, student=None, status=None):
+    """
+    Entries and hours per bucket between two dates (inclusive), over every shard
+
+    Args:
+        granularity: One of GRANULARITIES
+        start, end: datetime.date bounds, inclusive
+        field: 'date' (clinical date) or 'submitted_at'
+        institution, specialty, student, status: Optional filters
+
+    Returns:
+        List of {'bucket', 'label', 'entries', 'hours'} with every bucket present
+    """
+    first = bucket_start(start, granularity)
+
+    def count():
+        return shard_buckets(
+            granularity, first, end, field=field, institution=institution,
+            specialty=specialty, student=student, status=status,
+        )
+
+    found = {}
+    for buckets in fan_out(count).values():
+        for bucket, (entries, hours) in buckets.items():
+            total = found.setdefault(bucket, [0, 0.0])
+            total[0] += entries
+            total[1] += hours
+
+    series = []
+    current = first
+    while current <= end:
+        entries, hours = found.get(current, (0, 0.0))
+        series.append({
+            'bucket': current.isoformat(),
+            'label': bucket_label(current, granularity),
+            'entries': entries,
+            'hours': round(hours, 2),
+        })
+        current = next_bucket(current, granularity)
+    return series
+
+
+def shard_buckets(granularity, first, end, field='date', institution=None,
+                  specialty=None, student=None, status=None):
+    """
+    Non-empty buckets on the current shard, cached
+
+    Returns:
+        Dict of bucket start date -> (entries, hours)
+    """
+    key = cache_key(
+        granularity=granularity, start=first, end=end, field=field,
+        institution=institution, specialty=specialty, student=student, status=status,
+    )
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    stop = end + datetime.timedelta(days=1)
+    queryset = LogEntries.objects.all()
+    if field == 'submitted_at':
+        tz = datetime.timezone.utc
+        queryset = queryset.filter(
+            submitted_at__gte=datetime.datetime.combine(first, datetime.time.min, tzinfo=tz),
+            submitted_at__lt=datetime.datetime.combine(stop, datetime.time.min, tzinfo=tz),
+        )
+        trunc = GRANULARITIES[granularity]('submitted_at', tzinfo=tz)
+    else:
+        queryset = queryset.filter(date__gte=first, date__lt=stop)
+        trunc = GRANULARITIES[granularity]('date')
+
+    if institution:
+        queryset = queryset.filter(student__institution_id=institution)
+    if specialty:
+        queryset = queryset.filter(specialty=specialty)
+    if student:
+        queryset = queryset.filter(student_id=student)
+    if status:
+        queryset = queryset.filter(status=status)
+
+    rows = queryset.annotate(bucket=trunc).values('bucket').annotate(
+        entries=Count('id'),
+        hours=Sum('hours'),
+    )
+
+    found = {}
+    for row in rows:
+        bucket = row['bucket']
+        if isinstance(bucket, datetime.datetime):
+            bucket = bucket.date()
+        found[bucket] = (row['entries'], float(row['hours'] or 0))
+
+    cache.set(key, found, getattr(settings, 'TIMESERIES_CACHE_SECONDS', 60))
+    return found
@@ -0,0 +1,262 @@
+"""
+Lightweight request tracing
+
+TracingMiddleware opens a root span per request and a child span per SQL
+statement; code opens further spans with ``span()`` or ``@traced()``:
+
+    with span('email.send', recipient_count=1):
+        send_mail(...)
+
+Sampling is head-based, at ``TRACE_SAMPLE_RATE``. An incoming W3C
+``traceparent`` header keeps the caller's trace id, but its sampled flag is
+only honoured from TRACE_TRUSTED_PROXIES: anyone else could force every
+request they send to be traced and exported. Unsampled requests pay one
+context variable lookup per span. Finished traces are exported as
+OTLP/JSON (``TRACE_EXPORT``):
+    file: one ExportTraceServiceRequest per line appended to TRACE_FILE
+    otlp: POSTed to TRACE_OTLP_ENDPOINT (e.g. a local collector on
+        http://localhost:4318/v1/traces) from a background thread
+
+Every response of a sampled request carries ``X-Trace-Id``, and
+TraceContextFilter adds ``trace_id``/``span_id`` to log records.
+"""
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from api.querycount import fingerprint
+
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+STATUS_ERROR = 2
+
+_current_span = ContextVar('current_span', default=None)
+
+_file_lock = threading.Lock()
+_otlp_queue = None
+_otlp_lock = threading.Lock()
+
+logger = logging.getLogger('api.tracing')
+
+
+class Span:
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'kind', 'attributes', 'start', 'end', 'error')
+
+    def __init__(self, trace, name, parent_id=None, kind=SPAN_KIND_INTERNAL, attributes=None):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.start = time.time_ns()
+        self.end = None
+        self.error = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def to_otlp(self):
+        data = {
+            'traceId': self.trace.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start),
+            'endTimeUnixNano': str(self.end or time.time_ns()),
+            'attributes': [_attribute(key, value) for key, value in self.attributes.items()],
+        }
+        if self.parent_id:
+            data['parentSpanId'] = self.parent_id
+        if self.error:
+            data['status'] = {'code': STATUS_ERROR, 'message': self.error}
+        return data
+
+
+class Trace:
+    """The spans of one sampled request"""
+
+    def __init__(self, trace_id=None):
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.spans = []
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+def tracing_enabled():
+    return bool(getattr(settings, 'TRACE_EXPORT', ''))
+
+
+def current_span():
+    return _current_span.get()
+
+
+def parse_traceparent(header):
+    """(trace_id, parent span_id, sampled) from a W3C traceparent header, or None"""
+    parts = (header or '').strip().split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        flags = int(parts[3], 16)
+        int(parts[1], 16)
+        int(parts[2], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+@contextmanager
+def span(name, **attributes):
+    """Child span of the current span; a no-op outside a sampled trace"""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(parent.trace, name, parent_id=parent.span_id, attributes=attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        child.end = time.time_ns()
+        _current_span.reset(token)
+        parent.trace.spans.append(child)
+
+
+def traced(name):
+    """Decorator running the function inside ``span(name)``"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def start_trace(name, traceparent=None, trust_sampled=False, **attributes):
+    """
+    Root span for a request, sampled at TRACE_SAMPLE_RATE
+
+    With ``trust_sampled`` the incoming traceparent's sampled flag decides
+    instead. Yields the root span, or None when the request is not
+    sampled. The trace is exported when the block exits.
+    """
+    parent = parse_traceparent(traceparent)
+    trace_id, parent_id = parent[:2] if parent is not None else (None, None)
+    if parent is not None and trust_sampled:
+        sampled = parent[2]
+    else:
+        sampled = random.random() < getattr(settings, 'TRACE_SAMPLE_RATE', 0.0)
+    if not sampled:
+        yield None
+        return
+
+    trace = Trace(trace_id)
+    root = Span(trace, name, parent_id=parent_id, kind=SPAN_KIND_SERVER, attributes=attributes)
+    token = _current_span.set(root)
+    try:
+        yield root
+    except BaseException as e:
+        root.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        root.end = time.time_ns()
+        _current_span.reset(token)
+        trace.spans.append(root)
+        export(trace)
+
+
+class QuerySpans:
+    """Connection execute_wrapper opening a span per SQL statement"""
+
+    def __call__(self, execute, sql, params, many, context):
+        with span('db.query', **{
+            'db.system': context['connection'].vendor,
+            'db.name': context['connection'].alias,
+            'db.statement': fingerprint(sql),
+        }):
+            return execute(sql, params, many, context)
+
+
+def otlp_payload(trace):
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': [
+                _attribute('service.name', getattr(settings, 'TRACE_SERVICE_NAME', 'clinlogix-api')),
+            ]},
+            'scopeSpans': [{
+                'scope': {'name': 'api.tracing'},
+                'spans': [s.to_otlp() for s in trace.spans],
+            }],
+        }],
+    }
+
+
+def _post_worker():
+    endpoint = settings.TRACE_OTLP_ENDPOINT
+    while True:
+        body = _otlp_queue.get()
+        request = urllib.request.Request(
+            endpoint, data=body, headers={'Content-Type': 'application/json'}, method='POST'
+        )
+        try:
+            urllib.request.urlopen(request, timeout=5).close()
+        except Exception as e:
+            logger.warning(f"Trace export to {endpoint} failed: {e}")
+
+
+def _enqueue(body):
+    global _otlp_queue
+    if _otlp_queue is None:
+        with _otlp_lock:
+            if _otlp_queue is None:
+                _otlp_queue = queue.Queue(maxsize=1000)
+                threading.Thread(target=_post_worker, name='trace-exporter', daemon=True).start()
+    try:
+        _otlp_queue.put_nowait(body)
+    except queue.Full:
+        pass
+
+
+def export(trace):
+    """Hand a finished trace to the configured exporter"""
+    body = json.dumps(otlp_payload(trace), separators=(',', ':'))
+    mode = getattr(settings, 'TRACE_EXPORT', '')
+    if mode == 'file':
+        with _file_lock, open(settings.TRACE_FILE, 'a') as f:
+            f.write(body + '\n')
+    elif mode == 'otlp':
+        _enqueue(body.encode())
+
+
+class TraceContextFilter(logging.Filter):
+    """Adds ``trace_id`` and ``span_id`` ('-' outside a sampled trace) to log records"""
+
+    def filter(self, record):
+        current = _current_span.get()
+        record.trace_id = current.trace.trace_id if current else '-'
+        record.span_id = current.span_id if current else '-'
+        return True
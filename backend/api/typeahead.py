@@ -0,0 +1,155 @@
+"""
+Typeahead search over people and patients
+
+On Postgres the lookups run against trigram GIN indexes on
+``lower(full_name)``, ``lower(email)`` and ``lower(reference_id)`` (see
+supabase/migrations/20261019_typeahead_indexes.sql), so prefix, substring
+and fuzzy matches are all index scans. Other backends (SQLite test runs)
+filter with icontains and rank in Python.
+
+Ranking, highest first:
+    2  the query is a prefix of the name/email (or reference id)
+    1  the query starts a later word of the name
+    +  trigram similarity (0-1) between the query and the name
+"""
+import difflib
+import re
+
+from django.db import connections, router
+
+from api.models import Patients, Profiles
+from api.sharding import fan_out, on_institution
+
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+LIKE_SPECIAL_RE = re.compile(r'([\\%_])')
+
+PEOPLE_SQL = """
+    SELECT p.*,
+        CASE
+            WHEN lower(p.full_name) LIKE %s OR lower(p.email) LIKE %s THEN 2
+            WHEN lower(p.full_name) LIKE %s THEN 1
+            ELSE 0
+        END + similarity(lower(coalesce(p.full_name, '')), %s) AS rank
+    FROM profiles p
+    WHERE (lower(p.full_name) LIKE %s OR lower(p.email) LIKE %s OR lower(p.full_name) %% %s)
+      {scope}
+    ORDER BY rank DESC, p.full_name
+    LIMIT %s
+"""
+
+PATIENTS_SQL = """
+    SELECT p.*,
+        CASE WHEN lower(p.reference_id) LIKE %s THEN 2 ELSE 0 END
+        + similarity(lower(p.reference_id), %s) AS rank
+    FROM patients p
+    WHERE (lower(p.reference_id) LIKE %s OR lower(p.reference_id) %% %s)
+      {scope}
+    ORDER BY rank DESC, p.reference_id
+    LIMIT %s
+"""
+
+
+def _like_escape(value):
+    return LIKE_SPECIAL_RE.sub(r'\\\1', value)
+
+
+def _scope(filters):
+    """``AND col = %s`` clauses and params for the non-empty filters"""
+    columns = [column for column, value in filters if value]
+    clause = ''.join(f' AND p.{column} = %s' for column in columns)
+    return clause, [value for _, value in filters if value]
+
+
+def _score(query, text, words=True):
+    """Python equivalent of the SQL rank, for non-Postgres backends"""
+    text = (text or '').lower()
+    if text.startswith(query):
+        base = 2
+    elif words and f' {query}' in text:
+        base = 1
+    else:
+        base = 0
+    return base + difflib.SequenceMatcher(None, query, text).ratio()
+
+
+def _people_on_current_shard(query, role, institution_id, limit):
+    db = router.db_for_read(Profiles)
+    if connections[db].vendor == 'postgresql':
+        prefix = f'{_like_escape(query)}%'
+        contains = f'%{_like_escape(query)}%'
+        scope, scope_params = _scope([('institution_id', institution_id), ('role', role)])
+        sql = PEOPLE_SQL.format(scope=scope)
+        params = [prefix, prefix, f'% {prefix}', query, contains, prefix, query, *scope_params, limit]
+        return [(float(p.rank), p) for p in Profiles.objects.raw(sql, params, using=db)]
+
+    from django.db.models import Q
+    queryset = Profiles.objects.using(db).filter(Q(full_name__icontains=query) | Q(email__icontains=query))
+    if institution_id:
+        queryset = queryset.filter(institution_id=institution_id)
+    if role:
+        queryset = queryset.filter(role=role)
+    scored = [
+        (max(_score(query, p.full_name), _score(query, p.email, words=False)), p)
+        for p in queryset
+    ]
+    return sorted(scored, key=lambda item: (-item[0], item[1].full_name or ''))[:limit]
+
+
+def _patients_on_current_shard(query, institution_id, limit):
+    db = router.db_for_read(Patients)
+    if connections[db].vendor == 'postgresql':
+        prefix = f'{_like_escape(query)}%'
+        scope, scope_params = _scope([('institution_id', institution_id)])
+        sql = PATIENTS_SQL.format(scope=scope)
+        params = [prefix, query, prefix, query, *scope_params, limit]
+        return [(float(p.rank), p) for p in Patients.objects.raw(sql, params, using=db)]
+
+    queryset = Patients.objects.using(db).filter(reference_id__icontains=query)
+    if institution_id:
+        queryset = queryset.filter(institution_id=institution_id)
+    scored = [(_score(query, p.reference_id, words=False), p) for p in queryset]
+    return sorted(scored, key=lambda item: (-item[0], item[1].reference_id))[:limit]
+
+
+def _search(search_shard, institution_id, limit):
+    """Run on the institution's shard, or on every shard and keep the best ``limit``"""
+    if institution_id:
+        with on_institution(institution_id):
+            return search_shard()
+    merged = [hit for hits in fan_out(search_shard).values() for hit in hits]
+    return sorted(merged, key=lambda item: -item[0])[:limit]
+
+
+def search_people(query, institution_id=None, role=None, limit=DEFAULT_LIMIT):
+    """
+    Profiles matching a typeahead query, best first
+
+    Returns:
+        List of (rank, Profiles)
+    """
+    query = query.strip().lower()
+    if not query:
+        return []
+    return _search(
+        lambda: _people_on_current_shard(query, role, institution_id, limit),
+        institution_id, limit,
+    )
+
+
+def search_patients(query, institution_id=None, limit=DEFAULT_LIMIT):
+    """
+    Patients whose reference id matches a typeahead query, best first
+
+    Returns:
+        List of (rank, Patients)
+    """
+    query = query.strip().lower()
+    if not query:
+        return []
+    return _search(
+        lambda: _patients_on_current_shard(query, institution_id, limit),
+        institution_id, limit,
+    )
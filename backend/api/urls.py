@@ -9,27 +9,35 @@ from .views import (
     # Student views
     StudentLogViewSet,
     StudentPatientViewSet,
+    StudentHomeViewSet,
     # Instructor views
     InstructorReviewViewSet,
     InstructorStudentViewSet,
+    InstructorHomeViewSet,
     # Admin views
     AdminUserManagementViewSet,
     AdminInstitutionViewSet,
     AdminPatientViewSet,
     AdminAssignmentViewSet,
     AdminDashboardViewSet,
+    AdminSearchViewSet,
+    AdminHomeViewSet,
     # Profile views
     ProfileViewSet,
 )
+from .views import async_views
+from .views.batch import BatchView
 
 # Create routers for different user roles
 student_router = DefaultRouter()
 student_router.register(r'logs', StudentLogViewSet, basename='student-logs')
 student_router.register(r'patients', StudentPatientViewSet, basename='student-patients')
+student_router.register(r'home', StudentHomeViewSet, basename='student-home')
 
 instructor_router = DefaultRouter()
 instructor_router.register(r'reviews', InstructorReviewViewSet, basename='instructor-reviews')
 instructor_router.register(r'students', InstructorStudentViewSet, basename='instructor-students')
+instructor_router.register(r'home', InstructorHomeViewSet, basename='instructor-home')
 
 admin_router = DefaultRouter()
 admin_router.register(r'users', AdminUserManagementViewSet, basename='admin-users')
@@ -37,6 +45,8 @@ admin_router.register(r'institutions', AdminInstitutionViewSet, basename='admin-
 admin_router.register(r'patients', AdminPatientViewSet, basename='admin-patients')
 admin_router.register(r'assignments', AdminAssignmentViewSet, basename='admin-assignments')
 admin_router.register(r'dashboard', AdminDashboardViewSet, basename='admin-dashboard')
+admin_router.register(r'search', AdminSearchViewSet, basename='admin-search')
+admin_router.register(r'home', AdminHomeViewSet, basename='admin-home')
 
 urlpatterns = [
     # Current user profile
@@ -59,4 +69,14 @@ urlpatterns = [
     
     # Admin endpoints
     path('admin/', include(admin_router.urls)),
+
+    # Several read-only calls in one request
+    path('batch/', BatchView.as_view(), name='batch'),
+
+    # Async dashboard/stats endpoints (concurrent queries; serve via core/asgi.py)
+    path('async/', include([
+        path('admin/dashboard/stats/', async_views.admin_dashboard_stats, name='async-admin-dashboard-stats'),
+        path('admin/dashboard/institution_stats/', async_views.admin_institution_stats, name='async-admin-institution-stats'),
+        path('student/logs/stats/', async_views.student_log_stats, name='async-student-log-stats'),
+    ])),
 ]
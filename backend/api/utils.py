@@ -4,9 +4,14 @@ Utility functions for common operations
 from django.core.mail import send_mail
 from django.conf import settings
 from api.models import Profiles, AuditLogs
+from api.metrics import track_task
+from api.tracing import span
+import ipaddress
 import uuid
 from datetime import datetime
 
+import jwt
+
 
 def get_user_profile(user):
     """
@@ -18,10 +23,59 @@ def get_user_profile(user):
     Returns:
         Profile instance or None
     """
+    from api.prepared import profile_by_email
+    
+    return profile_by_email(user.email)
+
+
+def get_token_user_id(request):
+    """
+    Get the user id a request claims to be, before DRF authenticates it
+    
+    Reads the ``user_id`` claim from the bearer token WITHOUT verifying
+    the signature, falling back to the session user. Only use this for
+    decisions that are harmless if spoofed (database routing, cache keys
+    scoped per user) - never for authorization.
+    
+    Args:
+        request: Django HttpRequest
+        
+    Returns:
+        User id or None
+    """
+    parts = request.META.get('HTTP_AUTHORIZATION', '').split()
+    if len(parts) == 2 and parts[0] == 'Bearer':
+        try:
+            claims = jwt.decode(parts[1], options={'verify_signature': False})
+        except jwt.PyJWTError:
+            return None
+        return claims.get('user_id')
+    
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.pk
+    return None
+
+
+def remote_address_in(request, networks):
+    """
+    Check whether the request's peer address is in any of the networks
+    
+    Uses REMOTE_ADDR, not X-Forwarded-For, so behind a proxy this is the
+    proxy's address.
+    
+    Args:
+        request: Django HttpRequest
+        networks: Addresses or CIDRs, e.g. ['127.0.0.1', '10.0.0.0/8']
+        
+    Returns:
+        Boolean
+    """
     try:
-        return Profiles.objects.get(email=user.email)
-    except Profiles.DoesNotExist:
-        return None
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False) for network in networks)
 
 
 def has_role(user, role):
@@ -51,15 +105,16 @@ def log_audit(actor_id, action, entity_type, entity_id, metadata=None):
         metadata: Optional dict of additional data
     """
     try:
-        AuditLogs.objects.create(
-            id=uuid.uuid4(),
-            actor_id=actor_id,
-            action=action,
-            entity_type=entity_type,
-            entity_id=entity_id,
-            metadata=metadata or {},
-            created_at=datetime.now()
-        )
+        with track_task('audit'), span('audit.write', action=action, entity_type=entity_type):
+            AuditLogs.objects.create(
+                id=uuid.uuid4(),
+                actor_id=actor_id,
+                action=action,
+                entity_type=entity_type,
+                entity_id=entity_id,
+                metadata=metadata or {},
+                created_at=datetime.now()
+            )
     except Exception as e:
         print(f"Warning: Failed to create audit log: {e}")
 
@@ -74,13 +129,14 @@ def send_notification_email(to_email, subject, message):
         message: Email body
     """
     try:
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[to_email],
-            fail_silently=False,
-        )
+        with track_task('email'), span('email.send'):
+            send_mail(
+                subject=subject,
+                message=message,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                recipient_list=[to_email],
+                fail_silently=False,
+            )
         return True
     except Exception as e:
         print(f"Email sending failed: {e}")
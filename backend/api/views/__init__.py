@@ -7,23 +7,39 @@ from rest_framework.views import APIView
 
 from api.models import Profiles
 from api.serializers import UserSerializer, ProfileSerializer
+from api.conditional import conditional, latest, scope_version
 
 # Import role-specific views
-from .student import StudentLogViewSet, StudentPatientViewSet
-from .instructor import InstructorReviewViewSet, InstructorStudentViewSet
+from .student import StudentLogViewSet, StudentPatientViewSet, StudentHomeViewSet
+from .instructor import InstructorReviewViewSet, InstructorStudentViewSet, InstructorHomeViewSet
 from .admin import (
     AdminUserManagementViewSet, AdminInstitutionViewSet, 
-    AdminPatientViewSet, AdminAssignmentViewSet, AdminDashboardViewSet
+    AdminPatientViewSet, AdminAssignmentViewSet, AdminDashboardViewSet,
+    AdminSearchViewSet, AdminHomeViewSet
 )
 from .profiles import ProfileViewSet
 
 
+def me_version(view, request, *args, **kwargs):
+    """The user row is already loaded by authentication; profiles and institutions are cache-versioned"""
+    user = request.user
+    profiles, institutions = scope_version('profiles'), scope_version('institutions')
+    if profiles is None or institutions is None:
+        return None
+    (profiles, profiles_changed), (institutions, institutions_changed) = profiles, institutions
+    return (
+        (user.username, user.email, user.first_name, user.last_name, profiles, institutions),
+        latest(profiles_changed, institutions_changed),
+    )
+
+
 class MeView(APIView):
     """
     Get current authenticated user's profile
     """
     permission_classes = [permissions.IsAuthenticated]
 
+    @conditional(me_version)
     def get(self, request):
         try:
             user_serializer = UserSerializer(request.user)
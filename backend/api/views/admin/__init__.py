@@ -1,8 +1,11 @@
 """
 Admin-specific views with enterprise-level structure
 """
+import uuid
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.filters import OrderingFilter
 from rest_framework.response import Response
 from django.contrib.auth.models import User
 from django.db import transaction
@@ -17,18 +20,83 @@ from api.serializers import (
     StudentPatientAssignmentSerializer
 )
 from api.permissions import IsAdmin
-from api.mixins import ResponseMixin, UserProfileMixin
+from api.mixins import (
+    ResponseMixin, UserProfileMixin, LogSearchMixin, QueryParamFilterMixin,
+    SparseFieldsetMixin, HomeMixin, home_section, profile_section
+)
+from api.pagination import OptionalCursorPagination
 from api.exceptions import ValidationError, DuplicateEntryError
 from api.constants import Messages, LogStatus, AssignmentStatus, InvitationStatus
 from api.utils import log_audit, send_notification_email, generate_invitation_token
+from api.querycount import query_budget
+from api.metrics import track_task
+from api.tracing import span, traced
+from api.conditional import bump, conditional, scope_version
+
+
+def dashboard_stat_queries():
+    """Independent aggregate queries behind the dashboard stats cards"""
+    from django.db.models import Sum
+
+    return {
+        'total_students': Profiles.objects.filter(role='student').count,
+        'total_preceptors': Profiles.objects.filter(role='instructor').count,
+        'total_entries': LogEntries.objects.count,
+        'pending_reviews': LogEntries.objects.filter(status='pending').count,
+        'approved_count': LogEntries.objects.filter(status='approved').count,
+        'total_hours': lambda: float(LogEntries.objects.aggregate(total=Sum('hours'))['total'] or 0),
+    }
+
+
+def dashboard_stats_payload(totals):
+    """Shape summed dashboard counts for the stats cards"""
+    return {
+        'totalStudents': totals['total_students'],
+        'totalPreceptors': totals['total_preceptors'],
+        'totalEntries': totals['total_entries'],
+        'pendingReviews': totals['pending_reviews'],
+        'totalHours': round(totals['total_hours'], 2),
+        'approvedCount': totals['approved_count']
+    }
+
+
+def institution_stat_queries(inst):
+    """Independent count queries for one institution's stats row"""
+    # Relation is Institution -> Profile -> LogEntries
+    student_qs = Profiles.objects.filter(institution=inst, role='student')
+    logs_qs = LogEntries.objects.filter(student__in=student_qs)
+    return {
+        'students': student_qs.count,
+        'instructors': Profiles.objects.filter(institution=inst, role='instructor').count,
+        'assigned_students': StudentPreceptorAssignments.objects.filter(
+            student__in=student_qs,
+            status='active'
+        ).values('student').distinct().count,
+        'total_logs': logs_qs.count,
+        'approved_logs': logs_qs.filter(status='approved').count,
+        'pending_logs': logs_qs.filter(status='pending').count,
+    }
+
+
+def uuid_param(request, name):
+    """Query param ``name`` as a UUID string, or None if absent; ValidationError if malformed"""
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        return str(uuid.UUID(value))
+    except ValueError:
+        raise ValidationError(f"Invalid value for {name}: {value}")
 
 
-class AdminUserManagementViewSet(ResponseMixin, viewsets.ModelViewSet):
+class AdminUserManagementViewSet(SparseFieldsetMixin, QueryParamFilterMixin, ResponseMixin, viewsets.ModelViewSet):
     """
     ViewSet for admins to manage users and invitations
     
     Endpoints:
-        - GET /api/admin/users/ - List all users
+        - GET /api/admin/users/ - List users
+          (?email=, ?role=, ?status=, ?institution_id=, ?ordering=,
+          ?page_size= / ?cursor= for cursor pages)
         - POST /api/admin/users/ - Create user
         - POST /api/admin/users/invite/ - Invite new user
         - GET /api/admin/users/{id}/ - Get specific user
@@ -38,10 +106,17 @@ class AdminUserManagementViewSet(ResponseMixin, viewsets.ModelViewSet):
     serializer_class = AuthorizedUserSerializer
     permission_classes = [IsAdmin]
     queryset = AuthorizedUsers.objects.all()
-
-    def get_queryset(self):
-        """Return all authorized users ordered by creation date"""
-        return self.queryset.order_by('-created_at')
+    filter_params = {
+        'email': 'email',
+        'role': 'role',
+        'status': 'status',
+        'institution_id': 'institution_id',
+        'institution': 'institution_id',
+    }
+    filter_backends = [OrderingFilter]
+    ordering_fields = ['created_at', 'email', 'full_name', 'role', 'status']
+    ordering = ['-created_at']
+    pagination_class = OptionalCursorPagination
 
     @action(detail=False, methods=['post'])
     @transaction.atomic
@@ -194,7 +269,9 @@ class AdminUserManagementViewSet(ResponseMixin, viewsets.ModelViewSet):
                 
                 if update_kwargs:
                      Profiles.objects.filter(email=email).update(**update_kwargs)
-                
+
+            # update() skips the signals that version profiles for conditional GETs
+            bump('profiles')
             auth_user.save()
             
             serializer = self.get_serializer(auth_user)
@@ -203,7 +280,15 @@ class AdminUserManagementViewSet(ResponseMixin, viewsets.ModelViewSet):
             return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
 
 
-class AdminInstitutionViewSet(ResponseMixin, viewsets.ModelViewSet):
+def institutions_version(view, request, *args, **kwargs):
+    version = scope_version('institutions')
+    if version is None:
+        return None
+    token, changed_at = version
+    return (token,), changed_at
+
+
+class AdminInstitutionViewSet(SparseFieldsetMixin, ResponseMixin, viewsets.ModelViewSet):
     """
     ViewSet for admins to manage institutions
     
@@ -218,13 +303,23 @@ class AdminInstitutionViewSet(ResponseMixin, viewsets.ModelViewSet):
     permission_classes = [IsAdmin]
     queryset = Institutions.objects.all()
 
+    @conditional(institutions_version)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
-class AdminPatientViewSet(ResponseMixin, viewsets.ModelViewSet):
+    @conditional(institutions_version)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+
+class AdminPatientViewSet(SparseFieldsetMixin, QueryParamFilterMixin, ResponseMixin, viewsets.ModelViewSet):
     """
     ViewSet for admins to manage patients
     
     Endpoints:
-        - GET /api/admin/patients/ - List all patients
+        - GET /api/admin/patients/ - List patients
+          (?institution=, ?clinical_category=, ?ordering=,
+          ?page_size= / ?cursor= for cursor pages)
         - POST /api/admin/patients/ - Create patient
         - GET /api/admin/patients/{id}/ - Get specific patient
         - PUT /api/admin/patients/{id}/ - Update patient
@@ -233,9 +328,18 @@ class AdminPatientViewSet(ResponseMixin, viewsets.ModelViewSet):
     serializer_class = PatientSerializer
     permission_classes = [IsAdmin]
     queryset = Patients.objects.all()
+    filter_params = {
+        'institution': 'institution_id',
+        'institution_id': 'institution_id',
+        'clinical_category': 'clinical_category',
+    }
+    filter_backends = [OrderingFilter]
+    ordering_fields = ['created_at', 'reference_id']
+    ordering = ['-created_at']
+    pagination_class = OptionalCursorPagination
 
 
-class AdminAssignmentViewSet(ResponseMixin, viewsets.ModelViewSet):
+class AdminAssignmentViewSet(SparseFieldsetMixin, ResponseMixin, viewsets.ModelViewSet):
     """
     ViewSet for admins to manage student-preceptor assignments
     
@@ -250,6 +354,7 @@ class AdminAssignmentViewSet(ResponseMixin, viewsets.ModelViewSet):
     queryset = StudentPreceptorAssignments.objects.all()
 
     @action(detail=False, methods=['get'])
+    @query_budget(5)
     def preceptor_stats(self, request):
         """
         Get list of preceptors with their current student count
@@ -257,20 +362,23 @@ class AdminAssignmentViewSet(ResponseMixin, viewsets.ModelViewSet):
         from django.db.models import Count, Q
         
         # Count active assignments for each instructor, ordered by newest first
-        preceptors = Profiles.objects.filter(role='instructor').annotate(
+        preceptors = list(Profiles.objects.filter(role='instructor').annotate(
             student_count=Count(
                 'studentpreceptorassignments_preceptor_set',
                 filter=Q(studentpreceptorassignments_preceptor_set__status='active')
             )
-        ).order_by('-created_at')
+        ).select_related('institution').order_by('-created_at'))
+        
+        # Invitation statuses for all preceptors in one query
+        statuses = dict(AuthorizedUsers.objects.filter(
+            email__in=[p.email for p in preceptors]
+        ).values_list('email', 'status'))
         
         data = []
         for p in preceptors:
-            # Try to get status from AuthorizedUsers
-            try:
-                auth_user = AuthorizedUsers.objects.get(email=p.email)
-                status = auth_user.status or 'pending'
-            except AuthorizedUsers.DoesNotExist:
+            if p.email in statuses:
+                status = statuses[p.email] or 'pending'
+            else:
                 status = 'active'  # If not in authorized_users, assume active
             
             data.append({
@@ -393,15 +501,98 @@ class AdminAssignmentViewSet(ResponseMixin, viewsets.ModelViewSet):
         )
 
 
-class AdminDashboardViewSet(ResponseMixin, viewsets.ViewSet):
+class AdminSearchViewSet(UserProfileMixin, ResponseMixin, viewsets.ViewSet):
+    """
+    Typeahead search for the admin pickers (see api/typeahead.py)
+
+    Results are scoped to ``?institution=``, defaulting to the admin's own
+    institution; admins without one search every institution.
+
+    Endpoints:
+        - GET /api/admin/search/people/?q=&role=&institution=&limit= - Profiles by name or email
+        - GET /api/admin/search/patients/?q=&institution=&limit= - Patients by reference id
+    """
+    permission_classes = [IsAdmin]
+
+    def _params(self, request):
+        from api.typeahead import DEFAULT_LIMIT, MAX_LIMIT
+
+        query = request.query_params.get('q', '')
+        try:
+            limit = int(request.query_params.get('limit', DEFAULT_LIMIT))
+        except ValueError:
+            raise ValidationError("limit must be an integer")
+
+        institution_id = uuid_param(request, 'institution')
+        if not institution_id:
+            profile = self.get_user_profile()
+            institution_id = profile.institution_id if profile else None
+        return query, institution_id, max(1, min(limit, MAX_LIMIT))
+
+    @action(detail=False, methods=['get'])
+    @query_budget(5)
+    def people(self, request):
+        """Profiles whose name or email matches ?q=, best match first"""
+        from api.typeahead import search_people
+
+        query, institution_id, limit = self._params(request)
+        hits = search_people(query, institution_id, request.query_params.get('role'), limit)
+        return self.success_response([
+            {
+                'id': str(profile.id),
+                'full_name': profile.full_name,
+                'email': profile.email,
+                'role': profile.role,
+                'institution_id': str(profile.institution_id) if profile.institution_id else None,
+                'rank': round(rank, 4),
+            }
+            for rank, profile in hits
+        ])
+
+    @action(detail=False, methods=['get'])
+    @query_budget(5)
+    def patients(self, request):
+        """Patients whose reference id matches ?q=, best match first"""
+        from api.typeahead import search_patients
+
+        query, institution_id, limit = self._params(request)
+        hits = search_patients(query, institution_id, limit)
+        return self.success_response([
+            {
+                'id': str(patient.id),
+                'reference_id': patient.reference_id,
+                'age_group': patient.age_group,
+                'gender': patient.gender,
+                'clinical_category': patient.clinical_category,
+                'institution_id': str(patient.institution_id) if patient.institution_id else None,
+                'rank': round(rank, 4),
+            }
+            for rank, patient in hits
+        ])
+
+
+class AdminDashboardViewSet(LogSearchMixin, ResponseMixin, viewsets.ViewSet):
     """
     ViewSet for admin dashboard statistics
     
     Endpoints:
         - GET /api/admin/dashboard/stats/ - Get system statistics
+        - GET /api/admin/dashboard/search/?q= - Full-text search all logs
+        - GET /api/admin/dashboard/cohort_summary/ - Cohort hour percentiles
+        - GET /api/admin/dashboard/cohort_students/ - Per-student hours, z-scores
+        - GET /api/admin/dashboard/cohort_outliers/ - Outlier students
+        - GET /api/admin/dashboard/cube/ - Slice entry counts and hours
+        - GET /api/admin/dashboard/timeseries/ - Entries/hours per day, week, month or quarter
+        - GET /api/admin/dashboard/db_pool/ - Connection pool utilization
+        - GET/DELETE /api/admin/dashboard/slow_queries/ - Captured slow queries
+        - GET/DELETE /api/admin/dashboard/memory/ - Allocations per view
     """
     permission_classes = [IsAdmin]
 
+    def get_search_queryset(self):
+        """Admins search across every log entry"""
+        return LogEntries.objects.all()
+
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """
@@ -434,139 +625,139 @@ class AdminDashboardViewSet(ResponseMixin, viewsets.ViewSet):
         )
 
     @action(detail=False, methods=['get'])
-    def chart_data(self, request):
-        """
-        Get data for dashboard charts (Activity Trends & Specialty Distribution)
+    def institution_stats(self, request):
         """
-        from django.db.models import Count, Sum
-        from django.db.models.functions import TruncMonth
-        from django.utils import timezone
-        import datetime
-
-        # 1. Monthly Activity (Last 6 months)
-        six_months_ago = timezone.now() - datetime.timedelta(days=180)
-        
-        monthly_stats = LogEntries.objects.filter(
-            submitted_at__gte=six_months_ago
-        ).annotate(
-            month=TruncMonth('submitted_at')
-        ).values('month').annotate(
-            entries=Count('id'),
-            hours=Sum('hours')
-        ).order_by('month')
-        
-        # Format for frontend
-        formatted_activity = []
-        for stat in monthly_stats:
-            if stat['month']:
-                formatted_activity.append({
-                    'month': stat['month'].strftime('%b'), # Jan, Feb
-                    'entries': stat['entries'],
-                    'hours': float(stat['hours'] or 0)
-                })
+        Get aggregated statistics per institution
 
-        # 2. Specialty Distribution
-        specialty_stats = LogEntries.objects.values('specialty').annotate(
-            value=Count('id')
-        ).order_by('-value')[:6] # Top 6
+        Each shard computes the rows for the institutions it holds, in parallel.
+        """
+        from api.sharding import current_shard, fan_out, shard_for_institution
         
-        formatted_specialty = [
-            {'name': s['specialty'] or 'Unspecified', 'value': s['value']}
-            for s in specialty_stats if s['value'] > 0
-        ]
+        insts = list(Institutions.objects.all())
+        
+        def shard_rows():
+            shard = current_shard()
+            return [
+                self._institution_row(inst)
+                for inst in insts
+                if shard_for_institution(inst.id) == shard
+            ]
         
-        # If no activity, provide at least empty structure or defaults if needed
-        # But frontend should handle empty arrays
+        rows = {}
+        for shard_data in fan_out(shard_rows).values():
+            for row in shard_data:
+                rows[row['id']] = row
+        data = [rows[str(inst.id)] for inst in insts if str(inst.id) in rows]
+            
+        return self.success_response(data)
+
+    def _institution_row(self, inst):
+        """Counts for one institution, read from the current shard"""
+        row = {'id': str(inst.id), 'name': inst.name}
+        for name, query in institution_stat_queries(inst).items():
+            row[name] = query()
+        return row
+
+    def _cohort_frame(self, request):
+        """Load the cohort frame scoped by ?institution= and ?status="""
+        from api.analytics import get_frame
+        return get_frame(
+            institution_id=uuid_param(request, 'institution'),
+            status=request.query_params.get('status') or None,
+        )
+
+    def _z_threshold(self, request):
+        from api.analytics import DEFAULT_Z_THRESHOLD
+        try:
+            return float(request.query_params.get('z', DEFAULT_Z_THRESHOLD))
+        except ValueError:
+            raise ValidationError("z must be a number")
 
+    @action(detail=False, methods=['get'])
+    def cohort_summary(self, request):
+        """
+        Cohort distribution of clinical hours
+
+        Query params:
+            - institution: Optional institution UUID
+            - status: Optional log status to count (e.g. approved)
+
+        Returns:
+            - Mean, std and p10-p90 of total hours per student
+            - Per-specialty totals and percentiles
+        """
+        from api.analytics import cohort_summary
+        return self.success_response(cohort_summary(self._cohort_frame(request)))
+
+    @action(detail=False, methods=['get'])
+    def cohort_students(self, request):
+        """
+        Per-student hours by specialty with z-score, percentile and outlier flag
+
+        Query params:
+            - institution, status: As for cohort_summary
+            - z: Outlier threshold in standard deviations (default 2.5)
+            - order: 'desc' (default) or 'asc' by total hours
+            - limit, offset: Page through students (default limit 100)
+        """
+        from api.analytics import student_metrics
+        try:
+            limit = int(request.query_params.get('limit', 100))
+            offset = int(request.query_params.get('offset', 0))
+        except ValueError:
+            raise ValidationError("limit and offset must be integers")
+
+        frame = self._cohort_frame(request)
+        rows = student_metrics(
+            frame,
+            z_threshold=self._z_threshold(request),
+            ascending=request.query_params.get('order') == 'asc',
+            limit=max(1, min(limit, 1000)),
+            offset=max(0, offset),
+        )
         return self.success_response({
-            'activity': formatted_activity,
-            'specialty': formatted_specialty
+            'results': rows,
+            'total_count': frame.n_students,
+            'specialties': frame.specialties,
         })
 
     @action(detail=False, methods=['get'])
-    def institution_stats(self, request):
-        """
-        Get aggregated statistics per institution
+    def cohort_outliers(self, request):
         """
-        from django.db.models import Count, Sum, Q
-        
-        # We need to aggregate based on Profiles and Logs
-        # Since relation is Institution -> Profile -> LogEntries
-        
-        insts = Institutions.objects.all()
-        
-        data = []
-        for inst in insts:
-            # 1. Get Profiles in this institution
-            # We filter by institution directly (safe single-table filter)
-            student_qs = Profiles.objects.filter(institution=inst, role='student')
-            student_count = student_qs.count()
-            
-            instructor_qs = Profiles.objects.filter(institution=inst, role='instructor')
-            instructor_count = instructor_qs.count()
+        Students whose total hours are unusually high or low
 
-            # 2. Get Logs for these students (Manual Join)
-            # Fetch IDs to avoid complex cross-table joins on managed=False models
-            student_ids = student_qs.values_list('id', flat=True)
-            
-            # Use student_id__in or student__in
-            logs_qs = LogEntries.objects.filter(student__in=student_qs)
-            total_logs = logs_qs.count()
-            approved_logs = logs_qs.filter(status='approved').count()
-            pending_logs = logs_qs.filter(status='pending').count()
-            
-            # 3. Count assigned students (Manual Join)
-            from api.models import StudentPreceptorAssignments
-            assigned_students = StudentPreceptorAssignments.objects.filter(
-                student__in=student_qs,
-                status='active'
-            ).values('student').distinct().count()
-            
-            data.append({
-                'id': str(inst.id),
-                'name': inst.name,
-                'students': student_count,
-                'instructors': instructor_count,
-                'assigned_students': assigned_students,
-                'total_logs': total_logs,
-                'approved_logs': approved_logs,
-                'pending_logs': pending_logs
-            })
-            
-        return self.success_response(data)
+        Query params:
+            - institution, status: As for cohort_summary
+            - z: Outlier threshold in standard deviations (default 2.5)
+        """
+        from api.analytics import outliers
+        frame = self._cohort_frame(request)
+        return self.success_response(outliers(frame, z_threshold=self._z_threshold(request)))
 
     @action(detail=False, methods=['get'])
+    @query_budget(5)
     def approved_entries(self, request):
         """
         Get all approved log entries for admin review with pagination
         """
-        from api.models import Profiles
         from django.core.paginator import Paginator
         
         # Get pagination parameters
         page_number = request.query_params.get('page', 1)
         page_size = request.query_params.get('page_size', 10)
         
-        # Optimize query with select_related if possible, or simple filter
-        # Since managed=False, verify if relations work. If not, keeping as is but paginated.
-        queryset = LogEntries.objects.filter(status='approved').order_by('-submitted_at')
+        queryset = LogEntries.objects.filter(status='approved').select_related(
+            'student'
+        ).order_by('-submitted_at')
         
         paginator = Paginator(queryset, page_size)
         page_obj = paginator.get_page(page_number)
         
         data = []
         for entry in page_obj:
-            # Fetch student name manually or via related if available
-            student_name = "Unknown"
-            try:
-                p = Profiles.objects.get(id=entry.student_id)
-                student_name = p.full_name
-            except Profiles.DoesNotExist:
-                pass
-
             data.append({
                 'id': str(entry.id),
-                'student_name': student_name,
+                'student_name': entry.student.full_name,
                 'date': str(entry.date),
                 'specialty': entry.specialty,
                 'hours': entry.hours,
@@ -626,76 +817,232 @@ class AdminDashboardViewSet(ResponseMixin, viewsets.ViewSet):
             
         return self.success_response(data)
 
+    def _cube_filters(self, request):
+        """Cube filters from ?institution=&specialty=&status=&cohort=&month_from=&month_to="""
+        import datetime
+
+        filters = {}
+        for dim in ('institution', 'specialty', 'status', 'cohort'):
+            values = request.query_params.getlist(dim)
+            if values:
+                filters[dim] = values
+        for bound in ('month_from', 'month_to'):
+            value = request.query_params.get(bound)
+            if value:
+                try:
+                    filters[bound] = datetime.datetime.strptime(value, '%Y-%m').date()
+                except ValueError:
+                    raise ValidationError(f"{bound} must be formatted YYYY-MM")
+        return filters
+
     @action(detail=False, methods=['get'])
     def chart_data(self, request):
         """
         Get aggregated chart data for activity and specialty
+
+        Answered from the in-memory activity cube. Accepts the same
+        filters as the cube endpoint (institution, specialty, status,
+        cohort, month_from, month_to).
         """
-        from django.db.models import Count, Sum
-        from django.db.models.functions import TruncMonth
+        from api.cube import get_cube
 
-        # Activity Data (Entries & Hours per Month)
-        # SQLite/Postgres compatible TruncMonth
-        activity_qs = LogEntries.objects.annotate(
-            month=TruncMonth('date')
-        ).values('month').annotate(
-            entries=Count('id'),
-            hours=Sum('hours')
-        ).order_by('month')
+        cube = get_cube()
+        filters = self._cube_filters(request)
 
         activity_data = []
-        for item in activity_qs:
+        for item in cube.query(filters, group_by=['month'], order_by='month'):
             if item['month']:
                 activity_data.append({
                     'month': item['month'].strftime('%b'),
                     'entries': item['entries'],
-                    'hours': float(item['hours'] or 0)
+                    'hours': item['hours']
                 })
 
-        # Specialty Data
-        specialty_qs = LogEntries.objects.values('specialty').annotate(
-            value=Count('id')
-        ).order_by('-value')
-
-        specialty_data = []
-        for item in specialty_qs:
-            if item['specialty']:
-                specialty_data.append({
-                    'name': item['specialty'],
-                    'value': item['value']
-                })
+        specialty_data = [
+            {'name': item['specialty'], 'value': item['entries']}
+            for item in cube.query(filters, group_by=['specialty'], order_by='-entries')
+            if item['specialty'] is not None
+        ]
 
         return self.success_response({
             'activity': activity_data,
             'specialty': specialty_data
         })
+
+    @action(detail=False, methods=['get'])
+    def timeseries(self, request):
+        """
+        Entries and hours over time with configurable buckets
+
+        Query params:
+            - granularity: day, week, month (default) or quarter
+            - start, end: Inclusive range (YYYY-MM-DD); defaults to the last 12 months
+            - field: date (default, clinical date) or submitted_at
+            - institution, specialty, student, status: Optional filters
+
+        Every bucket in the range is returned, including empty ones.
+        """
+        import datetime
+        from django.utils import timezone
+        from api.timeseries import (
+            GRANULARITIES, DATE_FIELDS, MAX_BUCKETS, bucket_count, time_series
+        )
+
+        params = request.query_params
+        granularity = params.get('granularity', 'month')
+        if granularity not in GRANULARITIES:
+            raise ValidationError(f"granularity must be one of: {', '.join(GRANULARITIES)}")
+        field = params.get('field', 'date')
+        if field not in DATE_FIELDS:
+            raise ValidationError(f"field must be one of: {', '.join(DATE_FIELDS)}")
+
+        try:
+            end = datetime.date.fromisoformat(params['end']) if params.get('end') else timezone.now().date()
+            start = (
+                datetime.date.fromisoformat(params['start']) if params.get('start')
+                else (end.replace(day=1) - datetime.timedelta(days=320)).replace(day=1)
+            )
+        except ValueError:
+            raise ValidationError("start and end must be formatted YYYY-MM-DD")
+        if start > end:
+            raise ValidationError("start must not be after end")
+        if bucket_count(start, end, granularity) > MAX_BUCKETS:
+            raise ValidationError(f"Range too large for {granularity} buckets (max {MAX_BUCKETS})")
+
+        series = time_series(
+            granularity, start, end, field=field,
+            institution=uuid_param(request, 'institution'),
+            specialty=params.get('specialty') or None,
+            student=uuid_param(request, 'student'),
+            status=params.get('status') or None,
+        )
+        return self.success_response({
+            'granularity': granularity,
+            'field': field,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'series': series,
+        })
+
+    @action(detail=False, methods=['get'])
+    def cube(self, request):
+        """
+        Slice the activity cube (institution x specialty x month x status x cohort)
+
+        Query params:
+            - group_by: Comma-separated dimensions (e.g. month,specialty)
+            - institution, specialty, status, cohort: Filters (repeatable)
+            - month_from, month_to: Inclusive month range (YYYY-MM)
+            - order_by: entries, hours or a grouped dimension; '-' for descending
+            - top: Keep only the first N groups
+        """
+        from api.cube import get_cube
+
+        group_by = [d for d in request.query_params.get('group_by', '').split(',') if d]
+        order_by = request.query_params.get('order_by', '-entries')
+        try:
+            top = int(request.query_params.get('top', 0)) or None
+        except ValueError:
+            raise ValidationError("top must be an integer")
+
+        try:
+            rows = get_cube().query(
+                self._cube_filters(request),
+                group_by=group_by,
+                order_by=order_by,
+                limit=top,
+            )
+        except ValueError as e:
+            raise ValidationError(str(e))
+
+        for row in rows:
+            if row.get('month'):
+                row['month'] = row['month'].strftime('%Y-%m')
+        return self.success_response(rows)
     
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """
         Get aggregated counts for dashboard stats cards
+
+        Counts are taken on every shard in parallel and summed.
         """
-        total_students = Profiles.objects.filter(role='student').count()
-        total_preceptors = Profiles.objects.filter(role='instructor').count()
-        total_entries = LogEntries.objects.count()
-        pending_reviews = LogEntries.objects.filter(status='pending').count()
-        approved_count = LogEntries.objects.filter(status='approved').count()
+        from api.sharding import fan_out, merge_counts
+        
+        def shard_counts():
+            return {name: query() for name, query in dashboard_stat_queries().items()}
         
-        # Calculate total hours manually to be safe with Decimal/Float types
-        all_logs = LogEntries.objects.all()
-        total_hours = sum(entry.hours or 0 for entry in all_logs)
+        totals = merge_counts(fan_out(shard_counts).values())
+
+        return self.success_response(dashboard_stats_payload(totals))
+
+
+    @action(detail=False, methods=['get'])
+    def db_pool(self, request):
+        """
+        Connection pool utilization of the worker process serving this request
+
+        Empty unless DATABASE_POOL is enabled.
+        """
+        from django.conf import settings
+
+        if not settings.DATABASE_POOL:
+            return self.success_response({})
+
+        from core.db.base import pool_stats
+        return self.success_response(pool_stats())
+
+    @action(detail=False, methods=['get', 'delete'])
+    def slow_queries(self, request):
+        """
+        Slow queries captured by the worker process serving this request
+
+        Newest first, each with its fingerprint, redacted params, issuing
+        view and (when sampled) EXPLAIN plan. DELETE clears the buffer.
 
+        Query params:
+            - limit: Most recent N records only
+        """
+        from api.slowqueries import clear_slow_queries, slow_queries
+
+        if request.method == 'DELETE':
+            clear_slow_queries()
+            return self.success_response(message="Slow query buffer cleared")
+
+        try:
+            limit = int(request.query_params.get('limit', 0)) or None
+        except ValueError:
+            raise ValidationError("limit must be an integer")
+        return self.success_response(slow_queries(limit))
+
+    @action(detail=False, methods=['get', 'delete'])
+    def memory(self, request):
+        """
+        Peak and net Python allocations per view, with the top allocating lines
+
+        Collected by the worker process serving this request while
+        MEMORY_PROFILING is on. DELETE resets the totals.
+
+        Query params:
+            - top: Allocation sites per view (default MEMORY_PROFILING_TOP_SITES)
+        """
+        from api.memprofile import allocation_stats, clear_allocation_stats, profiling_enabled
+
+        if request.method == 'DELETE':
+            clear_allocation_stats()
+            return self.success_response(message="Allocation stats cleared")
+
+        try:
+            top = int(request.query_params.get('top', 0)) or None
+        except ValueError:
+            raise ValidationError("top must be an integer")
         return self.success_response({
-            'totalStudents': total_students,
-            'totalPreceptors': total_preceptors,
-            'totalEntries': total_entries,
-            'pendingReviews': pending_reviews,
-            'totalHours': round(float(total_hours), 2),
-            'approvedCount': approved_count
+            'enabled': profiling_enabled(),
+            'views': allocation_stats(top),
         })
 
-
     @action(detail=True, methods=['get'])
+    @traced('pdf.report')
     def download_report(self, request, pk=None):
         """
         Generate and download a detailed professional PDF report.
@@ -824,7 +1171,8 @@ class AdminDashboardViewSet(ResponseMixin, viewsets.ViewSet):
         story.append(Spacer(1, 0.5*inch))
         story.append(Paragraph(f"Verified by {hospital_name} Clinical Education System", ParagraphStyle('Footer', parent=Normal, fontSize=8, textColor=colors.grey, alignment=TA_CENTER)))
 
-        doc.build(story)
+        with track_task('pdf'), span('pdf.build'):
+            doc.build(story)
         buffer.seek(0)
         
         response = HttpResponse(buffer, content_type='application/pdf')
@@ -834,6 +1182,7 @@ class AdminDashboardViewSet(ResponseMixin, viewsets.ViewSet):
 
     @action(detail=True, methods=['get'])
     @action(detail=True, methods=['get'])
+    @traced('fhir.build')
     def fhir(self, request, pk=None):
         """
         Get FHIR format of the log entry (Strict Mapping)
@@ -962,3 +1311,20 @@ class AdminDashboardViewSet(ResponseMixin, viewsets.ViewSet):
         }
         
         return self.success_response(bundle)
+
+
+class AdminHomeViewSet(HomeMixin, ResponseMixin, viewsets.ViewSet):
+    """
+    Everything the admin dashboard loads on login, in one request
+
+    Endpoints:
+        - GET /api/admin/home/?include=profile,stats,chart_data,institution_stats,recent_activity
+    """
+    permission_classes = [IsAdmin]
+    home_sections = {
+        'profile': profile_section,
+        'stats': home_section(AdminDashboardViewSet, 'stats'),
+        'chart_data': home_section(AdminDashboardViewSet, 'chart_data'),
+        'institution_stats': home_section(AdminDashboardViewSet, 'institution_stats'),
+        'recent_activity': home_section(AdminDashboardViewSet, 'recent_activity'),
+    }
@@ -0,0 +1,137 @@
+"""
+Async (ASGI) versions of the dashboard and stats endpoints
+
+The sync DRF views run their independent aggregate queries one after
+another, so latency is the sum of every query. These views issue the same
+queries (shared with the sync views, so the numbers cannot drift)
+concurrently via api.async_db, making latency roughly the slowest query.
+They return the same payloads and answer anything but GET with 405. They
+are opt-in (the frontend calls the sync views) and meant to be served
+through core/asgi.py, with requirements-asgi.txt installed:
+
+    gunicorn core.asgi:application -k uvicorn.workers.UvicornWorker
+
+Endpoints:
+    - GET /api/async/admin/dashboard/stats/
+    - GET /api/async/admin/dashboard/institution_stats/
+    - GET /api/async/student/logs/stats/
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseNotAllowed, JsonResponse
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from api.async_db import gather_queries
+from api.authentication import MeteredJWTAuthentication
+from api.models import Institutions, LogEntries, Profiles
+from api.sharding import all_shards, merge_counts, on_shard, shard_for_institution
+from api.views.admin import dashboard_stat_queries, dashboard_stats_payload, institution_stat_queries
+from api.views.student import student_stat_queries
+
+
+_authenticator = MeteredJWTAuthentication()
+
+
+def async_require_GET(view):
+    """require_GET for async views (Django 4.2's decorator only wraps sync ones)"""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return HttpResponseNotAllowed(['GET'])
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def _on_shard(alias, query):
+    """Bind a query callable to a shard"""
+    def run():
+        with on_shard(alias):
+            return query()
+    return run
+
+
+def _success(data, message="Success"):
+    return JsonResponse({'success': True, 'message': message, 'data': data})
+
+
+async def _require_role(request, role, message):
+    """
+    Authenticate the bearer token and check the profile role
+
+    Returns:
+        (profile, None) when allowed, otherwise (None, error response)
+        shaped like DRF's 401/403 responses
+    """
+    try:
+        result = await sync_to_async(_authenticator.authenticate)(request)
+    except (InvalidToken, AuthenticationFailed) as e:
+        detail = e.detail if isinstance(e.detail, dict) else {'detail': e.detail}
+        return None, JsonResponse(detail, status=401)
+    if result is None:
+        return None, JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    user, _ = result
+    profile = await Profiles.objects.filter(email=user.email).afirst()
+    if profile is None or profile.role != role:
+        return None, JsonResponse({'detail': message}, status=403)
+    return profile, None
+
+
+@async_require_GET
+async def admin_dashboard_stats(request):
+    """Async AdminDashboardViewSet.stats: every count on every shard at once"""
+    _, error = await _require_role(request, 'admin', "Only administrators can access this resource.")
+    if error:
+        return error
+
+    queries = {}
+    for alias in all_shards():
+        for name, query in dashboard_stat_queries().items():
+            queries[(alias, name)] = _on_shard(alias, query)
+    results = await gather_queries(queries)
+
+    per_shard = {}
+    for (alias, name), value in results.items():
+        per_shard.setdefault(alias, {})[name] = value
+    totals = merge_counts(per_shard.values())
+    return _success(dashboard_stats_payload(totals))
+
+
+@async_require_GET
+async def admin_institution_stats(request):
+    """Async AdminDashboardViewSet.institution_stats"""
+    _, error = await _require_role(request, 'admin', "Only administrators can access this resource.")
+    if error:
+        return error
+
+    insts = [inst async for inst in Institutions.objects.all()]
+    # The shard map may need a directory query on a cache miss
+    aliases = await sync_to_async(
+        lambda: {inst.id: shard_for_institution(inst.id) for inst in insts}
+    )()
+    queries = {}
+    for inst in insts:
+        for name, query in institution_stat_queries(inst).items():
+            queries[(inst.id, name)] = _on_shard(aliases[inst.id], query)
+    results = await gather_queries(queries)
+
+    data = []
+    for inst in insts:
+        row = {'id': str(inst.id), 'name': inst.name}
+        for name in institution_stat_queries(inst):
+            row[name] = results[(inst.id, name)]
+        data.append(row)
+    return _success(data)
+
+
+@async_require_GET
+async def student_log_stats(request):
+    """Async StudentLogViewSet.stats"""
+    profile, error = await _require_role(request, 'student', "Only students can access this resource.")
+    if error:
+        return error
+
+    queryset = LogEntries.objects.filter(student=profile)
+    stats_data = await gather_queries(student_stat_queries(queryset))
+    return _success(stats_data, message="Statistics retrieved successfully")
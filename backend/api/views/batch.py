@@ -0,0 +1,137 @@
+"""
+Batch request multiplexer for read-only API calls
+
+    POST /api/batch/
+    {"requests": ["admin/dashboard/<id>/fhir/", "/api/student/logs/stats/"]}
+
+Each path is resolved with the URL resolver and its view is called
+in-process as a GET. Every call reuses the batch request's authenticated
+user (no JWT decoding) and profile, and skips the middleware stack the
+batch request already went through. Responses come back in request order:
+
+    {"responses": [{"path": ..., "status": 200, "body": {...}}, ...]}
+
+Bounds: at most ``BATCH_MAX_REQUESTS`` paths. Once the batch has run
+``BATCH_MAX_QUERIES`` queries or ``BATCH_MAX_SECONDS`` seconds, the
+remaining paths are answered with 429 instead of being run.
+"""
+import asyncio
+import json
+import logging
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from api.prepared import request_profile
+
+
+logger = logging.getLogger('api.batch')
+
+API_PREFIX = '/api/'
+
+# Request headers the sub-requests must not inherit from the POST
+BODY_META_KEYS = (
+    'CONTENT_LENGTH', 'CONTENT_TYPE', 'HTTP_CONTENT_LENGTH', 'HTTP_CONTENT_TYPE',
+    'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE', 'HTTP_IDEMPOTENCY_KEY',
+)
+
+
+def _error(path, status_code, message):
+    return {'path': path, 'status': status_code, 'body': {'detail': message}}
+
+
+class BatchView(APIView):
+    """
+    Run several read-only API calls in one request
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    # The sub-requests' queries are counted against the batch
+    query_budget = getattr(settings, 'BATCH_MAX_QUERIES', 200)
+
+    def post(self, request):
+        paths = request.data.get('requests') if isinstance(request.data, dict) else None
+        if not isinstance(paths, list) or not all(isinstance(path, str) for path in paths):
+            return Response(
+                {'detail': 'Expected {"requests": [<path>, ...]}'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        max_requests = getattr(settings, 'BATCH_MAX_REQUESTS', 20)
+        if len(paths) > max_requests:
+            return Response(
+                {'detail': f'At most {max_requests} requests per batch'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Looked up once and handed to every sub-request
+        profile = request_profile(request)
+        stats = getattr(request, 'query_stats', None)
+        queries_before = stats.count if stats else 0
+        max_queries = getattr(settings, 'BATCH_MAX_QUERIES', 200)
+        deadline = time.monotonic() + getattr(settings, 'BATCH_MAX_SECONDS', 5.0)
+
+        responses = []
+        for path in paths:
+            spent = stats.count - queries_before if stats else 0
+            if spent >= max_queries or time.monotonic() >= deadline:
+                responses.append(_error(path, 429, 'Batch cost budget exhausted'))
+                continue
+            responses.append(self._dispatch(request, profile, path))
+        return Response({'responses': responses})
+
+    def _dispatch(self, request, profile, path):
+        parts = urlsplit(path)
+        target = parts.path if parts.path.startswith('/') else API_PREFIX + parts.path
+        if parts.scheme or parts.netloc or not target.startswith(API_PREFIX):
+            return _error(path, 400, 'Only relative /api/ paths can be batched')
+
+        try:
+            match = resolve(target)
+        except Resolver404:
+            return _error(path, 404, 'Not found')
+        if getattr(match.func, 'view_class', None) is BatchView:
+            return _error(path, 400, 'Batches cannot be nested')
+        if asyncio.iscoroutinefunction(match.func):
+            return _error(path, 400, 'Async endpoints cannot be batched')
+
+        sub = HttpRequest()
+        sub.method = 'GET'
+        sub.path = sub.path_info = target
+        sub.META = {key: value for key, value in request.META.items() if key not in BODY_META_KEYS}
+        sub.META.update({
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': target,
+            'QUERY_STRING': parts.query,
+            'HTTP_ACCEPT': 'application/json',
+        })
+        sub.GET = QueryDict(parts.query)
+        sub.COOKIES = request.COOKIES
+        sub.resolver_match = match
+        sub.user = request.user
+        # DRF authenticates these with ForcedAuthentication instead of the JWT
+        sub._force_auth_user = request.user
+        sub._force_auth_token = request.auth
+        sub._user_profile = profile
+        sub.query_stats = getattr(request, 'query_stats', None)
+
+        try:
+            response = match.func(sub, *match.args, **match.kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+        except Exception:
+            # Logged with the traceback; the client only gets a generic body
+            logger.exception('Batched request to %s failed', target)
+            return _error(path, 500, 'Internal server error')
+
+        if not response.get('Content-Type', '').startswith('application/json'):
+            return _error(path, 406, 'Only JSON endpoints can be batched')
+        return {
+            'path': path,
+            'status': response.status_code,
+            'body': json.loads(response.content) if response.content else None,
+        }
@@ -6,15 +6,36 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 
 from api.models import LogEntries, Profiles, StudentPreceptorAssignments
-from api.serializers import LogEntrySerializer, ProfileSerializer
+from api.serializers import LOG_ENTRY_SUMMARY_FIELDS, LogEntrySerializer, ProfileSerializer
 from api.permissions import IsInstructor, IsAssignedInstructor
-from api.mixins import UserProfileMixin, FilterByUserMixin, ResponseMixin
+from api.mixins import (
+    UserProfileMixin, FilterByUserMixin, ResponseMixin, LogSearchMixin,
+    CompiledListMixin, SparseFieldsetMixin, HomeMixin, home_section, profile_section
+)
 from api.exceptions import ProfileNotFoundError, ValidationError
 from api.constants import Messages, LogStatus, AssignmentStatus
 from api.utils import log_audit, send_notification_email
+from api.coverage import coverage_matrix
+from api.cube import entry_fact, record_entry_change
+from api.prepared import assigned_student_ids, pending_reviews
+from api.sync import entries_version
+from api.conditional import conditional
+from api.metrics import LOG_ENTRIES
+from api.tracing import span
 
 
-class InstructorReviewViewSet(FilterByUserMixin, ResponseMixin, viewsets.ModelViewSet):
+def reviews_version(view, request, *args, **kwargs):
+    """Version of the assigned students' entries and names for conditional GETs"""
+    profile = view.get_user_profile()
+    if not profile:
+        return None
+    student_ids = sorted(map(str, assigned_student_ids(profile)))
+    parts, last_modified = entries_version(student_ids)
+    names = Profiles.objects.filter(id__in=student_ids).order_by('id').values_list('id', 'full_name')
+    return (*parts, *(f'{student_id}={name}' for student_id, name in names)), last_modified
+
+
+class InstructorReviewViewSet(SparseFieldsetMixin, FilterByUserMixin, LogSearchMixin, ResponseMixin, CompiledListMixin, viewsets.ModelViewSet):
     """
     ViewSet for instructors to review student log entries
     
@@ -24,21 +45,28 @@ class InstructorReviewViewSet(FilterByUserMixin, ResponseMixin, viewsets.ModelVi
         - POST /api/instructor/reviews/{id}/approve/ - Approve log
         - POST /api/instructor/reviews/{id}/reject/ - Reject log
         - GET /api/instructor/reviews/pending/ - Get pending reviews
+        - GET /api/instructor/reviews/search/?q= - Full-text search assigned students' logs
     """
     serializer_class = LogEntrySerializer
     permission_classes = [IsInstructor]
     queryset = LogEntries.objects.all()
+    projections = {'summary': LOG_ENTRY_SUMMARY_FIELDS}
+    sparse_actions = ('list', 'retrieve', 'pending')
 
     def filter_queryset_by_profile(self, queryset, profile):
         """Filter logs to show only assigned students' entries"""
         # Get all students assigned to this instructor
-        assignments = StudentPreceptorAssignments.objects.filter(
-            preceptor=profile,
-            status=AssignmentStatus.ACTIVE
-        )
-        student_ids = assignments.values_list('student_id', flat=True)
+        student_ids = assigned_student_ids(profile)
         return queryset.filter(student_id__in=student_ids).order_by('-submitted_at')
 
+    @conditional(reviews_version)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional(reviews_version)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     def get_permissions(self):
         """Add object-level permission for approve/reject actions"""
         if self.action in ['approve', 'reject']:
@@ -57,9 +85,13 @@ class InstructorReviewViewSet(FilterByUserMixin, ResponseMixin, viewsets.ModelVi
         feedback = request.data.get('feedback', '')
         
         # Update log entry
+        before = entry_fact(log_entry)
         log_entry.status = LogStatus.APPROVED
         log_entry.feedback = feedback
-        log_entry.save()
+        with span('log_entry.save'):
+            log_entry.save()
+        record_entry_change(before, entry_fact(log_entry))
+        LOG_ENTRIES.labels('approved').inc()
         
         # Log the action
         profile = self.get_user_profile()
@@ -78,8 +110,10 @@ class InstructorReviewViewSet(FilterByUserMixin, ResponseMixin, viewsets.ModelVi
             message=f'Your log entry for {log_entry.date} has been approved.\\n\\nFeedback: {feedback}'
         )
         
+        with span('serialize'):
+            data = self.get_serializer(log_entry).data
         return self.success_response(
-            data=self.get_serializer(log_entry).data,
+            data=data,
             message=Messages.LOG_APPROVED
         )
 
@@ -98,9 +132,13 @@ class InstructorReviewViewSet(FilterByUserMixin, ResponseMixin, viewsets.ModelVi
             raise ValidationError("Feedback is required when rejecting a log entry")
         
         # Update log entry
+        before = entry_fact(log_entry)
         log_entry.status = LogStatus.REJECTED
         log_entry.feedback = feedback
-        log_entry.save()
+        with span('log_entry.save'):
+            log_entry.save()
+        record_entry_change(before, entry_fact(log_entry))
+        LOG_ENTRIES.labels('rejected').inc()
         
         # Log the action
         profile = self.get_user_profile()
@@ -119,30 +157,38 @@ class InstructorReviewViewSet(FilterByUserMixin, ResponseMixin, viewsets.ModelVi
             message=f'Your log entry for {log_entry.date} needs revision.\\n\\nFeedback: {feedback}'
         )
         
+        with span('serialize'):
+            data = self.get_serializer(log_entry).data
         return self.success_response(
-            data=self.get_serializer(log_entry).data,
+            data=data,
             message=Messages.LOG_REJECTED
         )
 
     @action(detail=False, methods=['get'])
     def pending(self, request):
         """Get all pending log entries for review"""
-        queryset = self.get_queryset().filter(status=LogStatus.PENDING)
-        serializer = self.get_serializer(queryset, many=True)
+        compiled = self.compiled_serializer()
+        if self.sparse_fields() is not None:
+            # The prepared statement reads every column; select just these
+            entries = list(self.get_queryset().filter(status=LogStatus.PENDING).values(*compiled.columns))
+        else:
+            profile = self.get_user_profile()
+            entries = pending_reviews(profile) if profile else []
         
         return self.success_response(
-            data=serializer.data,
-            message=f"Found {queryset.count()} pending entries"
+            data=compiled.many(entries),
+            message=f"Found {len(entries)} pending entries"
         )
 
 
-class InstructorStudentViewSet(FilterByUserMixin, ResponseMixin, viewsets.ReadOnlyModelViewSet):
+class InstructorStudentViewSet(SparseFieldsetMixin, FilterByUserMixin, ResponseMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for instructors to view their assigned students
     
     Endpoints:
         - GET /api/instructor/students/ - List assigned students
         - GET /api/instructor/students/{id}/ - Get specific student
+        - GET /api/instructor/students/{id}/coverage/ - Student's activity coverage
     """
     serializer_class = ProfileSerializer
     permission_classes = [IsInstructor]
@@ -150,9 +196,33 @@ class InstructorStudentViewSet(FilterByUserMixin, ResponseMixin, viewsets.ReadOn
 
     def filter_queryset_by_profile(self, queryset, profile):
         """Filter to show only assigned students"""
-        assignments = StudentPreceptorAssignments.objects.filter(
-            preceptor=profile,
-            status=AssignmentStatus.ACTIVE
+        return queryset.filter(id__in=assigned_student_ids(profile))
+
+    @action(detail=True, methods=['get'])
+    def coverage(self, request, pk=None):
+        """
+        Get an assigned student's clinical activity coverage matrix
+
+        Query params:
+            - status: Only count entries with this status (e.g. approved)
+        """
+        student = self.get_object()
+        return self.success_response(
+            data=coverage_matrix(student, status=request.query_params.get('status'))
         )
-        student_ids = assignments.values_list('student_id', flat=True)
-        return queryset.filter(id__in=student_ids)
+
+
+class InstructorHomeViewSet(HomeMixin, ResponseMixin, viewsets.ViewSet):
+    """
+    Everything the instructor dashboard loads on login, in one request
+
+    Endpoints:
+        - GET /api/instructor/home/?include=profile,reviews,pending,students
+    """
+    permission_classes = [IsInstructor]
+    home_sections = {
+        'profile': profile_section,
+        'reviews': home_section(InstructorReviewViewSet, 'list'),
+        'pending': home_section(InstructorReviewViewSet, 'pending'),
+        'students': home_section(InstructorStudentViewSet, 'list'),
+    }
@@ -0,0 +1,31 @@
+"""
+Prometheus scrape endpoint (see api/metrics.py)
+
+Denied unless the scrape sends ``Authorization: Bearer <METRICS_TOKEN>``
+or comes from an address in METRICS_ALLOWED_NETWORKS (the peer address,
+so list the scraper itself, not a proxy in front of the app). With
+neither configured the endpoint is closed.
+"""
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse
+
+from api.metrics import exposition
+from api.utils import remote_address_in
+
+
+def _token_ok(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        return False
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    return hmac.compare_digest(supplied.encode(), token.encode())
+
+
+def metrics(request):
+    allowed_networks = getattr(settings, 'METRICS_ALLOWED_NETWORKS', [])
+    if not (_token_ok(request) or remote_address_in(request, allowed_networks)):
+        return HttpResponse(status=401 if getattr(settings, 'METRICS_TOKEN', '') else 403)
+    body, content_type = exposition()
+    return HttpResponse(body, content_type=content_type)
@@ -7,10 +7,10 @@ from rest_framework.response import Response
 from api.models import Profiles
 from api.serializers import ProfileSerializer
 from api.permissions import IsAdmin
-from api.mixins import ResponseMixin
+from api.mixins import ResponseMixin, SparseFieldsetMixin
 
 
-class ProfileViewSet(ResponseMixin, viewsets.ReadOnlyModelViewSet):
+class ProfileViewSet(SparseFieldsetMixin, ResponseMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for viewing user profiles (actual registered users)
     
@@ -23,7 +23,7 @@ class ProfileViewSet(ResponseMixin, viewsets.ReadOnlyModelViewSet):
 
     def get_queryset(self):
         """Filter profiles by role if specified"""
-        queryset = self.queryset
+        queryset = super().get_queryset()
         role = self.request.query_params.get('role')
         if role:
             queryset = queryset.filter(role=role)
@@ -1,20 +1,51 @@
 """
 Student-specific views with enterprise-level structure
 """
+from django.conf import settings
+from django.db import IntegrityError, router, transaction
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
 from api.models import LogEntries, Patients, StudentPatientAssignments
-from api.serializers import LogEntrySerializer, PatientSerializer
+from api.serializers import LOG_ENTRY_SUMMARY_FIELDS, LogEntrySerializer, PatientSerializer
 from api.permissions import IsStudent
-from api.mixins import UserProfileMixin, FilterByUserMixin, ResponseMixin
-from api.exceptions import ProfileNotFoundError
+from api.mixins import (
+    UserProfileMixin, FilterByUserMixin, ResponseMixin, LogSearchMixin,
+    CompiledListMixin, SparseFieldsetMixin, HomeMixin, home_section, profile_section
+)
+from api.exceptions import ProfileNotFoundError, ValidationError
 from api.constants import Messages, LogStatus
 from api.utils import calculate_total_hours, log_audit
+from api.coverage import coverage_matrix, tag_entry_safely
+from api.cube import entry_fact, record_entry_change
+from api.prepared import student_logs
+from api.sync import changes_since, entries_version
+from api.conditional import conditional
+from api.metrics import LOG_ENTRIES
 
 
-class StudentLogViewSet(FilterByUserMixin, ResponseMixin, viewsets.ModelViewSet):
+def student_stat_queries(queryset):
+    """Independent aggregate queries behind a student's logbook statistics"""
+    return {
+        'total_entries': queryset.count,
+        'total_hours': lambda: calculate_total_hours(queryset),
+        'pending_count': queryset.filter(status=LogStatus.PENDING).count,
+        'approved_count': queryset.filter(status=LogStatus.APPROVED).count,
+        'rejected_count': queryset.filter(status=LogStatus.REJECTED).count,
+    }
+
+
+def student_logs_version(view, request, *args, **kwargs):
+    """Version of the student's entries (and their name on them) for conditional GETs"""
+    profile = view.get_user_profile()
+    if not profile:
+        return None
+    parts, last_modified = entries_version([profile.id])
+    return (*parts, profile.full_name), last_modified
+
+
+class StudentLogViewSet(SparseFieldsetMixin, FilterByUserMixin, LogSearchMixin, ResponseMixin, CompiledListMixin, viewsets.ModelViewSet):
     """
     ViewSet for students to manage their clinical log entries
     
@@ -25,22 +56,41 @@ class StudentLogViewSet(FilterByUserMixin, ResponseMixin, viewsets.ModelViewSet)
         - PUT /api/student/logs/{id}/ - Update log
         - DELETE /api/student/logs/{id}/ - Delete log
         - GET /api/student/logs/stats/ - Get statistics
+        - GET /api/student/logs/search/?q= - Full-text search own logs
+        - GET /api/student/logs/coverage/ - Clinical activity coverage matrix
+        - GET/POST /api/student/logs/sync/ - Delta sync and offline upload
     """
     serializer_class = LogEntrySerializer
     permission_classes = [IsStudent]
     queryset = LogEntries.objects.all()
+    projections = {'summary': LOG_ENTRY_SUMMARY_FIELDS}
+    sparse_actions = ('list', 'retrieve', 'pending')
 
     def filter_queryset_by_profile(self, queryset, profile):
         """Filter logs to show only student's own entries"""
         return queryset.filter(student=profile).order_by('-date')
 
-    def create(self, request, *args, **kwargs):
-        profile = self.get_user_profile()
-        if not profile:
-            raise ProfileNotFoundError()
+    @conditional(student_logs_version)
+    def list(self, request, *args, **kwargs):
+        """List the student's own entries, most recent first"""
+        compiled = self.compiled_serializer()
+        if self.sparse_fields() is not None:
+            # The prepared statement reads every column; select just these
+            entries = self.filter_queryset(self.get_queryset()).values(*compiled.columns)
+        else:
+            profile = self.get_user_profile()
+            entries = student_logs(profile) if profile else []
+        return Response(compiled.many(entries))
 
-        data = request.data.copy()
-        
+    @conditional(student_logs_version)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def entry_data(self, profile, data):
+        """
+        Request data for a new entry: default hours and resolve the
+        patient reference, creating the patient on the fly
+        """
         # Default hours if missing (requested to remove from UI)
         if 'hours' not in data or not data['hours']:
             data['hours'] = 0
@@ -67,6 +117,14 @@ class StudentLogViewSet(FilterByUserMixin, ResponseMixin, viewsets.ModelViewSet)
                 }
             )
             data['patient'] = str(patient.id)
+        return data
+
+    def create(self, request, *args, **kwargs):
+        profile = self.get_user_profile()
+        if not profile:
+            raise ProfileNotFoundError()
+
+        data = self.entry_data(profile, request.data.copy())
 
         serializer = self.get_serializer(data=data)
         if not serializer.is_valid():
@@ -85,7 +143,11 @@ class StudentLogViewSet(FilterByUserMixin, ResponseMixin, viewsets.ModelViewSet)
             student=profile,
             status=LogStatus.PENDING
         )
+        LOG_ENTRIES.labels('created').inc()
         
+        # Match free-text activities against the institution's catalog
+        tag_entry_safely(instance)
+
         # Log the action
         # log_audit(
         #     actor_id=profile.id,
@@ -101,10 +163,19 @@ class StudentLogViewSet(FilterByUserMixin, ResponseMixin, viewsets.ModelViewSet)
         - Reset status to PENDING (so instructor sees it again)
         - Unlock the entry (if it was locked/approved/rejected)
         """
+        before = entry_fact(serializer.instance)
         instance = serializer.save(
             status=LogStatus.PENDING,
             is_locked=False
         )
+        record_entry_change(before, entry_fact(instance))
+        tag_entry_safely(instance)
+
+    def perform_destroy(self, instance):
+        """Delete log entry and drop it from the dashboard cube"""
+        before = entry_fact(instance)
+        instance.delete()
+        record_entry_change(before, None)
 
     @action(detail=False, methods=['get'])
     def preceptor(self, request):
@@ -189,11 +260,7 @@ class StudentLogViewSet(FilterByUserMixin, ResponseMixin, viewsets.ModelViewSet)
         queryset = self.get_queryset()
         
         stats_data = {
-            'total_entries': queryset.count(),
-            'total_hours': calculate_total_hours(queryset),
-            'pending_count': queryset.filter(status=LogStatus.PENDING).count(),
-            'approved_count': queryset.filter(status=LogStatus.APPROVED).count(),
-            'rejected_count': queryset.filter(status=LogStatus.REJECTED).count(),
+            name: query() for name, query in student_stat_queries(queryset).items()
         }
         
         return self.success_response(
@@ -201,6 +268,95 @@ class StudentLogViewSet(FilterByUserMixin, ResponseMixin, viewsets.ModelViewSet)
             message="Statistics retrieved successfully"
         )
 
+    @action(detail=False, methods=['get'])
+    def coverage(self, request):
+        """
+        Get the student's clinical activity coverage matrix
+
+        Query params:
+            - status: Only count entries with this status (e.g. approved)
+        """
+        profile = self.get_user_profile()
+        if not profile:
+            raise ProfileNotFoundError()
+
+        return self.success_response(
+            data=coverage_matrix(profile, status=request.query_params.get('status'))
+        )
+
+    @action(detail=False, methods=['get', 'post'])
+    def sync(self, request):
+        """
+        Delta sync for offline clients
+
+        GET ?token=<token from the last sync> - entries created or changed
+        and ids deleted since then (everything, with reset=true, if no or
+        a stale token is given). Call again while has_more is true.
+
+        POST {"entries": [{..., "idempotency_key": "<client uuid>"}]} -
+        create entries queued offline. Re-sending a key returns the entry
+        it already created instead of a duplicate.
+        """
+        profile = self.get_user_profile()
+        if not profile:
+            raise ProfileNotFoundError()
+
+        if request.method == 'POST':
+            return self.sync_upload(request, profile)
+
+        page = changes_since(
+            profile,
+            token=request.query_params.get('token') or None,
+            limit=getattr(settings, 'SYNC_PAGE_SIZE', 500),
+        )
+        return self.success_response({
+            'entries': self.get_serializer(page.entries, many=True).data,
+            'deleted': page.deleted,
+            'token': page.token,
+            'has_more': page.has_more,
+            'reset': page.reset,
+        })
+
+    def sync_upload(self, request, profile):
+        entries = request.data.get('entries') if isinstance(request.data, dict) else None
+        if not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+            raise ValidationError('Expected {"entries": [<entry>, ...]}')
+        max_entries = getattr(settings, 'SYNC_UPLOAD_MAX', 100)
+        if len(entries) > max_entries:
+            raise ValidationError(f"At most {max_entries} entries per upload")
+
+        db = router.db_for_write(LogEntries)
+        results = []
+        for entry in entries:
+            key = entry.get('idempotency_key')
+            if not key:
+                results.append({'status': 'invalid', 'errors': {'idempotency_key': ['This field is required.']}})
+                continue
+
+            existing = LogEntries.objects.filter(student=profile, idempotency_key=key).first()
+            if existing is None:
+                serializer = self.get_serializer(data=self.entry_data(profile, dict(entry)))
+                if not serializer.is_valid():
+                    results.append({'idempotency_key': key, 'status': 'invalid', 'errors': serializer.errors})
+                    continue
+                try:
+                    with transaction.atomic(using=db):
+                        self.perform_create(serializer)
+                    results.append({'idempotency_key': key, 'status': 'created', 'entry': serializer.data})
+                    continue
+                except IntegrityError:
+                    # A concurrent upload of the same key won the unique index
+                    existing = LogEntries.objects.filter(student=profile, idempotency_key=key).first()
+                    if existing is None:
+                        raise
+            results.append({
+                'idempotency_key': key,
+                'status': 'duplicate',
+                'entry': self.get_serializer(existing).data,
+            })
+
+        return self.success_response({'results': results})
+
     @action(detail=False, methods=['get'])
     def pending(self, request):
         """Get all pending log entries"""
@@ -209,7 +365,7 @@ class StudentLogViewSet(FilterByUserMixin, ResponseMixin, viewsets.ModelViewSet)
         return self.success_response(data=serializer.data)
 
 
-class StudentPatientViewSet(FilterByUserMixin, ResponseMixin, viewsets.ReadOnlyModelViewSet):
+class StudentPatientViewSet(SparseFieldsetMixin, FilterByUserMixin, ResponseMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for students to view their assigned patients
     
@@ -226,3 +382,20 @@ class StudentPatientViewSet(FilterByUserMixin, ResponseMixin, viewsets.ReadOnlyM
         assignments = StudentPatientAssignments.objects.filter(student=profile)
         patient_ids = assignments.values_list('patient_id', flat=True)
         return queryset.filter(id__in=patient_ids)
+
+
+class StudentHomeViewSet(HomeMixin, ResponseMixin, viewsets.ViewSet):
+    """
+    Everything the student dashboard loads on login, in one request
+
+    Endpoints:
+        - GET /api/student/home/?include=profile,logs,stats,preceptor,instructors
+    """
+    permission_classes = [IsStudent]
+    home_sections = {
+        'profile': profile_section,
+        'logs': home_section(StudentLogViewSet, 'list'),
+        'stats': home_section(StudentLogViewSet, 'stats'),
+        'preceptor': home_section(StudentLogViewSet, 'preceptor'),
+        'instructors': home_section(StudentLogViewSet, 'instructors'),
+    }
@@ -0,0 +1,29 @@
+import os
+import argparse
+import django
+
+# Setup Django Environment
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+django.setup()
+
+from api.coverage import backfill
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tag historical log entries with clinical activities")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Entries per worker chunk")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel worker threads")
+    parser.add_argument("--institution", help="Only backfill entries from this institution UUID")
+    args = parser.parse_args()
+
+    print(" Backfilling activity tags...")
+    tagged = backfill(
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        institution_id=args.institution,
+    )
+    print(f"Backfill Complete. Tagged {tagged} log entries.")
+
+
+if __name__ == "__main__":
+    main()
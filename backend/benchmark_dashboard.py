@@ -0,0 +1,84 @@
+import os
+import argparse
+import asyncio
+import statistics
+import time
+import django
+
+# Setup Django Environment
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+django.setup()
+
+from django.contrib.auth.models import User
+from django.test import AsyncClient, Client
+from django.test.utils import setup_test_environment
+from rest_framework_simplejwt.tokens import AccessToken
+
+
+# name -> (sync DRF path, async ASGI path)
+ENDPOINTS = {
+    "admin-stats": ("/api/admin/dashboard/stats/", "/api/async/admin/dashboard/stats/"),
+    "institution-stats": (
+        "/api/admin/dashboard/institution_stats/",
+        "/api/async/admin/dashboard/institution_stats/",
+    ),
+    "student-stats": ("/api/student/logs/stats/", "/api/async/student/logs/stats/"),
+}
+
+
+def summarize(label, samples):
+    p50 = statistics.median(samples)
+    p95 = statistics.quantiles(samples, n=20)[18] if len(samples) > 1 else p50
+    print(f"   {label:<6} p50 {p50:8.2f} ms   p95 {p95:8.2f} ms   ({len(samples)} requests)")
+
+
+def bench_sync(path, headers, requests, warmup):
+    client = Client()
+    samples = []
+    for i in range(warmup + requests):
+        start = time.perf_counter()
+        response = client.get(path, headers=headers)
+        elapsed = (time.perf_counter() - start) * 1000
+        if response.status_code != 200:
+            raise SystemExit(f"{path} returned {response.status_code}: {response.content[:200]}")
+        if i >= warmup:
+            samples.append(elapsed)
+    return samples
+
+
+async def bench_async(path, headers, requests, warmup):
+    client = AsyncClient()
+    samples = []
+    for i in range(warmup + requests):
+        start = time.perf_counter()
+        response = await client.get(path, headers=headers)
+        elapsed = (time.perf_counter() - start) * 1000
+        if response.status_code != 200:
+            raise SystemExit(f"{path} returned {response.status_code}: {response.content[:200]}")
+        if i >= warmup:
+            samples.append(elapsed)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare sync (WSGI) and async (ASGI) dashboard stats latency")
+    parser.add_argument("email", help="Email of the user to authenticate as (admin or student, to match --endpoint)")
+    parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="admin-stats")
+    parser.add_argument("--requests", type=int, default=100, help="Measured requests per implementation")
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured requests first")
+    args = parser.parse_args()
+
+    # Lets the test clients' 'testserver' host through ALLOWED_HOSTS
+    setup_test_environment()
+
+    user = User.objects.get(email=args.email)
+    headers = {"Authorization": f"Bearer {AccessToken.for_user(user)}"}
+    sync_path, async_path = ENDPOINTS[args.endpoint]
+
+    print(f" Benchmarking {args.endpoint}...")
+    summarize("sync", bench_sync(sync_path, headers, args.requests, args.warmup))
+    summarize("async", asyncio.run(bench_async(async_path, headers, args.requests, args.warmup)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import os
+import argparse
+import datetime
+import io
+import decimal
+import statistics
+import time
+import uuid
+import django
+
+# Setup Django Environment
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+django.setup()
+
+from django.utils import timezone
+from rest_framework import parsers, renderers
+
+from api.models import LogEntries, Profiles
+from api.parsers import JSONParser
+from api.renderers import JSONRenderer
+from api.serializers import LogEntrySerializer
+
+
+REFLECTION = (
+    "Assessed a patient presenting with shortness of breath; took a focused history, "
+    "auscultated bilateral crackles and discussed a possible heart failure exacerbation "
+    "with the preceptor. Reflected on how to explain diuretic changes to the family. "
+)
+
+
+def make_entries(count, reflection_chars):
+    """Unsaved entries shaped like real ones, so no database is needed"""
+    student = Profiles(id=uuid.uuid4(), email="student@example.com", full_name="Aisha Khan",
+                       role="student", created_at=timezone.now())
+    reflection = (REFLECTION * (reflection_chars // len(REFLECTION) + 1))[:reflection_chars]
+    now = timezone.now()
+    return [
+        LogEntries(
+            id=uuid.uuid4(),
+            student=student,
+            date=datetime.date(2026, 1, 1) + datetime.timedelta(days=i % 300),
+            location="St Mary's Hospital - Ward 4B",
+            specialty="Internal Medicine",
+            hours=decimal.Decimal("7.50"),
+            activities="History taking, physical examination, medication review",
+            learning_objectives="Recognise decompensated heart failure",
+            reflection=reflection,
+            supervisor_name="Dr. Ortega",
+            status="pending",
+            submitted_at=now - datetime.timedelta(hours=i),
+            is_locked=False,
+            patients_seen=3,
+            change_seq=i,
+            updated_at=now,
+        )
+        for i in range(count)
+    ]
+
+
+def summarize(label, samples, baseline=None):
+    p50 = statistics.median(samples)
+    speedup = f"   {baseline / p50:5.1f}x" if baseline else ""
+    print(f"   {label:<16} p50 {p50:8.3f} ms{speedup}")
+    return p50
+
+
+def bench(func, repeat, warmup):
+    samples = []
+    for i in range(warmup + repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000
+        if i >= warmup:
+            samples.append(elapsed)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare DRF's stdlib JSON rendering/parsing with the orjson renderer and parser")
+    parser.add_argument("--entries", type=int, default=500, help="Log entries per payload")
+    parser.add_argument("--reflection", type=int, default=2000, help="Characters of reflection text per entry")
+    parser.add_argument("--repeat", type=int, default=50, help="Measured runs per implementation")
+    parser.add_argument("--warmup", type=int, default=3, help="Unmeasured runs first")
+    args = parser.parse_args()
+
+    data = LogEntrySerializer(make_entries(args.entries, args.reflection), many=True).data
+    stdlib_renderer, orjson_renderer = renderers.JSONRenderer(), JSONRenderer()
+    body = stdlib_renderer.render(data)
+    if orjson_renderer.render(data) != body:
+        raise SystemExit("orjson and stdlib renderers disagree on this payload")
+
+    print(f" {args.entries} entries, {len(body) / 1024:.0f} KiB of JSON")
+    print(" Render:")
+    baseline = summarize("stdlib", bench(lambda: stdlib_renderer.render(data), args.repeat, args.warmup))
+    summarize("orjson", bench(lambda: orjson_renderer.render(data), args.repeat, args.warmup), baseline)
+
+    print(" Parse:")
+    stdlib_parser, orjson_parser = parsers.JSONParser(), JSONParser()
+    baseline = summarize("stdlib", bench(lambda: stdlib_parser.parse(io.BytesIO(body)), args.repeat, args.warmup))
+    summarize("orjson", bench(lambda: orjson_parser.parse(io.BytesIO(body)), args.repeat, args.warmup), baseline)
+
+
+if __name__ == "__main__":
+    main()
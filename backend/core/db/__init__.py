@@ -0,0 +1,3 @@
+"""
+Pooled PostgreSQL database backend (ENGINE = 'core.db')
+"""
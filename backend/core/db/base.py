@@ -0,0 +1,247 @@
+"""
+PostgreSQL backend backed by a process-wide connection pool
+
+Django's persistent connections (``CONN_MAX_AGE``) give every thread its
+own connection, which sits idle between that thread's requests and is
+pinged on reuse when ``conn_health_checks`` is on. With this backend,
+Django checks a connection out of a shared pool whenever it opens one and
+hands it back whenever it closes one (at the end of each request, so run
+it with ``CONN_MAX_AGE = 0``). A gunicorn worker's threads then share
+``max_size`` connections.
+
+Configured through ``OPTIONS['pool']``:
+    min_size: Connections opened up front (default 1)
+    max_size: Upper bound on open connections (default 10)
+    timeout: Seconds to wait for a free connection before failing (default 10)
+    max_idle: Connections idle longer than this are checked with a
+        ``SELECT 1`` before reuse; fresher ones are trusted (default 30)
+    max_lifetime: Connections are closed instead of reused after this
+        many seconds (default 1800)
+
+``OPTIONS['prepared_statements']`` enables the server-side prepared
+statements in api/prepared.py. Leave it off behind a transaction-mode
+pooler (pgbouncer, Supabase port 6543), which does not keep sessions.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+from django.db.backends.postgresql import base
+
+
+POOL_DEFAULTS = {
+    'min_size': 1,
+    'max_size': 10,
+    'timeout': 10.0,
+    'max_idle': 30.0,
+    'max_lifetime': 1800.0,
+}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """psycopg2 connection that remembers its age and prepared statements"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created_at = time.monotonic()
+        self.returned_at = self.created_at
+        self.prepared = set()
+
+
+class ConnectionPool:
+    """
+    Thread-safe bounded pool of psycopg2 connections
+
+    Idle connections are reused most-recently-returned first, so the
+    extra connections opened during a burst age out and get closed once
+    traffic drops.
+    """
+
+    def __init__(self, conn_params, min_size, max_size, timeout, max_idle, max_lifetime):
+        self.conn_params = conn_params
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+
+        self.idle = deque()
+        self.size = 0
+        self.condition = threading.Condition()
+
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+        self.opened = 0
+        self.closed = 0
+
+        for _ in range(min_size):
+            self.idle.append(self._connect())
+            self.size += 1
+
+    def _connect(self):
+        connection = psycopg2.connect(connection_factory=PooledConnection, **self.conn_params)
+        # Register dummy loads() to avoid a round trip from psycopg2's
+        # decode to json.dumps() to json.loads(), as Django does
+        psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+        self.opened += 1
+        return connection
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+        self.closed += 1
+
+    def _usable(self, connection):
+        if connection.closed:
+            return False
+        now = time.monotonic()
+        if now - connection.created_at > self.max_lifetime:
+            return False
+        if now - connection.returned_at > self.max_idle:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+            except psycopg2.Error:
+                return False
+        return True
+
+    def getconn(self):
+        """Check a connection out, waiting up to ``timeout`` for one to free up"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+        with self.condition:
+            while True:
+                if self.idle:
+                    connection = self.idle.pop()
+                    break
+                if self.size < self.max_size:
+                    connection = None
+                    self.size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise psycopg2.OperationalError(
+                        f"Connection pool exhausted: all {self.max_size} connections in use for {self.timeout}s"
+                    )
+                waited = True
+                self.condition.wait(remaining)
+
+            self.checkouts += 1
+            if waited:
+                self.waits += 1
+                self.wait_seconds += time.monotonic() - started
+
+        if connection is not None and not self._usable(connection):
+            self._discard(connection)
+            connection = None
+        if connection is None:
+            try:
+                connection = self._connect()
+            except Exception:
+                with self.condition:
+                    self.size -= 1
+                    self.condition.notify()
+                raise
+        return connection
+
+    def putconn(self, connection):
+        """Return a connection, rolling back anything left open on it"""
+        reusable = not connection.closed
+        if reusable and connection.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                connection.rollback()
+            except psycopg2.Error:
+                reusable = False
+        if reusable and time.monotonic() - connection.created_at > self.max_lifetime:
+            reusable = False
+
+        with self.condition:
+            if reusable:
+                connection.returned_at = time.monotonic()
+                self.idle.append(connection)
+            else:
+                self._discard(connection)
+                self.size -= 1
+            self.condition.notify()
+
+    def stats(self):
+        """Utilization snapshot"""
+        with self.condition:
+            idle = len(self.idle)
+            return {
+                'size': self.size,
+                'in_use': self.size - idle,
+                'idle': idle,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'utilization': round((self.size - idle) / self.max_size, 3) if self.max_size else 0.0,
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'wait_seconds': round(self.wait_seconds, 4),
+                'timeouts': self.timeouts,
+                'opened': self.opened,
+                'closed': self.closed,
+            }
+
+
+def get_pool(alias, conn_params, options):
+    """Pool for a database alias in this process (pools are never shared across a fork)"""
+    key = (os.getpid(), alias)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                config = {**POOL_DEFAULTS, **options}
+                pool = _pools[key] = ConnectionPool(conn_params, **config)
+    return pool
+
+
+def pool_stats():
+    """Utilization of this process's pools, by database alias"""
+    pid = os.getpid()
+    return {alias: pool.stats() for (owner, alias), pool in list(_pools.items()) if owner == pid}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    @property
+    def prepared_statements_enabled(self):
+        return bool(self.settings_dict['OPTIONS'].get('prepared_statements'))
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop('pool', None)
+        conn_params.pop('prepared_statements', None)
+        return conn_params
+
+    def get_new_connection(self, conn_params):
+        options = self.settings_dict['OPTIONS']
+        if 'isolation_level' in options:
+            self.isolation_level = base.IsolationLevel(options['isolation_level'])
+        else:
+            self.isolation_level = base.IsolationLevel.READ_COMMITTED
+
+        self.pool = get_pool(self.alias, conn_params, options.get('pool', {}))
+        connection = self.pool.getconn()
+        if 'isolation_level' in options:
+            connection.isolation_level = self.isolation_level
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.putconn(self.connection)
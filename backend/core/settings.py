@@ -11,9 +11,11 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 import dj_database_url
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -61,12 +63,21 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Sync-only: under ASGI everything above it runs in a thread, so keep it near the top
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.TracingMiddleware',
+    'api.middleware.QueryCountMiddleware',
+    'api.middleware.ProfilingMiddleware',
+    'api.middleware.AllocationProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.IdempotencyMiddleware',
+    'api.middleware.ShardRoutingMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -95,14 +106,202 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': dj_database_url.config(
-        default=os.getenv('DATABASE_URL'),
-        conn_max_age=600,
-        conn_health_checks=True,
+# Connection pool
+# DATABASE_POOL=True switches PostgreSQL aliases to the pooled backend in
+# core/db, which shares DATABASE_POOL_MAX_SIZE connections per alias between
+# a worker's threads. Prepared statements (api/prepared.py) need session
+# pooling; set DATABASE_PREPARED_STATEMENTS=False behind pgbouncer or the
+# Supabase transaction pooler.
+DATABASE_POOL = os.getenv('DATABASE_POOL', 'False') == 'True'
+DATABASE_POOL_OPTIONS = {
+    'min_size': int(os.getenv('DATABASE_POOL_MIN_SIZE', '1')),
+    'max_size': int(os.getenv('DATABASE_POOL_MAX_SIZE', '10')),
+    'timeout': float(os.getenv('DATABASE_POOL_TIMEOUT', '10')),
+}
+DATABASE_PREPARED_STATEMENTS = os.getenv('DATABASE_PREPARED_STATEMENTS', 'True') == 'True'
+
+
+def database_config(url):
+    """Settings dict for one database URL, pooled when DATABASE_POOL is on"""
+    config = dj_database_url.parse(
+        url,
+        conn_max_age=0 if DATABASE_POOL else 600,
+        conn_health_checks=not DATABASE_POOL,
     )
+    if DATABASE_POOL and config['ENGINE'] == 'django.db.backends.postgresql':
+        config['ENGINE'] = 'core.db'
+        config['OPTIONS']['pool'] = DATABASE_POOL_OPTIONS
+        config['OPTIONS']['prepared_statements'] = DATABASE_PREPARED_STATEMENTS
+    return config
+
+
+DATABASES = {
+    'default': database_config(os.getenv('DATABASE_URL')) if os.getenv('DATABASE_URL') else {},
 }
 
+# Read replicas
+# Comma-separated connection URLs. Reads made while serving GET requests are
+# routed to them by api.db_routers.ReplicaRouter. Each replica mirrors
+# 'default' under test, and pointing DATABASE_REPLICA_URLS at the same URL as
+# DATABASE_URL gives a working two-alias setup locally.
+DATABASE_REPLICAS = []
+for index, url in enumerate(filter(None, os.getenv('DATABASE_REPLICA_URLS', '').split(',')), start=1):
+    alias = f'replica_{index}'
+    DATABASES[alias] = database_config(url.strip())
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+
+# Institution shards
+# Optional comma-separated name=url pairs, e.g. "eu=postgres://...,us=postgres://...".
+# Each becomes alias shard_<name>. Institutions are placed on a shard by the
+# institution_shards table; unlisted institutions stay on 'default'. See
+# api/sharding.py and move_institution_shard.py.
+DATABASE_SHARDS = []
+for pair in filter(None, os.getenv('DATABASE_SHARD_URLS', '').split(',')):
+    name, _, url = pair.partition('=')
+    alias = f'shard_{name.strip()}'
+    DATABASES[alias] = database_config(url.strip())
+    DATABASE_SHARDS.append(alias)
+
+# `manage.py test` without DATABASE_URL runs on SQLite, with a spare shard
+# and a mirrored replica for the routing tests; the tests opt in to them
+# with override_settings(DATABASE_SHARDS=...) / (DATABASE_REPLICAS=...)
+if sys.argv[1:2] == ['test'] and not os.getenv('DATABASE_URL'):
+    DATABASES = {
+        'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'test.sqlite3'},
+        'shard_test': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'test_shard.sqlite3'},
+        'replica_test': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'test.sqlite3',
+            'TEST': {'MIRROR': 'default'},
+        },
+    }
+
+TEST_RUNNER = 'core.test_runner.ApiTablesTestRunner'
+
+# How long each process trusts its copy of the institution -> shard map
+SHARD_MAP_CACHE_SECONDS = int(os.getenv('SHARD_MAP_CACHE_SECONDS', '30'))
+
+DATABASE_ROUTERS = ['api.db_routers.ShardRouter', 'api.db_routers.ReplicaRouter']
+
+# Worker threads (and so connections per database) async views use to run
+# independent queries concurrently; see api/async_db.py
+ASYNC_DB_WORKERS = int(os.getenv('ASYNC_DB_WORKERS', '8'))
+
+# After a write, the user's reads stay on the primary for this long
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '5'))
+
+
+# Cache
+# Shared Redis cache when REDIS_URL is set (needs the redis package),
+# otherwise a per-process in-memory cache.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'clinlogix',
+        }
+    }
+
+# Activity time series responses are cached per query shape for this long
+TIMESERIES_CACHE_SECONDS = int(os.getenv('TIMESERIES_CACHE_SECONDS', '60'))
+
+# Query budgets (api/querycount.py)
+# Views without their own query_budget get this one. Over-budget requests
+# are logged, or raise QueryBudgetExceeded when enforcing (e.g. in tests).
+DEFAULT_QUERY_BUDGET = int(os.getenv('DEFAULT_QUERY_BUDGET', '50'))
+QUERY_BUDGET_ENFORCE = os.getenv('QUERY_BUDGET_ENFORCE', 'False') == 'True'
+
+# Slow query capture (api/slowqueries.py): statements slower than the
+# threshold are kept in a per-process ring buffer, and a sample of them get
+# an EXPLAIN (ANALYZE, BUFFERS) plan, at most N per minute per process.
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', '200'))
+SLOW_QUERY_BUFFER_SIZE = int(os.getenv('SLOW_QUERY_BUFFER_SIZE', '200'))
+SLOW_QUERY_EXPLAIN_SAMPLE = float(os.getenv('SLOW_QUERY_EXPLAIN_SAMPLE', '1.0'))
+SLOW_QUERY_EXPLAINS_PER_MINUTE = int(os.getenv('SLOW_QUERY_EXPLAINS_PER_MINUTE', '6'))
+
+# Request profiling (api/profiling.py). Admins can profile any request with
+# an X-Profile header; PROFILE_SAMPLE_RATE profiles that fraction of all
+# requests with PROFILE_DEFAULT_MODE ('sample' or 'cprofile').
+PROFILE_DIR = os.getenv('PROFILE_DIR', '')
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_DEFAULT_MODE = os.getenv('PROFILE_DEFAULT_MODE', 'sample')
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', '5'))
+
+# Allocation profiling (api/memprofile.py). tracemalloc is slow and
+# process-wide: enable on a single-threaded worker while investigating.
+MEMORY_PROFILING = os.getenv('MEMORY_PROFILING', 'False') == 'True'
+MEMORY_PROFILING_FRAMES = int(os.getenv('MEMORY_PROFILING_FRAMES', '1'))
+MEMORY_PROFILING_TOP_SITES = int(os.getenv('MEMORY_PROFILING_TOP_SITES', '10'))
+
+# Prometheus metrics (api/metrics.py), scraped from /metrics. Set
+# PROMETHEUS_MULTIPROC_DIR in the environment when running several gunicorn
+# workers. Scrapes are refused unless they send METRICS_TOKEN as a bearer
+# token or come from one of METRICS_ALLOWED_NETWORKS (comma-separated
+# addresses/CIDRs, e.g. 127.0.0.1,10.0.0.0/8).
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_ALLOWED_NETWORKS = list(filter(None, os.getenv('METRICS_ALLOWED_NETWORKS', '').split(',')))
+
+# POST /api/batch/ (api/views/batch.py): paths per batch, and the query and
+# time budget after which the remaining paths are refused with 429
+BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', '20'))
+BATCH_MAX_QUERIES = int(os.getenv('BATCH_MAX_QUERIES', '200'))
+BATCH_MAX_SECONDS = float(os.getenv('BATCH_MAX_SECONDS', '5'))
+
+# Delta sync for offline student clients (api/sync.py): changes per page,
+# entries per offline upload, and how long a write transaction may stay
+# open (changes younger than this are re-sent on the next sync)
+SYNC_PAGE_SIZE = int(os.getenv('SYNC_PAGE_SIZE', '500'))
+SYNC_UPLOAD_MAX = int(os.getenv('SYNC_UPLOAD_MAX', '100'))
+SYNC_COMMIT_LAG_SECONDS = int(os.getenv('SYNC_COMMIT_LAG_SECONDS', '30'))
+
+# Idempotency-Key on POST requests (api/idempotency.py): how long responses
+# are kept for replay, how long a retry waits for an attempt still running,
+# and when an abandoned attempt's lock expires. Kept in Redis when
+# REDIS_URL is set, otherwise in the idempotency_keys table.
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv('IDEMPOTENCY_TTL_SECONDS', '86400'))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', '10'))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv('IDEMPOTENCY_LOCK_SECONDS', '60'))
+
+# Request tracing (api/tracing.py). TRACE_EXPORT is '' (off), 'file' (OTLP
+# JSON lines appended to TRACE_FILE) or 'otlp' (POSTed to a collector).
+# Inbound traceparent sampled flags are only honoured from
+# TRACE_TRUSTED_PROXIES (comma-separated addresses/CIDRs).
+TRACE_EXPORT = os.getenv('TRACE_EXPORT', '')
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0.01'))
+TRACE_TRUSTED_PROXIES = list(filter(None, os.getenv('TRACE_TRUSTED_PROXIES', '').split(',')))
+TRACE_FILE = os.getenv('TRACE_FILE', str(BASE_DIR / 'traces.jsonl'))
+TRACE_OTLP_ENDPOINT = os.getenv('TRACE_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces')
+TRACE_SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'clinlogix-api')
+
+# Log lines from the api.* loggers carry the current trace id
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'trace_context': {'()': 'api.tracing.TraceContextFilter'},
+    },
+    'formatters': {
+        'traced': {'format': '%(asctime)s %(levelname)s %(name)s [trace=%(trace_id)s span=%(span_id)s] %(message)s'},
+    },
+    'handlers': {
+        'traced_console': {
+            'class': 'logging.StreamHandler',
+            'filters': ['trace_context'],
+            'formatter': 'traced',
+        },
+    },
+    'loggers': {
+        'api': {'handlers': ['traced_console'], 'level': 'INFO'},
+    },
+}
 
 
 # Password validation
@@ -155,7 +354,16 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework Settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.MeteredJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'api.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -164,6 +372,8 @@ REST_FRAMEWORK = {
 
 # CORS Settings
 CORS_ALLOW_ALL_ORIGINS = True # Set to False in production
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed']
 
 AUTHENTICATION_BACKENDS = [
     'api.backends.EmailBackend',
@@ -0,0 +1,23 @@
+"""
+Test runner that creates the api app's tables
+
+The api models are unmanaged (their tables come from the SQL in
+supabase/migrations) and the routers only migrate 'default', so each test
+database other than a mirror gets every api table here, shards included.
+"""
+from django.apps import apps
+from django.db import connections
+from django.test.runner import DiscoverRunner
+
+
+class ApiTablesTestRunner(DiscoverRunner):
+    def setup_databases(self, **kwargs):
+        old_config = super().setup_databases(**kwargs)
+        models = list(apps.get_app_config('api').get_models())
+        for alias in kwargs.get('aliases') or connections:
+            if connections.settings[alias].get('TEST', {}).get('MIRROR'):
+                continue
+            with connections[alias].schema_editor() as editor:
+                for model in models:
+                    editor.create_model(model)
+        return old_config
@@ -0,0 +1,37 @@
+import os
+import argparse
+import django
+
+# Setup Django Environment
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+django.setup()
+
+from api.sharding import all_shards, move_institution, shard_for_institution
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move an institution's data to another database shard")
+    parser.add_argument("institution", help="Institution UUID")
+    parser.add_argument("target", choices=all_shards(), help="Destination database alias")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per insert batch")
+    parser.add_argument("--keep-source", action="store_true", help="Leave the copied rows on the old shard")
+    parser.add_argument("--settle-seconds", type=float, default=None,
+                        help="Wait for workers' cached shard maps after each change (default: SHARD_MAP_CACHE_SECONDS + 1)")
+    args = parser.parse_args()
+
+    source = shard_for_institution(args.institution)
+    print(f" Moving institution {args.institution}: {source} -> {args.target}")
+    copied = move_institution(
+        args.institution,
+        args.target,
+        batch_size=args.batch_size,
+        keep_source=args.keep_source,
+        settle_seconds=args.settle_seconds,
+    )
+    for table, count in copied.items():
+        print(f"   {table}: {count} rows")
+    print("Move Complete.")
+
+
+if __name__ == "__main__":
+    main()
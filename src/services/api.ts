@@ -50,9 +50,24 @@ export const api = {
         }
     },
 
+    // Everything a role's dashboard needs on login, in one request.
+    // include: subset of sections, e.g. ['stats', 'logs'] (default: all)
+    async getHome(role: UserRole, include?: string[]) {
+        const query = include && include.length ? `?include=${include.join(',')}` : '';
+        const response = await apiClient.get(`${role}/home/${query}`);
+        return response.data.data;
+    },
+
+    // Several read-only GETs in one round trip; resolves to
+    // [{ path, status, body }] in the order given
+    async batchGet(paths: string[]) {
+        const response = await apiClient.post('batch/', { requests: paths });
+        return response.data.responses;
+    },
+
     async checkInvite(email: string) {
         try {
-            const response = await apiClient.get(`admin/users/?email=${email}`);
+            const response = await apiClient.get(`admin/users/?email=${encodeURIComponent(email)}`);
             return response.data.length > 0 ? response.data[0] : null;
         } catch (error) {
             return null;
@@ -60,7 +75,8 @@ export const api = {
     },
 
     // Logs
-    async getLogs(role: UserRole, _userId: string) {
+    // view: 'summary' leaves out the long text fields (activities, reflection, ...)
+    async getLogs(role: UserRole, _userId: string, view?: 'summary') {
         let url = 'student/logs/';
         if (role === 'instructor') {
             url = 'instructor/reviews/';
@@ -68,7 +84,7 @@ export const api = {
         // If admin, maybe generic logs? leaving as student/logs which might fail for admin 
         // but Admin usually doesn't use getLogs directly in this context (uses dashboard)
 
-        const response = await apiClient.get(url);
+        const response = await apiClient.get(url, { params: view ? { view } : undefined });
         const data = response.data;
 
         return data.map((d: any) => ({
@@ -91,6 +107,21 @@ export const api = {
         })) as ClinicalEntry[];
     },
 
+    // Entries changed since the token from the last sync (omit for a full
+    // download); resolves to { entries, deleted, token, has_more, reset }
+    async syncLogs(token?: string) {
+        const query = token ? `?token=${encodeURIComponent(token)}` : '';
+        const response = await apiClient.get(`student/logs/sync/${query}`);
+        return response.data.data;
+    },
+
+    // Upload entries queued offline, each with a client-generated
+    // idempotency_key; resolves to [{ idempotency_key, status, entry | errors }]
+    async uploadQueuedLogs(entries: Record<string, any>[]) {
+        const response = await apiClient.post('student/logs/sync/', { entries });
+        return response.data.data.results;
+    },
+
     async createLog(entry: Omit<ClinicalEntry, 'id' | 'status' | 'submittedAt' | 'studentName'> & { patientId?: string, patientAge?: string, patientGender?: string }) {
         const response = await apiClient.post('student/logs/', {
             student: entry.studentId,
@@ -162,15 +193,13 @@ export const api = {
 
     async getAuthorizedUsers(role: 'student' | 'instructor', institutionId?: string) {
         // Fetch from admin/users endpoint (authorized_users table)
-        const params = new URLSearchParams();
+        const params = new URLSearchParams({ role });
         if (institutionId) {
             params.append('institution_id', institutionId);
         }
         const url = `admin/users/?${params.toString()}`;
         const response = await apiClient.get(url);
-
-        // Filter by role on client side since backend returns all
-        return response.data.filter((user: any) => user.role === role);
+        return response.data;
     },
 
     async updatePreceptorAssignment(id: string, data: any) {
@@ -271,6 +300,22 @@ export const api = {
         return response.data;
     },
 
+    // Typeahead search (ranked, institution-scoped)
+    async searchPeople(q: string, role?: 'student' | 'instructor' | 'admin', institutionId?: string) {
+        const params = new URLSearchParams({ q });
+        if (role) params.append('role', role);
+        if (institutionId) params.append('institution', institutionId);
+        const response = await apiClient.get(`admin/search/people/?${params.toString()}`);
+        return response.data.data;
+    },
+
+    async searchPatients(q: string, institutionId?: string) {
+        const params = new URLSearchParams({ q });
+        if (institutionId) params.append('institution', institutionId);
+        const response = await apiClient.get(`admin/search/patients/?${params.toString()}`);
+        return response.data.data;
+    },
+
     // PATIENTS & ASSIGNMENTS
     async getInstitutionPatients(institutionId: string) {
         // Use admin endpoint for now (assuming admin view)
@@ -324,6 +369,22 @@ export const api = {
         return response.data.data;
     },
 
+    async getActivityTimeSeries(params: {
+        granularity?: 'day' | 'week' | 'month' | 'quarter',
+        start?: string,
+        end?: string,
+        institution?: string,
+        specialty?: string,
+        student?: string
+    } = {}) {
+        const query = new URLSearchParams();
+        Object.entries(params).forEach(([key, value]) => {
+            if (value) query.append(key, value);
+        });
+        const response = await apiClient.get(`admin/dashboard/timeseries/?${query.toString()}`);
+        return response.data.data;
+    },
+
     async getInstitutionStats() {
         const response = await apiClient.get('admin/dashboard/institution_stats/');
         return response.data.data;
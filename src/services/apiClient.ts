@@ -7,6 +7,9 @@ const apiClient = axios.create({
     },
 });
 
+// POSTs that never get an Idempotency-Key (token responses must not be stored)
+const UNKEYED_POSTS = ['token/', 'batch/'];
+
 // Interceptor to add JWT token to headers
 apiClient.interceptors.request.use(
     (config) => {
@@ -14,6 +17,16 @@ apiClient.interceptors.request.use(
         if (token) {
             config.headers.Authorization = `Bearer ${token}`;
         }
+        // One key per write, kept when the request is retried, so the server
+        // replays the first response instead of writing twice. Logins and
+        // batches are not writes, and the server ignores keys on them.
+        if (
+            config.method === 'post'
+            && !UNKEYED_POSTS.some((prefix) => config.url?.startsWith(prefix))
+            && !config.headers['Idempotency-Key']
+        ) {
+            config.headers['Idempotency-Key'] = crypto.randomUUID();
+        }
         return config;
     },
     (error) => {
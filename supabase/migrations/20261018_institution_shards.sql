@@ -0,0 +1,19 @@
+-- Institution sharding directory
+-- Lives on the primary ('default') database only. Institutions without a
+-- row keep their tenant data on 'default'. Maintained by
+-- backend/move_institution_shard.py; read by api/sharding.py.
+
+create table if not exists institution_shards (
+  institution_id uuid references institutions(id) on delete cascade primary key,
+  shard text not null,                        -- Django database alias, e.g. shard_eu
+  moving boolean not null default false,      -- writes are refused while true
+  updated_at timestamp with time zone default timezone('utc'::text, now()) not null
+);
+
+create index if not exists institution_shards_shard_idx
+  on institution_shards (shard);
+
+alter table institution_shards enable row level security;
+
+create policy "Admins can view institution shards" on institution_shards
+  for select using (exists (select 1 from profiles where id = auth.uid() and role = 'admin'));
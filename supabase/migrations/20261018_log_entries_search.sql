@@ -0,0 +1,20 @@
+-- Full-text search over log entry narratives
+-- Backs GET /api/{student/logs,instructor/reviews,admin/dashboard}/search/
+
+-- 1. Weighted search vector, kept in sync by Postgres itself
+-- Weights match api/search.py: activities > objectives > reflection > feedback
+do $$
+begin
+  if not exists (select 1 from information_schema.columns where table_name = 'log_entries' and column_name = 'search_vector') then
+    alter table log_entries add column search_vector tsvector generated always as (
+      setweight(to_tsvector('english', coalesce(activities, '')), 'A') ||
+      setweight(to_tsvector('english', coalesce(learning_objectives, '')), 'B') ||
+      setweight(to_tsvector('english', coalesce(reflection, '')), 'C') ||
+      setweight(to_tsvector('english', coalesce(feedback, '')), 'D')
+    ) stored;
+  end if;
+end $$;
+
+-- 2. GIN index so @@ queries don't scan the table
+create index if not exists log_entries_search_vector_idx
+  on log_entries using gin (search_vector);
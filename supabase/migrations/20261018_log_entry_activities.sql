@@ -0,0 +1,31 @@
+-- Competency coverage: catalog activities matched in log entry free text
+-- Rows are written by api/coverage.py when an entry is saved, and by
+-- backend/backfill_activity_tags.py for historical entries.
+
+create table if not exists log_entry_activities (
+  id uuid default gen_random_uuid() primary key,
+  log_entry_id uuid references log_entries(id) on delete cascade not null,
+  activity_id uuid references clinical_activities(id) on delete cascade not null,
+  student_id uuid references profiles(id) not null, -- denormalized from log_entries
+  occurrences integer not null default 1,
+  tagged_at timestamp with time zone default timezone('utc'::text, now()) not null,
+
+  -- Constraint: an activity is tagged at most once per entry
+  unique(log_entry_id, activity_id)
+);
+
+-- Coverage matrices are always read per student
+create index if not exists log_entry_activities_student_activity_idx
+  on log_entry_activities (student_id, activity_id);
+
+-- Catalog lookups are per institution
+create index if not exists clinical_activities_institution_idx
+  on clinical_activities (institution_id);
+
+alter table log_entry_activities enable row level security;
+
+create policy "Admins can view activity tags" on log_entry_activities
+  for select using (exists (select 1 from profiles where id = auth.uid() and role = 'admin'));
+
+create policy "Students can view own activity tags" on log_entry_activities
+  for select using (auth.uid() = student_id);
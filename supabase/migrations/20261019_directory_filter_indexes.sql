@@ -0,0 +1,17 @@
+-- Indexes behind the server-side filters of the admin user and patient
+-- directories (admin/users/?role=&status=&institution_id=,
+-- admin/patients/?institution=). Each ends in created_at so the default
+-- newest-first cursor pages are read straight off the index.
+-- authorized_users.email is the primary key, so ?email= needs no index.
+
+create index if not exists authorized_users_institution_role_created_idx
+  on authorized_users (institution_id, role, created_at desc);
+
+create index if not exists authorized_users_role_created_idx
+  on authorized_users (role, created_at desc);
+
+create index if not exists authorized_users_status_created_idx
+  on authorized_users (status, created_at desc);
+
+create index if not exists patients_institution_created_idx
+  on patients (institution_id, created_at desc);
@@ -0,0 +1,20 @@
+-- Idempotency-Key claims and stored responses (backend/api/idempotency.py)
+-- Used when the backend has no shared cache; lives on the primary
+-- ('default') database only. The primary key makes claiming a key atomic
+-- across workers.
+
+create table if not exists idempotency_keys (
+  key varchar(64) primary key,                -- sha256 of user, method, path and key
+  fingerprint varchar(64) not null,           -- sha256 of the request body
+  status smallint,                            -- null while the first attempt runs
+  headers jsonb,
+  body bytea,                                 -- zlib-compressed response body
+  locked_until timestamp with time zone not null,
+  expires_at timestamp with time zone not null
+);
+
+create index if not exists idempotency_keys_expires_at_idx
+  on idempotency_keys (expires_at);
+
+-- Backend-only: no policies, so API roles cannot read stored responses
+alter table idempotency_keys enable row level security;
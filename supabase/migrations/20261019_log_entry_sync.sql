@@ -0,0 +1,64 @@
+-- Delta sync for offline student clients (backend/api/sync.py)
+-- Every insert/update of a log entry takes the next change sequence value,
+-- and every delete leaves a tombstone, so a client can ask for everything
+-- that changed after the last value it saw.
+
+create sequence if not exists log_entry_change_seq;
+
+alter table log_entries add column if not exists change_seq bigint;
+alter table log_entries add column if not exists idempotency_key text;
+
+-- Existing entries, oldest first
+update log_entries set change_seq = nextval('log_entry_change_seq')
+where id in (select id from log_entries where change_seq is null order by submitted_at, id);
+
+create or replace function log_entries_bump_change_seq() returns trigger as $$
+begin
+  new.change_seq := nextval('log_entry_change_seq');
+  return new;
+end;
+$$ language plpgsql;
+
+drop trigger if exists log_entries_change_seq on log_entries;
+create trigger log_entries_change_seq
+  before insert or update on log_entries
+  for each row execute function log_entries_bump_change_seq();
+
+-- Sync reads are per student, in sequence order
+create index if not exists log_entries_student_change_seq_idx
+  on log_entries (student_id, change_seq);
+
+-- Offline uploads are idempotent per student
+create unique index if not exists log_entries_student_idempotency_key_idx
+  on log_entries (student_id, idempotency_key)
+  where idempotency_key is not null;
+
+create table if not exists log_entry_tombstones (
+  entry_id uuid primary key,
+  student_id uuid not null,
+  change_seq bigint not null,
+  deleted_at timestamp with time zone default timezone('utc'::text, now()) not null
+);
+
+create index if not exists log_entry_tombstones_student_change_seq_idx
+  on log_entry_tombstones (student_id, change_seq);
+
+create or replace function log_entries_record_tombstone() returns trigger as $$
+begin
+  insert into log_entry_tombstones (entry_id, student_id, change_seq, deleted_at)
+  values (old.id, old.student_id, nextval('log_entry_change_seq'), timezone('utc'::text, now()))
+  on conflict (entry_id) do update
+    set change_seq = excluded.change_seq, deleted_at = excluded.deleted_at;
+  return old;
+end;
+$$ language plpgsql;
+
+drop trigger if exists log_entries_tombstone on log_entries;
+create trigger log_entries_tombstone
+  after delete on log_entries
+  for each row execute function log_entries_record_tombstone();
+
+alter table log_entry_tombstones enable row level security;
+
+create policy "Students can view own tombstones" on log_entry_tombstones
+  for select using (auth.uid() = student_id);
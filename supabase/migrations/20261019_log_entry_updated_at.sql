@@ -0,0 +1,14 @@
+-- Last write time of each log entry, for Last-Modified on conditional GETs
+-- (backend/api/conditional.py). Stamped by the same trigger as change_seq.
+
+alter table log_entries add column if not exists updated_at timestamp with time zone;
+
+update log_entries set updated_at = submitted_at where updated_at is null;
+
+create or replace function log_entries_bump_change_seq() returns trigger as $$
+begin
+  new.change_seq := nextval('log_entry_change_seq');
+  new.updated_at := timezone('utc'::text, now());
+  return new;
+end;
+$$ language plpgsql;
@@ -0,0 +1,21 @@
+-- Stamp log entry writes and deletes with the time the change sequence
+-- value was taken rather than the transaction start (now()), so delta sync
+-- (backend/api/sync.py) can tell which values may still be uncommitted.
+
+create or replace function log_entries_bump_change_seq() returns trigger as $$
+begin
+  new.change_seq := nextval('log_entry_change_seq');
+  new.updated_at := timezone('utc'::text, clock_timestamp());
+  return new;
+end;
+$$ language plpgsql;
+
+create or replace function log_entries_record_tombstone() returns trigger as $$
+begin
+  insert into log_entry_tombstones (entry_id, student_id, change_seq, deleted_at)
+  values (old.id, old.student_id, nextval('log_entry_change_seq'), timezone('utc'::text, clock_timestamp()))
+  on conflict (entry_id) do update
+    set change_seq = excluded.change_seq, deleted_at = excluded.deleted_at;
+  return old;
+end;
+$$ language plpgsql;
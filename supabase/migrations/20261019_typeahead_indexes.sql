@@ -0,0 +1,19 @@
+-- Typeahead search over people and patients
+-- Backs GET /api/admin/search/{people,patients}/ (api/typeahead.py)
+
+create extension if not exists pg_trgm;
+
+-- Trigram GIN indexes serve prefix (LIKE 'q%'), substring (LIKE '%q%')
+-- and fuzzy (%) matches on the same lower() expressions the queries use
+create index if not exists profiles_full_name_trgm_idx
+  on profiles using gin (lower(full_name) gin_trgm_ops);
+
+create index if not exists profiles_email_trgm_idx
+  on profiles using gin (lower(email) gin_trgm_ops);
+
+create index if not exists patients_reference_id_trgm_idx
+  on patients using gin (lower(reference_id) gin_trgm_ops);
+
+-- Institution scoping is applied on top of the trigram match
+create index if not exists profiles_institution_role_idx
+  on profiles (institution_id, role);